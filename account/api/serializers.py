@@ -1,9 +1,9 @@
 from rest_framework import serializers
 from account.models import User, Address
-import random
-from src.settings import redis_client
 from django.contrib.auth import authenticate
-from django.core.mail import send_mail
+from account.otp import OTPError, issue_otp, verify_otp
+from account.tasks import send_otp_email
+from src.jobs import enqueue
 from django.utils import timezone
 import datetime
 
@@ -31,18 +31,10 @@ class SignUpSerializer(serializers.ModelSerializer):
             is_active=False #waiting till otp send and not active account till verify
         )
 
-        otp_code = str(random.randint(100000, 999999))
-        redis_client.setex(f"otp:{user.email}", 180, otp_code)
-        print(f"OTP for {user.email}: {otp_code}")
+        otp_code = issue_otp(user.email)
 
-
-        send_mail(
-            subject="Your OTP Code - Maison Veloura",
-            message=f"Hello {user.first_name},\n\nYour OTP code is: {otp_code}\nIt will expire in 3 minutes.",
-            from_email=None,
-            recipient_list=[user.email],
-            fail_silently=False,
-        )
+        # Delivered by the `run_jobs` worker so SMTP latency stays out of the signup request.
+        enqueue(send_otp_email, user.email, user.first_name, otp_code)
 
         return user
 
@@ -52,22 +44,13 @@ class VerifyOTPSerializer(serializers.Serializer):
     otp = serializers.CharField(max_length=6)
 
     def validate(self, data):
-        email = data['email']
-        otp = data['otp']
-        stored_otp = redis_client.get(f"otp:{email}")
-
-        if not stored_otp:
-            raise serializers.ValidationError("OTP expired or invalid")
-        if stored_otp != otp:
-            raise serializers.ValidationError("Incorrect OTP")
+        try:
+            verify_otp(data['email'], data['otp'])
+        except OTPError as error:
+            raise serializers.ValidationError(str(error))
 
-        user = User.objects.filter(email=email).first()
-        if not user:
+        if not User.objects.filter(email=data['email']).update(is_active=True):
             raise serializers.ValidationError("User not found")
-
-        user.is_active = True
-        user.save()
-        redis_client.delete(f"otp:{email}")
         return data
 
 
@@ -76,7 +59,8 @@ class LoginSerializer(serializers.Serializer):
     password = serializers.CharField(write_only=True)
 
     def validate(self, data):
-        user = authenticate(email=data['email'], password=data['password'])
+        # The one password hash of a login; the view reuses data['user'].
+        user = authenticate(self.context.get('request'), email=data['email'], password=data['password'])
 
         if not user:
             raise serializers.ValidationError("Invalid credentials")
@@ -84,6 +68,7 @@ class LoginSerializer(serializers.Serializer):
         if not user.is_active:
             raise serializers.ValidationError("Account not verified")
 
+        data['user'] = user
         return data
 
 
@@ -109,12 +94,18 @@ class UserConfirmationSerializer(serializers.ModelSerializer):
         model = User
         fields = ['first_name', 'last_name', 'phone_number', 'addresses', 'has_address']
 
+    def active_addresses(self, obj):
+        """ The user's live addresses, loaded once and shared by both address fields. """
+        cache = self.__dict__.setdefault('_active_addresses', {})
+        if obj.pk not in cache:
+            cache[obj.pk] = list(Address.objects.filter(user=obj, is_deleted=False))
+        return cache[obj.pk]
+
     def get_addresses(self, obj):
-        addresses = Address.objects.filter(user=obj, is_deleted=False)
-        return AddressSerializer(addresses, many=True).data
+        return AddressSerializer(self.active_addresses(obj), many=True).data
 
     def get_has_address(self, obj):
-        return Address.objects.filter(user=obj, is_deleted=False).exists()
+        return bool(self.active_addresses(obj))
 
     def update(self, instance, validated_data):
         phone_number = validated_data.get('phone_number')
@@ -0,0 +1,20 @@
+from django.conf import settings
+from rest_framework.throttling import BaseThrottle
+
+from src.rate_limit import SlidingWindowLimiter
+
+
+class AuthRateThrottle(BaseThrottle):
+    """
+    Limits an auth endpoint per client address with a Redis sliding window.
+    The view names its scope; limits come from AUTH_RATE_LIMITS[scope].
+    """
+
+    def allow_request(self, request, view):
+        limit, window = settings.AUTH_RATE_LIMITS[view.throttle_scope]
+        limiter = SlidingWindowLimiter(view.throttle_scope, limit, window)
+        allowed, self.wait_seconds = limiter.hit(self.get_ident(request))
+        return allowed
+
+    def wait(self):
+        return self.wait_seconds
@@ -1,10 +1,11 @@
-from django.contrib.auth import logout, authenticate, login
+from django.contrib.auth import logout, login
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import generics, status
 from rest_framework.views import APIView
 from rest_framework_simplejwt.tokens import RefreshToken
 
+from .throttles import AuthRateThrottle
 from .serializers import SignUpSerializer, VerifyOTPSerializer, LoginSerializer, UserConfirmationSerializer, \
     AddressSerializer
 from ..models import Address
@@ -12,9 +13,13 @@ from ..models import Address
 
 class SignUpView(generics.CreateAPIView):
     serializer_class = SignUpSerializer
+    throttle_classes = [AuthRateThrottle]
+    throttle_scope = 'signup'
 
 class VerifyOtpView(generics.GenericAPIView):
     serializer_class = VerifyOTPSerializer
+    throttle_classes = [AuthRateThrottle]
+    throttle_scope = 'verify-otp'
 
     def post(self, request):
         serializer = self.get_serializer(data=request.data)
@@ -23,24 +28,20 @@ class VerifyOtpView(generics.GenericAPIView):
 
 class LoginView(generics.GenericAPIView):
     serializer_class = LoginSerializer
+    throttle_classes = [AuthRateThrottle]
+    throttle_scope = 'login'
 
     def post(self, request):
         serializer = self.get_serializer(data=request.data)
 
         if serializer.is_valid():
-            email = serializer.validated_data["email"]
-            password = serializer.validated_data["password"]
-            user = authenticate(email=email, password=password)
-
-            if user:
-                login(request, user)
-                refresh = RefreshToken.for_user(user)
-                return Response({
-                    "access": str(refresh.access_token),
-                    "refresh": str(refresh),
-                })
-            else:
-                return Response({"error": "Authentication failed"}, status=status.HTTP_401_UNAUTHORIZED)
+            user = serializer.validated_data["user"]
+            login(request, user)
+            refresh = RefreshToken.for_user(user)
+            return Response({
+                "access": str(refresh.access_token),
+                "refresh": str(refresh),
+            })
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
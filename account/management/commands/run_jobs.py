@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from src.jobs import Worker, requeue_dead
+
+
+class Command(BaseCommand):
+    help = "Runs background jobs (OTP emails) from the Redis job queue."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Run the queued jobs and exit.")
+        parser.add_argument('--requeue-dead', action='store_true',
+                            help="Move dead-lettered jobs back onto the queue and exit.")
+
+    def handle(self, *args, **options):
+        if options['requeue_dead']:
+            self.stdout.write(f"Requeued {requeue_dead()} dead jobs.")
+            return
+        worker = Worker()
+        if options['once']:
+            self.stdout.write(f"Ran {worker.run_pending()} jobs.")
+            return
+        self.stdout.write("Waiting for jobs.")
+        worker.run()
@@ -0,0 +1,57 @@
+"""
+One-time codes for account verification.
+
+A code lives at `otp:{email}` for REDIS_OTP_EXPIRE seconds. Every verify
+attempt increments `otp:attempts:{email}` in the same pipelined round trip
+that reads the code, and after OTP_MAX_ATTEMPTS the code is burned, so it
+cannot be brute forced within its lifetime. A matching code is consumed
+with DELETE: of two concurrent correct attempts only the one whose DELETE
+removed the key succeeds.
+"""
+import secrets
+
+from django.conf import settings
+
+from src.settings import redis_client
+
+
+class OTPError(Exception):
+    """ Raised when a code is missing, expired, wrong or has had too many attempts. """
+
+
+def code_key(email):
+    return f"otp:{email}"
+
+
+def attempts_key(email):
+    return f"otp:attempts:{email}"
+
+
+def issue_otp(email):
+    """ Stores a fresh six-digit code for `email`, resetting its attempts, and returns it. """
+    code = f"{secrets.randbelow(10 ** 6):06d}"
+    with redis_client.pipeline() as pipe:
+        pipe.setex(code_key(email), settings.REDIS_OTP_EXPIRE, code)
+        pipe.delete(attempts_key(email))
+        pipe.execute()
+    return code
+
+
+def verify_otp(email, code):
+    """ Checks and consumes the code for `email`; raises OTPError when it cannot be used. """
+    with redis_client.pipeline() as pipe:
+        pipe.incr(attempts_key(email))
+        pipe.expire(attempts_key(email), settings.REDIS_OTP_EXPIRE)
+        pipe.get(code_key(email))
+        attempts, _, stored = pipe.execute()
+
+    if stored is None:
+        raise OTPError("OTP expired or invalid")
+    if attempts > settings.OTP_MAX_ATTEMPTS:
+        redis_client.delete(code_key(email))
+        raise OTPError("Too many attempts, request a new code")
+    if not secrets.compare_digest(stored, str(code)):
+        raise OTPError("Incorrect OTP")
+    if not redis_client.delete(code_key(email)):
+        raise OTPError("OTP expired or invalid")
+    redis_client.delete(attempts_key(email))
@@ -0,0 +1,95 @@
+"""
+Admin role resolution.
+
+A role is a Group name. `user_roles` loads a user's group names once and
+keeps them on the user object for the rest of the request and in Redis for
+ROLE_CACHE_TIMEOUT seconds; account/signals.py drops the Redis copy when the
+user's groups change. `RoleAdminMixin` answers every `has_*_permission` call
+of an admin from that set, so a changelist render costs at most one group
+query however often Django asks.
+"""
+import json
+import logging
+
+import redis
+from django.conf import settings
+from django.db import transaction
+
+from src.settings import redis_client
+
+logger = logging.getLogger(__name__)
+
+ROLES_KEY = "roles:{}"
+
+
+def user_roles(user):
+    """ The names of `user`'s groups, as a frozenset. """
+    roles = getattr(user, '_role_names', None)
+    if roles is not None:
+        return roles
+    if not user.is_authenticated:
+        return frozenset()
+
+    key = ROLES_KEY.format(user.pk)
+    try:
+        cached = redis_client.get(key)
+    except redis.RedisError:
+        logger.warning("Could not read cached roles of user %s", user.pk, exc_info=True)
+        cached = None
+    if cached is not None:
+        roles = frozenset(json.loads(cached))
+    else:
+        roles = frozenset(user.groups.values_list('name', flat=True))
+        try:
+            redis_client.setex(key, settings.ROLE_CACHE_TIMEOUT, json.dumps(sorted(roles)))
+        except redis.RedisError:
+            logger.warning("Could not cache roles of user %s", user.pk, exc_info=True)
+    user._role_names = roles
+    return roles
+
+
+def forget_roles(user_ids):
+    """ Drops the cached roles of the given users. """
+    keys = [ROLES_KEY.format(pk) for pk in user_ids]
+    if not keys:
+        return
+    try:
+        redis_client.delete(*keys)
+    except redis.RedisError:
+        logger.warning("Could not drop cached roles of users %s", list(user_ids), exc_info=True)
+
+
+def forget_roles_on_commit(user_ids):
+    """
+    Drops the cached roles now and again once the current transaction commits,
+    so roles re-cached from the old memberships in between do not outlive it.
+    """
+    user_ids = list(user_ids)
+    forget_roles(user_ids)
+    if user_ids and transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: forget_roles(user_ids))
+
+
+def has_role(user, roles):
+    return user.is_superuser or not user_roles(user).isdisjoint(roles)
+
+
+class RoleAdminMixin:
+    """
+    Admin permissions by role: members of `view_roles` may view, members of
+    `edit_roles` may add, change and delete. Superusers may do everything.
+    """
+    view_roles = ('Operator', 'Supervisor')
+    edit_roles = ('Operator',)
+
+    def has_view_permission(self, request, obj=None):
+        return has_role(request.user, self.view_roles)
+
+    def has_add_permission(self, request):
+        return has_role(request.user, self.edit_roles)
+
+    def has_change_permission(self, request, obj=None):
+        return has_role(request.user, self.edit_roles)
+
+    def has_delete_permission(self, request, obj=None):
+        return has_role(request.user, self.edit_roles)
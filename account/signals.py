@@ -0,0 +1,28 @@
+from django.contrib.auth.models import Group
+from django.db.models.signals import m2m_changed, post_save, pre_delete
+from django.dispatch import receiver
+
+from account.models import User
+from account.roles import forget_roles_on_commit
+
+
+# === Role cache invalidation ===
+@receiver(m2m_changed, sender=User.groups.through, dispatch_uid="roles-user-groups")
+def forget_roles_on_membership_change(sender, instance, action, reverse, pk_set, **kwargs):
+    """ Handles both `user.groups.add(...)` and `group.user_set.add(...)`, including clears. """
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        forget_roles_on_commit([instance.pk])
+    elif action == 'pre_clear':
+        forget_roles_on_commit(instance.user_set.values_list('pk', flat=True))
+    else:
+        forget_roles_on_commit(pk_set)
+
+
+@receiver(post_save, sender=Group, dispatch_uid="roles-group-save")
+@receiver(pre_delete, sender=Group, dispatch_uid="roles-group-delete")
+def forget_roles_of_group(sender, instance, **kwargs):
+    """ A renamed or deleted group changes the roles of all its members. """
+    if not kwargs.get('created'):
+        forget_roles_on_commit(instance.user_set.values_list('pk', flat=True))
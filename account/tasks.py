@@ -0,0 +1,12 @@
+from django.core.mail import send_mail
+
+
+def send_otp_email(email, first_name, otp_code):
+    """ Sends the signup OTP; runs on the job worker, which retries it when the mail server fails. """
+    send_mail(
+        subject="Your OTP Code - Maison Veloura",
+        message=f"Hello {first_name},\n\nYour OTP code is: {otp_code}\nIt will expire in 3 minutes.",
+        from_email=None,
+        recipient_list=[email],
+        fail_silently=False,
+    )
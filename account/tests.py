@@ -1,7 +1,20 @@
+import json
+
 from django.test import TestCase
 from django.test import TestCase
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from account.models import User, Address
 from django.core.exceptions import ValidationError
+from django.core import mail
+from django.test import override_settings
+from unittest import mock
+from django.contrib.auth.models import Group
+from account.otp import issue_otp
+from account.roles import ROLES_KEY, forget_roles, user_roles
+from src.jobs import QUEUE_KEY, Worker
+from src.rate_limit import SlidingWindowLimiter
+from src.settings import redis_client
 
 # Create your tests here.
 
@@ -77,4 +90,166 @@ class AddressModelTest(TestCase):
                 postal_code="12345",  # Invalid (not 10 digits)
                 no="8"
             )
-            address.full_clean()  # This triggers Django’s validation
\ No newline at end of file
+            address.full_clean()  # This triggers Django’s validation
+
+class ConfirmUserInfoTest(TestCase):
+
+    def setUp(self):
+        """ Set up a user with one live and one deleted address """
+        self.user = User.objects.create_user(email="test@example.com", password="testpass123")
+        for deleted in (False, True):
+            Address.objects.create(user=self.user, province="Tehran", city="Tehran", street="Valiasr",
+                                   postal_code="1234567890", no="12", is_deleted=deleted)
+        self.client.force_login(self.user)
+
+    def test_addresses_loaded_once(self):
+        """ Test the address list and flag share a single query """
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get("/api/confirm-info/")
+        self.assertEqual(len(response.json()["addresses"]), 1)
+        self.assertTrue(response.json()["has_address"])
+        self.assertEqual(sum('FROM "address"' in query["sql"] for query in context.captured_queries), 1)
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+class SignUpOtpEmailTest(TestCase):
+
+    def setUp(self):
+        """ Start from an empty job queue """
+        redis_client.delete(QUEUE_KEY)
+
+    def test_signup_enqueues_otp_email(self):
+        """ Test signup only queues the OTP email and the worker delivers it """
+        response = self.client.post("/api/signup/", {
+            "email": "new@example.com", "password": "testpass123", "first_name": "Sara",
+        })
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(redis_client.llen(QUEUE_KEY), 1)
+
+        self.assertEqual(Worker().run_pending(), 1)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ["new@example.com"])
+        self.assertIn(redis_client.get("otp:new@example.com"), mail.outbox[0].body)
+
+
+@override_settings(OTP_MAX_ATTEMPTS=3)
+class VerifyOtpTest(TestCase):
+
+    def setUp(self):
+        """ Set up an inactive user with a fresh code """
+        self.user = User.objects.create_user(email="new@example.com", password="testpass123", is_active=False)
+        self.code = issue_otp(self.user.email)
+
+    def verify(self, code):
+        return self.client.post("/api/verify/", {"email": self.user.email, "otp": code})
+
+    def wrong(self):
+        return "000000" if self.code != "000000" else "111111"
+
+    def test_code_activates_once(self):
+        """ Test the right code activates the account and cannot be replayed """
+        self.assertEqual(self.verify(self.code).status_code, 200)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.is_active)
+        self.assertEqual(self.verify(self.code).status_code, 400)
+
+    def test_code_burned_after_too_many_attempts(self):
+        """ Test the right code is refused once OTP_MAX_ATTEMPTS wrong codes were tried """
+        for _ in range(3):
+            self.assertEqual(self.verify(self.wrong()).status_code, 400)
+        response = self.verify(self.code)
+        self.assertEqual(response.status_code, 400)
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.is_active)
+
+    def test_new_code_resets_attempts(self):
+        """ Test issuing a new code gives a fresh set of attempts """
+        for _ in range(3):
+            self.verify(self.wrong())
+        self.code = issue_otp(self.user.email)
+        self.assertEqual(self.verify(self.code).status_code, 200)
+
+
+class LoginTest(TestCase):
+
+    def setUp(self):
+        """ Set up an active user """
+        self.user = User.objects.create_user(email="test@example.com", password="testpass123")
+
+    def test_login_hashes_password_once(self):
+        """ Test a login checks the password hash a single time """
+        with mock.patch.object(User, "check_password", autospec=True, side_effect=lambda user, raw: True) as check:
+            response = self.client.post("/api/login/", {"email": "test@example.com", "password": "testpass123"})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("access", response.json())
+        self.assertEqual(check.call_count, 1)
+
+    def test_login_rate_limited(self):
+        """ Test logins over the limit are answered with 429 """
+        SlidingWindowLimiter('login', 2, 60).reset('127.0.0.1')
+        with override_settings(AUTH_RATE_LIMITS={'login': (2, 60)}):
+            statuses = [
+                self.client.post("/api/login/", {"email": "test@example.com", "password": "wrong"}).status_code
+                for _ in range(3)
+            ]
+        self.assertEqual(statuses, [400, 400, 429])
+
+    def test_forwarded_for_does_not_reset_the_limit(self):
+        """ Test a client cannot get a fresh window by sending another X-Forwarded-For address """
+        SlidingWindowLimiter('login', 2, 60).reset('127.0.0.1')
+        with override_settings(AUTH_RATE_LIMITS={'login': (2, 60)}):
+            statuses = [
+                self.client.post("/api/login/", {"email": "test@example.com", "password": "wrong"},
+                                 HTTP_X_FORWARDED_FOR=f"10.0.0.{number}").status_code
+                for number in range(3)
+            ]
+        self.assertEqual(statuses, [400, 400, 429])
+
+
+class AdminRoleTest(TestCase):
+
+    def setUp(self):
+        """ Set up a staff operator """
+        self.user = User.objects.create_user(email="operator@example.com", password="testpass123", is_staff=True)
+        self.operator = Group.objects.create(name="Operator")
+        self.user.groups.add(self.operator)
+        forget_roles([self.user.pk])
+        self.client.force_login(self.user)
+
+    def group_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        return response, sum('FROM "auth_group"' in query["sql"] for query in context.captured_queries)
+
+    def test_one_group_query_per_admin_page(self):
+        """ Test an admin changelist resolves the user's roles with at most one query, then from the cache """
+        for url in ("/admin/order/order/", "/admin/account/user/", "/admin/"):
+            forget_roles([self.user.pk])
+            response, queries = self.group_queries(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(queries, 1)
+
+        response, queries = self.group_queries("/admin/order/order/")
+        self.assertEqual(queries, 0)
+
+    def test_membership_change_drops_cached_roles(self):
+        """ Test removing the user from a group takes effect on the next request """
+        self.assertEqual(self.client.get("/admin/order/order/").status_code, 200)
+        self.user.groups.remove(self.operator)
+        self.assertEqual(self.client.get("/admin/order/order/").status_code, 403)
+
+    def test_roles_cached_before_commit_are_dropped(self):
+        """ Test roles re-cached between a membership change and its commit are dropped once it commits """
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.groups.remove(self.operator)
+            # A concurrent request still reading the old membership caches the old roles.
+            redis_client.set(ROLES_KEY.format(self.user.pk), json.dumps(["Operator"]))
+        self.assertEqual(self.client.get("/admin/order/order/").status_code, 403)
+
+    def test_group_rename_drops_cached_roles(self):
+        """ Test renaming a group updates its members' roles """
+        user_roles(self.user)
+        self.operator.name = "Former operator"
+        self.operator.save()
+        self.assertEqual(user_roles(User.objects.get(pk=self.user.pk)), {"Former operator"})
@@ -0,0 +1,65 @@
+"""
+Benchmarks for the online shop.
+
+Each module is a standalone script run from the project root, e.g.
+
+    python -m benchmarks.pricing
+
+Benchmarks run against a throwaway test database created from the configured
+`default` database, so they never touch real data.
+"""
+import os
+import statistics
+import time
+from contextlib import contextmanager
+
+import django
+
+
+def setup():
+    """ Configures Django for a standalone benchmark script. """
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'src.settings')
+    django.setup()
+
+
+@contextmanager
+def test_database():
+    """ Creates a test database for the duration of the benchmark and destroys it afterwards. """
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+def measure(func, repeat=3):
+    """ Runs `func` `repeat` times and returns (best, median) wall time in seconds. """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings), statistics.median(timings)
+
+
+def report(label, seconds, extra=''):
+    print(f"{label:<48} {seconds * 1000:>10.2f} ms  {extra}")
+
+
+def seed_catalog(count, prefix='bench'):
+    """ Bulk-creates `count` products under one category and brand and returns them. """
+    from product.models import Brand, Category, Product
+
+    category, _ = Category.objects.get_or_create(name=f"{prefix} category", slug=f"{prefix}-category")
+    brand, _ = Brand.objects.get_or_create(name=f"{prefix} brand", slug=f"{prefix}-brand")
+    products = [
+        Product(category=category, brand=brand, name=f"{prefix} product {i}", slug=f"{prefix}-product-{i}",
+                price=10 + i % 990, weight=1 + i % 7)
+        for i in range(count)
+    ]
+    return Product.objects.bulk_create(products, batch_size=5000)
@@ -0,0 +1,81 @@
+"""
+Renders the heavy admin changelists over a seeded dataset with the admin
+performance mode off (stock Django admin) and on, reporting time and queries.
+
+    python -m benchmarks.admin_changelists [--orders 100000] [--products 2000] [--variants 5000]
+
+Estimated counts need PostgreSQL planner statistics; on SQLite the mode
+still removes the per-row and per-filter queries but counts exactly.
+"""
+import argparse
+import time
+
+from benchmarks import report, seed_catalog, setup, test_database
+
+CHANGELISTS = (
+    '/admin/order/order/',
+    '/admin/order/orderitem/',
+    '/admin/product/productstock/',
+    '/admin/product/product/',
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--orders', type=int, default=100_000)
+    parser.add_argument('--products', type=int, default=2000)
+    parser.add_argument('--variants', type=int, default=5000)
+    args = parser.parse_args()
+
+    setup()
+    from decimal import Decimal
+
+    from django.db import connection
+    from django.test import Client, override_settings
+    from django.test.utils import CaptureQueriesContext
+
+    from account.models import User
+    from order.models import Order, OrderItem
+    from product.models import Feature, FeatureValue, ProductColor, ProductStock
+
+    with test_database():
+        admin_user = User.objects.create_superuser(email='bench@example.com', password='bench-password')
+        products = seed_catalog(args.products)
+        orders = Order.objects.bulk_create([Order(user=admin_user) for _ in range(args.orders)], batch_size=5000)
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=products[i % len(products)], quantity=1, price=Decimal('10'),
+                      total_price=Decimal('10'))
+            for i, order in enumerate(orders)
+        ], batch_size=5000)
+        feature = Feature.objects.create(name='Size')
+        values = FeatureValue.objects.bulk_create([FeatureValue(feature=feature, value=str(i)) for i in range(20)])
+        colors = ProductColor.objects.bulk_create([
+            ProductColor(product=products[i % len(products)], name=f"color {i}") for i in range(args.variants)
+        ], batch_size=5000)
+        stocks = ProductStock.objects.bulk_create([
+            ProductStock(product=color.product, color=color, stock=1) for color in colors
+        ], batch_size=5000)
+        ProductStock.feature_values.through.objects.bulk_create([
+            ProductStock.feature_values.through(productstock_id=stock.pk, featurevalue_id=values[i % 20].pk)
+            for i, stock in enumerate(stocks)
+        ], batch_size=5000)
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE")
+
+        client = Client()
+        client.force_login(admin_user)
+        for mode in (False, True):
+            with override_settings(ADMIN_PERFORMANCE_MODE=mode):
+                for url in CHANGELISTS:
+                    client.get(url)  # warm up templates and caches
+                    with CaptureQueriesContext(connection) as context:
+                        start = time.perf_counter()
+                        response = client.get(url)
+                        elapsed = time.perf_counter() - start
+                    report(f"{'performance' if mode else 'stock'} {url}", elapsed,
+                           f"{len(context)} queries, {len(response.content) // 1024} KiB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+"""
+Load-tests the catalog detail endpoint under WSGI and ASGI: requests per second
+and latency percentiles at a fixed number of concurrent keep-alive connections.
+
+    python -m benchmarks.asgi_loadtest [--connections 500] [--duration 15] [--workers 4]
+
+Runs three servers in turn against the same seeded test database:
+
+    wsgi        gunicorn (gthread) serving the sync DRF view   /api/products/<slug>/
+    asgi-sync   uvicorn serving the same sync view              (thread-pool bound)
+    asgi        uvicorn serving the async view                  /api/async/products/<slug>/
+
+Needs gunicorn and uvicorn, a Postgres `default` database, and a real Redis
+(REDIS_FAKE would give every worker its own cache). The servers reach the
+throwaway database through the DB_NAME environment variable. Pass `--cold`
+to defeat the response cache with a unique query string per request.
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+
+from benchmarks import seed_catalog, setup, test_database
+
+
+def server_command(mode, port, workers, threads):
+    if mode == 'wsgi':
+        return [sys.executable, '-m', 'gunicorn', 'src.wsgi:application', '--bind', f'127.0.0.1:{port}',
+                '--workers', str(workers), '--worker-class', 'gthread', '--threads', str(threads),
+                '--log-level', 'warning']
+    return [sys.executable, '-m', 'uvicorn', 'src.asgi:application', '--host', '127.0.0.1', '--port', str(port),
+            '--workers', str(workers), '--log-level', 'warning', '--no-access-log']
+
+
+def wait_for_port(port, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with status {process.returncode}")
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Server did not listen on port {port} within {timeout}s")
+
+
+# === Client ===
+async def read_response(reader):
+    """ Reads one HTTP/1.1 response and returns its status code. """
+    head = await reader.readuntil(b'\r\n\r\n')
+    lines = head.decode('latin-1').split('\r\n')
+    status = int(lines[0].split()[1])
+    headers = dict(line.split(': ', 1) for line in lines[1:] if ': ' in line)
+    headers = {name.lower(): value for name, value in headers.items()}
+    if 'content-length' in headers:
+        await reader.readexactly(int(headers['content-length']))
+    elif headers.get('transfer-encoding') == 'chunked':
+        while True:
+            size = int((await reader.readline()).strip(), 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    return status
+
+
+async def connection_loop(port, paths, deadline, latencies, errors, counter, cold):
+    reader = writer = None
+    while time.monotonic() < deadline:
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            path = random.choice(paths)
+            if cold:
+                path = f"{path}?run={next(counter)}"
+            request = f"GET {path} HTTP/1.1\r\nHost: localhost\r\nAccept: application/json\r\n\r\n"
+            start = time.perf_counter()
+            writer.write(request.encode())
+            status = await read_response(reader)
+            latencies.append(time.perf_counter() - start)
+            if status != 200:
+                errors.append(status)
+        except (OSError, asyncio.IncompleteReadError, ValueError) as error:
+            errors.append(type(error).__name__)
+            if writer is not None:
+                writer.close()
+            reader = writer = None
+            await asyncio.sleep(0.05)
+    if writer is not None:
+        writer.close()
+
+
+async def load(port, paths, connections, duration, cold):
+    latencies, errors, counter = [], [], itertools.count()
+    deadline = time.monotonic() + duration
+    await asyncio.gather(*(
+        connection_loop(port, paths, deadline, latencies, errors, counter, cold) for _ in range(connections)
+    ))
+    return latencies, errors
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)] if values else float('nan')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--products', type=int, default=2000)
+    parser.add_argument('--connections', type=int, default=500)
+    parser.add_argument('--duration', type=float, default=15)
+    parser.add_argument('--warmup', type=float, default=3)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=8, help="gunicorn threads per WSGI worker")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--modes', default='wsgi,asgi-sync,asgi')
+    parser.add_argument('--cold', action='store_true', help="bypass the response cache")
+    args = parser.parse_args()
+
+    setup()
+    from django.db import connection
+    from product.models import ProductColor, ProductStock
+
+    with test_database():
+        products = seed_catalog(args.products, prefix='load')
+        colors = ProductColor.objects.bulk_create(ProductColor(product=p, name="Black") for p in products)
+        ProductStock.objects.bulk_create(
+            ProductStock(product=p, color=c, stock=10) for p, c in zip(products, colors)
+        )
+        slugs = [product.slug for product in products]
+        env = {**os.environ, 'DB_NAME': connection.settings_dict['NAME']}
+        connection.close()
+
+        print(f"{'server':<12}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'errors':>10}  "
+              f"({args.connections} connections, {args.duration:g}s)")
+        for mode in args.modes.split(','):
+            prefix = '/api/async/products/' if mode == 'asgi' else '/api/products/'
+            paths = [f"{prefix}{slug}/" for slug in slugs]
+            process = subprocess.Popen(server_command(mode, args.port, args.workers, args.threads), env=env)
+            try:
+                wait_for_port(args.port, process)
+                asyncio.run(load(args.port, paths, min(args.connections, 50), args.warmup, args.cold))
+                latencies, errors = asyncio.run(load(args.port, paths, args.connections, args.duration, args.cold))
+            finally:
+                process.terminate()
+                process.wait()
+            print(f"{mode:<12}{len(latencies) / args.duration:>10.0f}{percentile(latencies, 0.5) * 1000:>10.1f}"
+                  f"{percentile(latencies, 0.99) * 1000:>10.1f}{len(errors):>10}")
+
+
+if __name__ == '__main__':
+    main()
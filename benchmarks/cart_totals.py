@@ -0,0 +1,62 @@
+"""
+Measures the cost of adding the Nth item to a cart: the previous OrderItem.save/Order.save
+recompute cascade against the single aggregate query + UPDATE of order.totals.
+
+    python -m benchmarks.cart_totals [--items 50]
+"""
+import argparse
+from decimal import Decimal
+
+from benchmarks import report, seed_catalog, setup, test_database
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--items', type=int, default=50)
+    args = parser.parse_args()
+
+    setup()
+    import time
+    from django.db import connection, models
+    from django.test.utils import CaptureQueriesContext
+    from account.models import User
+    from order.models import Order, OrderItem
+    from order.totals import compute_totals
+
+    def legacy_add(order, product):
+        """ Replays the previous cart-add path: per-item weight loop on the item save and on order.save(). """
+        item = OrderItem(order=order, product=product, quantity=1, price=product.price)
+        item.total_price = item.quantity * item.price
+        models.Model.save(item)
+        weight = sum(i.quantity * i.product.weight for i in order.items.all())
+        compute_totals(order.total_price, weight, order.discount_code)
+        order.total_price += item.total_price
+        models.Model.save(order)
+        weight = sum(i.quantity * i.product.weight for i in order.items.all())
+        totals = compute_totals(order.total_price, weight, order.discount_code)
+        order.shipping_cost, order.final_price = totals.shipping_cost, totals.final_price
+        models.Model.save(order, update_fields=['shipping_cost', 'final_price', 'discount_amount'])
+
+    def new_add(order, product):
+        OrderItem.objects.create(order=order, product=product, quantity=1, price=product.price)
+
+    with test_database():
+        products = seed_catalog(args.items)
+        user = User.objects.create_user(email='bench@example.com', password='bench-password')
+
+        for label, add in (('legacy cascade', legacy_add), ('aggregate totals', new_add)):
+            order = Order.objects.create(user=user, total_price=Decimal('0'))
+            for product in products[:-1]:
+                add(Order.objects.get(pk=order.pk), product)
+
+            cart = Order.objects.get(pk=order.pk)
+            with CaptureQueriesContext(connection) as context:
+                start = time.perf_counter()
+                add(cart, products[-1])
+                elapsed = time.perf_counter() - start
+            report(f"{label}: add item #{args.items}", elapsed, f"{len(context.captured_queries)} queries")
+            order.delete()
+
+
+if __name__ == '__main__':
+    main()
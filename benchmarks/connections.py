@@ -0,0 +1,66 @@
+"""
+Measures the per-request connection overhead with and without the pooled backend.
+
+Every simulated request opens Django's connection, runs one query and closes
+it, as a request with CONN_MAX_AGE = 0 does.
+
+    python -m benchmarks.connections [--requests 500] [--threads 8]
+"""
+import argparse
+import threading
+import time
+
+from benchmarks import report, setup, test_database
+
+BACKENDS = (
+    ('plain connect per request', 'django.db.backends.postgresql'),
+    ('pooled (src.db.postgresql_pool)', 'src.db.postgresql_pool'),
+)
+
+
+def run_requests(backend, settings_dict, count):
+    connection = backend.DatabaseWrapper(dict(settings_dict))
+    for _ in range(count):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1")
+        connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--threads', type=int, default=8)
+    args = parser.parse_args()
+
+    setup()
+    from django.db import connection
+    from django.db.utils import load_backend
+
+    with test_database():
+        if connection.vendor != 'postgresql':
+            raise SystemExit("The connection benchmark needs a PostgreSQL default database.")
+        settings_dict = {**connection.settings_dict, 'CONN_MAX_AGE': 0}
+        for label, engine in BACKENDS:
+            backend = load_backend(engine)
+            for threads in (1, args.threads):
+                per_thread = args.requests // threads
+                workers = [
+                    threading.Thread(target=run_requests, args=(backend, settings_dict, per_thread))
+                    for _ in range(threads)
+                ]
+                start = time.perf_counter()
+                for worker in workers:
+                    worker.start()
+                for worker in workers:
+                    worker.join()
+                elapsed = time.perf_counter() - start
+                report(f"{label}, {threads} thread(s)", elapsed / (per_thread * threads),
+                       f"per request, {per_thread * threads} requests")
+
+        from src.db.pool import pools_for
+        for pool in pools_for(lambda key: True):
+            pool.close_idle()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""
+Fires many parallel checkouts at a discount code with `max_uses=10` and compares the previous
+read-modify-write counter with the conditional UPDATE + redemption ledger.
+
+Needs a database that allows concurrent writers (PostgreSQL); on SQLite the threads mostly
+fail with "database is locked".
+
+    python -m benchmarks.discount_redemption [--attempts 500] [--workers 50] [--max-uses 10]
+"""
+import argparse
+from decimal import Decimal
+
+from benchmarks import report, setup, test_database
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--attempts', type=int, default=500)
+    parser.add_argument('--workers', type=int, default=50)
+    parser.add_argument('--max-uses', type=int, default=10)
+    args = parser.parse_args()
+
+    setup()
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+    from django.db import connection
+    from django.utils.timezone import now, timedelta
+    from account.models import User
+    from order.discounts import DiscountUnavailable, redeem
+    from order.models import Order
+    from product.models import DiscountCode
+
+    def legacy_redeem(order, code):
+        """ Replays the previous checkout path: validate in Python, then `used_count += 1; save()`. """
+        code = DiscountCode.objects.get(pk=code.pk)
+        if not code.is_valid():
+            raise DiscountUnavailable()
+        code.used_count += 1
+        code.save()
+
+    with test_database():
+        user = User.objects.create_user(email='bench@example.com', password='bench-password')
+
+        for label, attempt in (('read-modify-write', legacy_redeem), ('conditional update', redeem)):
+            code = DiscountCode.objects.create(
+                code=label[:10].upper(), value=Decimal('10'), discount_type='percent',
+                end_date=now() + timedelta(days=1), max_uses=args.max_uses,
+            )
+            orders = Order.objects.bulk_create([Order(user=user) for _ in range(args.attempts)])
+
+            def run(order):
+                try:
+                    attempt(order, code)
+                    return True
+                except Exception:
+                    return False
+                finally:
+                    connection.close()
+
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=args.workers) as pool:
+                granted = sum(pool.map(run, orders))
+            elapsed = time.perf_counter() - start
+
+            code.refresh_from_db()
+            report(f"{label}: {args.attempts} attempts", elapsed,
+                   f"granted {granted}, used_count {code.used_count} / max_uses {code.max_uses}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+Times the bitmap facet index (build and counts) and a filtered listing on a catalog with
+1M ProductFeature rows (products x features per product).
+
+    python -m benchmarks.facets [--products 200000] [--features 5] [--values 8]
+"""
+import argparse
+import random
+
+from benchmarks import measure, report, seed_catalog, setup, test_database
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--products', type=int, default=200000)
+    parser.add_argument('--features', type=int, default=5, help="features per product")
+    parser.add_argument('--values', type=int, default=8, help="values per feature")
+    args = parser.parse_args()
+
+    setup()
+    from django.db import connection
+    from product.facets import FacetFilters, FacetIndex
+    from product.models import Brand, Feature, FeatureValue, Product, ProductColor, ProductFeature, ProductStock
+
+    rng = random.Random(42)
+
+    with test_database():
+        products = seed_catalog(args.products)
+        brands = Brand.objects.bulk_create([Brand(name=f"brand {i}", slug=f"brand-{i}") for i in range(20)])
+        for start in range(0, len(products), 10000):
+            chunk = products[start:start + 10000]
+            for product in chunk:
+                product.brand = rng.choice(brands)
+            Product.objects.bulk_update(chunk, ['brand'])
+
+        features = Feature.objects.bulk_create([Feature(name=f"feature {i}") for i in range(args.features)])
+        values = {
+            feature.pk: FeatureValue.objects.bulk_create(
+                [FeatureValue(feature=feature, value=f"value {i}") for i in range(args.values)]
+            )
+            for feature in features
+        }
+        ProductFeature.objects.bulk_create([
+            ProductFeature(product=product, feature_value=rng.choice(values[feature.pk]))
+            for product in products for feature in features
+        ], batch_size=10000)
+        colors = ProductColor.objects.bulk_create([
+            ProductColor(product=product, name=rng.choice(['Black', 'Silver', 'Blue', 'Red'])) for product in products
+        ], batch_size=10000)
+        ProductStock.objects.bulk_create([
+            ProductStock(product_id=color.product_id, color=color, stock=rng.choice([0, 5])) for color in colors
+        ], batch_size=10000)
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+
+        rows = ProductFeature.objects.count()
+        build = measure(FacetIndex, repeat=1)[1]
+        report("build facet index", build, f"{rows} product features")
+        index = FacetIndex()
+
+        queryset = Product.objects.filter(is_active=True, is_deleted=False)
+        first_value = values[features[0].pk][0]
+        selections = {
+            'no filters': FacetFilters(),
+            'brand': FacetFilters(brand=['brand-3']),
+            'brand + feature + color': FacetFilters(
+                brand=['brand-3', 'brand-4'], feature=[f"{features[0].name}:{first_value.value}"], color=['Black'],
+            ),
+            'feature + price + in stock': FacetFilters(
+                feature=[f"{features[1].name}:value 2"], price_min=100, price_max=500, in_stock=True,
+            ),
+        }
+        for label, filters in selections.items():
+            report(f"facet counts ({label})", measure(lambda: index.counts(filters))[1])
+            report(f"filtered page ({label})", measure(
+                lambda: list(filters.apply(queryset).order_by('-created', '-id')[:10])
+            )[1])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+Measures the responsive image pipeline: bytes sent for a product image at
+full size against its variants, the cost of serializing an image list
+before and after the variants exist, and the worker's render time per image.
+
+Images are written to a temporary MEDIA_ROOT. Run with REDIS_FAKE=True to
+measure without a Redis server.
+
+    python -m benchmarks.images [--images 50] [--size 2400]
+"""
+import argparse
+import tempfile
+import time
+from io import BytesIO
+
+from benchmarks import report, seed_catalog, setup, test_database
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--images', type=int, default=50)
+    parser.add_argument('--size', type=int, default=2400, help="width of the uploaded originals in pixels")
+    args = parser.parse_args()
+
+    setup()
+    from django.core.files.uploadedfile import SimpleUploadedFile
+    from django.test import override_settings
+    from PIL import Image as PILImage, ImageDraw
+
+    from product.api.serializers import ImageSerializer
+    from product.models import Image
+    from src.jobs import QUEUE_KEY, Worker
+    from src.settings import redis_client
+
+    def upload(number):
+        # A gradient with some shapes compresses like a photo, unlike a flat colour.
+        image = PILImage.linear_gradient('L').resize((args.size, args.size * 3 // 4)).convert('RGB')
+        ImageDraw.Draw(image).ellipse((number, number, args.size // 2, args.size // 3), fill=(200, 40, number % 255))
+        buffer = BytesIO()
+        image.save(buffer, format='JPEG', quality=90)
+        return SimpleUploadedFile(f"bench-{number}.jpg", buffer.getvalue(), content_type='image/jpeg')
+
+    with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root), test_database():
+        redis_client.delete(QUEUE_KEY)
+        product = seed_catalog(1)[0]
+        for number in range(args.images):
+            Image.objects.create(product=product, file=upload(number))
+        images = list(Image.objects.all())
+
+        # Saving the images already refreshed the product snapshot, which queued their renders.
+        start = time.perf_counter()
+        ImageSerializer(images, many=True).data
+        report(f"serialization while queued: {args.images} images", time.perf_counter() - start,
+               f"{redis_client.llen(QUEUE_KEY)} jobs queued")
+
+        start = time.perf_counter()
+        rendered = Worker().run_pending()
+        elapsed = time.perf_counter() - start
+        report(f"worker: {rendered} renders", elapsed, f"{elapsed / max(rendered, 1) * 1000:.1f} ms/image")
+
+        images = list(Image.objects.all())
+        start = time.perf_counter()
+        ImageSerializer(images, many=True).data
+        report(f"serialization with srcset: {args.images} images", time.perf_counter() - start)
+
+        storage = images[0].file.storage
+        original = sum(image.file.size for image in images) / len(images)
+        print(f"{'original':<48} {original / 1024:>10.1f} KiB/image")
+        for fmt, widths in images[0].variants.items():
+            if fmt == 'source':
+                continue
+            for width in sorted(widths, key=int):
+                size = sum(storage.size(image.variants[fmt][width]) for image in images) / len(images)
+                print(f"{f'{fmt} {width}w':<48} {size / 1024:>10.1f} KiB/image  {size / original:.0%} of original")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""
+Measures logins per second on one core: the previous login path, which
+authenticated in the serializer and again in the view, against the current
+single authentication.
+
+Runs in one thread so the result reads as logins/sec per core; the password
+hash dominates, so multiply by worker processes for a deployment estimate.
+
+    python -m benchmarks.logins [--logins 50]
+"""
+import argparse
+import time
+
+from benchmarks import report, setup, test_database
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--logins', type=int, default=50)
+    args = parser.parse_args()
+
+    setup()
+    from django.contrib.auth import authenticate
+
+    from account.api.serializers import LoginSerializer
+    from account.models import User
+
+    credentials = {'email': 'bench@example.com', 'password': 'bench-password'}
+
+    def login_twice():
+        """ Replays the previous path: validate() authenticates, then the view authenticates again. """
+        serializer = LoginSerializer(data=credentials)
+        serializer.is_valid(raise_exception=True)
+        authenticate(**credentials)
+
+    def login_once():
+        serializer = LoginSerializer(data=credentials)
+        serializer.is_valid(raise_exception=True)
+        return serializer.validated_data['user']
+
+    with test_database():
+        User.objects.create_user(**credentials)
+        for label, login in (('authenticate twice', login_twice), ('authenticate once', login_once)):
+            start = time.perf_counter()
+            for _ in range(args.logins):
+                login()
+            elapsed = time.perf_counter() - start
+            report(f"{label}: {args.logins} logins", elapsed, f"{args.logins / elapsed:.1f} logins/s per core")
+
+
+if __name__ == '__main__':
+    main()
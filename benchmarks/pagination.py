@@ -0,0 +1,48 @@
+"""
+Compares page-number (COUNT + OFFSET) and keyset pagination of the product list at increasing depths.
+
+    python -m benchmarks.pagination [--products 100000] [--pages 1 100 1000]
+"""
+import argparse
+
+from benchmarks import measure, report, seed_catalog, setup, test_database
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--products', type=int, default=100000)
+    parser.add_argument('--pages', type=int, nargs='+', default=[1, 100, 1000])
+    args = parser.parse_args()
+
+    setup()
+    from rest_framework.pagination import PageNumberPagination
+    from rest_framework.request import Request
+    from rest_framework.test import APIRequestFactory
+    from product.models import Product
+    from src.pagination import KeysetPagination
+
+    factory = APIRequestFactory()
+
+    with test_database():
+        seed_catalog(args.products)
+        queryset = Product.objects.filter(is_active=True, is_deleted=False)
+        ordered = list(queryset.order_by('-created', '-id').values_list('created', 'id'))
+        paginator = KeysetPagination()
+
+        for page in args.pages:
+            def page_number():
+                request = Request(factory.get('/api/products/', {'page': page}))
+                PageNumberPagination().paginate_queryset(queryset.order_by('-created', '-id'), request)
+
+            cursor = paginator.encode_cursor(ordered[(page - 1) * paginator.page_size - 1]) if page > 1 else ''
+
+            def keyset():
+                request = Request(factory.get('/api/products/', {'cursor': cursor} if cursor else {}))
+                KeysetPagination().paginate_queryset(queryset, request)
+
+            report(f"page-number pagination, page {page}", measure(page_number)[1])
+            report(f"keyset pagination, page {page}", measure(keyset)[1])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+"""
+Compares the batched pricing engine with the per-object `Product.get_final_price` path.
+
+    python -m benchmarks.pricing [--sizes 1000 100000]
+"""
+import argparse
+from datetime import timedelta
+
+from benchmarks import measure, report, seed_catalog, setup, test_database
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 100000])
+    args = parser.parse_args()
+
+    setup()
+    from django.utils.timezone import now
+    from product.models import Discount, Product
+    from product.pricing import final_prices
+
+    with test_database():
+        for size in args.sizes:
+            Product.objects.all().delete()
+            products = seed_catalog(size, prefix=f"p{size}")
+            Discount.objects.bulk_create(
+                [Discount(product=product, value=15, discount_type='percent', end_date=now() + timedelta(days=7))
+                 for product in products[::2]],
+                batch_size=5000,
+            )
+
+            def per_object():
+                for product in Product.objects.all():
+                    product.get_final_price()
+
+            def batched():
+                final_prices(list(Product.objects.all()))
+
+            report(f"per-object get_final_price ({size} products)", measure(per_object, repeat=1)[0])
+            report(f"batched final_prices ({size} products)", measure(batched)[0])
+
+
+if __name__ == '__main__':
+    main()
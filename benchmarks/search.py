@@ -0,0 +1,74 @@
+"""
+Compares the tsvector/GIN product search with an `icontains` scan over name, description,
+brand and category on a generated catalog. Needs PostgreSQL.
+
+    python -m benchmarks.search [--products 500000] [--queries lapt "travel bag" wireless]
+"""
+import argparse
+import random
+
+from benchmarks import measure, report, setup, test_database
+
+WORDS = (
+    'laptop phone tablet camera speaker headphones monitor keyboard mouse charger cable travel bag '
+    'wireless bluetooth portable compact premium classic sport outdoor leather steel carbon ultra '
+    'light battery waterproof gaming office studio smart mini pro max silver black blue red green'
+).split()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--products', type=int, default=500000)
+    parser.add_argument('--queries', nargs='+', default=['lapt', 'travel bag', 'wireless gaming mouse'])
+    args = parser.parse_args()
+
+    setup()
+    from functools import reduce
+    from operator import or_
+    from django.db import connection
+    from django.db.models import Q
+    from product.models import Brand, Category, Product
+    from product.search import FALLBACK_FIELDS, is_supported, rebuild_search_vectors, search_products, search_terms
+
+    if not is_supported():
+        parser.exit(1, "The search benchmark needs PostgreSQL.\n")
+
+    rng = random.Random(42)
+
+    with test_database():
+        categories = Category.objects.bulk_create(
+            [Category(name=f"{word} category", slug=f"{word}-category") for word in WORDS[:12]]
+        )
+        brands = Brand.objects.bulk_create([Brand(name=f"{word} co", slug=f"{word}-co") for word in WORDS[12:24]])
+        for start in range(0, args.products, 10000):
+            Product.objects.bulk_create([
+                Product(
+                    category=rng.choice(categories), brand=rng.choice(brands), price=10,
+                    name=' '.join(rng.sample(WORDS, 3)), slug=f"bench-product-{i}",
+                    description=' '.join(rng.choices(WORDS, k=40)),
+                )
+                for i in range(start, min(start + 10000, args.products))
+            ])
+        rebuild_search_vectors()
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE product')
+
+        queryset = Product.objects.filter(is_active=True, is_deleted=False)
+        for q in args.queries:
+            terms = search_terms(q)
+
+            def full_text():
+                list(search_products(queryset, terms).values_list('id', flat=True)[:20])
+
+            def icontains():
+                scan = queryset
+                for term in terms:
+                    scan = scan.filter(reduce(or_, (Q(**{f'{field}__icontains': term}) for field in FALLBACK_FIELDS)))
+                list(scan.order_by('-id').values_list('id', flat=True)[:20])
+
+            report(f"tsvector + GIN: {q!r}", measure(full_text)[1])
+            report(f"icontains scan: {q!r}", measure(icontains)[1])
+
+
+if __name__ == '__main__':
+    main()
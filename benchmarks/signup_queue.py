@@ -0,0 +1,76 @@
+"""
+Compares signup throughput when the OTP email is sent inside the request
+(the previous behaviour) with enqueueing it for the `run_jobs` worker.
+
+SMTP latency is simulated by an email backend that sleeps `--smtp-latency`
+seconds per message. Run with REDIS_FAKE=True to measure without a Redis server.
+
+    python -m benchmarks.signup_queue [--signups 200] [--threads 8] [--smtp-latency 0.5]
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from unittest import mock
+
+from django.core.mail.backends.locmem import EmailBackend
+
+from benchmarks import report, setup, test_database
+
+
+class SlowEmailBackend(EmailBackend):
+    latency = 0.5
+
+    def send_messages(self, messages):
+        time.sleep(self.latency)
+        return super().send_messages(messages)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--signups', type=int, default=200)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--smtp-latency', type=float, default=0.5)
+    args = parser.parse_args()
+
+    setup()
+    from django.db import connection
+    from django.test import override_settings
+
+    from account.api.serializers import SignUpSerializer
+    from src.jobs import QUEUE_KEY, Worker
+    from src.settings import redis_client
+
+    SlowEmailBackend.latency = args.smtp_latency
+
+    def send_now(func, *job_args, **job_kwargs):
+        func(*job_args, **job_kwargs)
+
+    def signup(label, number):
+        serializer = SignUpSerializer(data={
+            'email': f"{label}-{number}@example.com", 'password': 'bench-password', 'first_name': 'Bench',
+        })
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        connection.close()
+
+    with test_database(), override_settings(EMAIL_BACKEND='benchmarks.signup_queue.SlowEmailBackend'):
+        redis_client.delete(QUEUE_KEY)
+        for label, patch in (
+            ('send in request', mock.patch('account.api.serializers.enqueue', send_now)),
+            ('enqueue for worker', nullcontext()),
+        ):
+            with patch, ThreadPoolExecutor(max_workers=args.threads) as pool:
+                start = time.perf_counter()
+                list(pool.map(lambda number: signup(label.split()[0], number), range(args.signups)))
+                elapsed = time.perf_counter() - start
+            report(f"{label}: {args.signups} signups, {args.threads} threads", elapsed,
+                   f"{args.signups / elapsed:.1f} signups/s")
+
+        start = time.perf_counter()
+        sent = Worker().run_pending()
+        report(f"worker: {sent} queued emails", time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""
+Creates many products with the same name, comparing the previous save-time
+slug loop (one exists() query per taken suffix) with the slug allocator.
+
+The loop is quadratic, so it runs on its own, smaller count by default.
+
+    python -m benchmarks.slugs [--count 10000] [--legacy-count 1000]
+"""
+import argparse
+import time
+
+from benchmarks import report, setup, test_database
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--count', type=int, default=10_000)
+    parser.add_argument('--legacy-count', type=int, default=1000)
+    args = parser.parse_args()
+
+    setup()
+    from django.db import connection, models
+    from django.utils.text import slugify
+
+    from product.models import Brand, Category, Product
+
+    def legacy_save(product):
+        """ Replays the previous Product.save: probe name, name-1, name-2, ... until one is free. """
+        base_slug = slugify(product.name)
+        unique_slug, num = base_slug, 1
+        while Product.objects.filter(slug=unique_slug).exists():
+            unique_slug = f"{base_slug}-{num}"
+            num += 1
+        product.slug = unique_slug
+        models.Model.save(product)
+
+    queries = 0
+
+    def count_queries(execute, sql, params, many, context):
+        nonlocal queries
+        queries += 1
+        return execute(sql, params, many, context)
+
+    with test_database():
+        category = Category.objects.create(name='Bench category', slug='bench-category')
+        brand = Brand.objects.create(name='Bench brand', slug='bench-brand')
+        for label, name, count, save in (
+            ('probing loop', 'Legacy T-Shirt', args.legacy_count, legacy_save),
+            ('slug allocator', 'T-Shirt', args.count, Product.save),
+        ):
+            queries = 0
+            with connection.execute_wrapper(count_queries):
+                start = time.perf_counter()
+                for _ in range(count):
+                    save(Product(category=category, brand=brand, name=name))
+                elapsed = time.perf_counter() - start
+            report(f"{label}: {count} same-named products", elapsed,
+                   f"{queries / count:.1f} queries/product, {count / elapsed:.0f} products/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+"""
+Compares rendering a product list page through ProductSerializer with serving it from the
+ProductSnapshot read model.
+
+    python -m benchmarks.snapshots [--products 20000] [--page-size 10]
+"""
+import argparse
+
+from benchmarks import measure, report, seed_catalog, setup, test_database
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--products', type=int, default=20000)
+    parser.add_argument('--page-size', type=int, default=10)
+    args = parser.parse_args()
+
+    setup()
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    from product.api.query_plans import plan_queryset
+    from product.api.serializers import ProductSerializer
+    from product.models import Product, ProductSnapshot
+    from product.snapshots import SNAPSHOT_ORDERING, refresh_snapshots, snapshot_payloads
+
+    with test_database():
+        seed_catalog(args.products)
+        report("rebuild snapshots", measure(lambda: refresh_snapshots(Product.objects.all()), repeat=1)[1],
+               f"{args.products} products")
+
+        def serializer_page():
+            products = plan_queryset(Product.objects.filter(is_active=True, is_deleted=False), ProductSerializer)
+            return ProductSerializer(products.order_by('-created', '-id')[:args.page_size], many=True).data
+
+        def snapshot_page():
+            return snapshot_payloads(ProductSnapshot.objects.order_by(*SNAPSHOT_ORDERING)[:args.page_size])
+
+        for label, page in (('serializer graph', serializer_page), ('snapshot read model', snapshot_page)):
+            with CaptureQueriesContext(connection) as context:
+                page()
+            report(f"{label}: list page", measure(page, repeat=20)[1], f"{len(context.captured_queries)} queries")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,11 @@
 from django.contrib import admin
-from .models import Order, OrderItem
+from account.roles import RoleAdminMixin
+from src.admin_performance import PerformanceAdminMixin
+from .models import Order, OrderItem, DiscountCodeRedemption
 
 
 @admin.register(Order)
-class OrderAdmin(admin.ModelAdmin):
+class OrderAdmin(RoleAdminMixin, PerformanceAdminMixin, admin.ModelAdmin):
     list_display = ['user', 'status', 'created_at', 'total_price', 'final_price', 'is_paid']
     ordering = ['-created_at']
     list_filter = ['status', 'is_paid', 'created_at']
@@ -11,34 +13,29 @@ class OrderAdmin(admin.ModelAdmin):
     date_hierarchy = 'created_at'
     list_editable = ['status', 'is_paid']
 
-    def has_view_permission(self, request, obj=None):
-        return request.user.groups.filter(name__in=['Operator', 'Supervisor']).exists() or request.user.is_superuser
-
-    def has_add_permission(self, request):
-        return request.user.groups.filter(name='Operator').exists() or request.user.is_superuser
-
-    def has_change_permission(self, request, obj=None):
-        return request.user.groups.filter(name='Operator').exists() or request.user.is_superuser
-
-    def has_delete_permission(self, request, obj=None):
-        return request.user.groups.filter(name='Operator').exists() or request.user.is_superuser
-
 
 @admin.register(OrderItem)
-class OrderItemAdmin(admin.ModelAdmin):
+class OrderItemAdmin(RoleAdminMixin, PerformanceAdminMixin, admin.ModelAdmin):
     list_display = ['order', 'product', 'quantity', 'price', 'total_price']
     ordering = ['order']
     list_filter = ['order', 'product']
     search_fields = ['order__id', 'product__name']
+    list_select_related = ['order__user']
+
 
-    def has_view_permission(self, request, obj=None):
-        return request.user.groups.filter(name__in=['Operator', 'Supervisor']).exists() or request.user.is_superuser
+@admin.register(DiscountCodeRedemption)
+class DiscountCodeRedemptionAdmin(RoleAdminMixin, PerformanceAdminMixin, admin.ModelAdmin):
+    list_display = ['discount_code', 'order', 'user', 'redeemed_at']
+    ordering = ['-redeemed_at']
+    list_select_related = ['discount_code', 'user', 'order__user']
+    search_fields = ['discount_code__code', 'user__email', 'order__id']
+    date_hierarchy = 'redeemed_at'
 
     def has_add_permission(self, request):
-        return request.user.groups.filter(name='Operator').exists() or request.user.is_superuser
+        return False
 
     def has_change_permission(self, request, obj=None):
-        return request.user.groups.filter(name='Operator').exists() or request.user.is_superuser
+        return False
 
     def has_delete_permission(self, request, obj=None):
-        return request.user.groups.filter(name='Operator').exists() or request.user.is_superuser
+        return request.user.is_superuser
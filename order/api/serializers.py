@@ -1,8 +1,12 @@
+from django.db import transaction
 from rest_framework import serializers
 
 from account.api.serializers import AddressSerializer
+from order.cart import CartLineError, CartResolver
+from order.discounts import DiscountUnavailable, redeem
 from order.models import OrderItem, Order
-from product.models import Product, ProductColor, FeatureValue, ProductStock, DiscountCode
+from order.reservations import InsufficientStock, commit_order
+from product.models import DiscountCode
 
 
 class OrderItemSerializer(serializers.ModelSerializer):
@@ -24,45 +28,42 @@ class CartAddSerializer(serializers.Serializer):
     selected_features = serializers.DictField(child=serializers.CharField(), required=False)
 
     def validate(self, data):
-        product_id = data.get("product_id")
-        quantity = data.get("quantity")
-        color_name = data.get("selected_color")
-        selected_features = data.get("selected_features", {})
-
-        # Validate product
+        resolver = CartResolver([data])
         try:
-            product = Product.objects.get(id=product_id)
-        except Product.DoesNotExist:
-            raise serializers.ValidationError("Invalid product.")
+            product, stock_item = resolver.resolve(data, data.get("quantity"))
+        except CartLineError as error:
+            raise serializers.ValidationError(str(error))
 
-        # Validate color
-        try:
-            color = ProductColor.objects.get(name=color_name, product=product)
-        except ProductColor.DoesNotExist:
-            raise serializers.ValidationError("Invalid color for selected product.")
+        data["product"] = product
+        data["stock_item"] = stock_item
+        data["price"] = resolver.prices[product.id]
+        return data
 
-        # Convert feature values
-        feature_values = []
-        for feature_name, value in selected_features.items():
-            try:
-                fv = FeatureValue.objects.get(feature__name=feature_name, value=value)
-                feature_values.append(fv)
-            except FeatureValue.DoesNotExist:
-                raise serializers.ValidationError(f"Feature '{feature_name}' with value '{value}' not found.")
 
+class CartLineSerializer(serializers.Serializer):
+    OP_CHOICES = ['add', 'update', 'remove']
 
-        stock_qs = ProductStock.objects.filter(product=product, color=color)
-        for fv in feature_values:
-            stock_qs = stock_qs.filter(feature_values=fv)
+    op = serializers.ChoiceField(choices=OP_CHOICES, default='add')
+    item_id = serializers.IntegerField(required=False)
+    product_id = serializers.IntegerField(required=False)
+    quantity = serializers.IntegerField(min_value=1, required=False)
+    selected_color = serializers.CharField(required=False)
+    selected_features = serializers.DictField(child=serializers.CharField(), required=False)
 
-        stock_item = stock_qs.first()
-        if not stock_item:
-            raise serializers.ValidationError("No stock found for this combination.")
+    def validate(self, data):
+        required = {
+            'add': ['product_id', 'quantity', 'selected_color'],
+            'update': ['item_id', 'quantity'],
+            'remove': ['item_id'],
+        }[data['op']]
+        missing = {field: "This field is required." for field in required if field not in data}
+        if missing:
+            raise serializers.ValidationError(missing)
+        return data
 
-        if stock_item.stock < quantity:
-            raise serializers.ValidationError(f"Only {stock_item.stock} items available in stock.")
 
-        return data
+class CartBulkSerializer(serializers.Serializer):
+    lines = serializers.ListField(child=serializers.DictField(), allow_empty=False, max_length=100)
 
 
 class CheckoutSerializer(serializers.Serializer):
@@ -111,15 +112,21 @@ class CheckoutSerializer(serializers.Serializer):
     def update(self, instance, validated_data):
         discount = validated_data.get("discount_code")
 
-        if discount:
-            instance.discount_code = discount
-            instance.discount_code.used_count += 1
-            instance.discount_code.save()
-
-        instance.status = 'processing'
-        instance.is_paid = True
-        instance.update_final_price()
-        instance.save()
+        try:
+            with transaction.atomic():
+                # A second checkout of the same cart waits here for the first one and then sees it paid.
+                if Order.objects.select_for_update().values_list('is_paid', flat=True).get(pk=instance.pk):
+                    raise serializers.ValidationError("This order is already checked out.")
+                commit_order(instance)
+                if discount:
+                    redeem(instance, discount)
+                    instance.discount_code = discount
+
+                instance.status = 'processing'
+                instance.is_paid = True
+                instance.save()
+        except (InsufficientStock, DiscountUnavailable) as error:
+            raise serializers.ValidationError(str(error))
 
         return instance
 
@@ -1,9 +1,10 @@
 from django.urls import path
-from .views import CartAddView, CartItemDeleteView, CartListView, CheckoutView, OrderListView, ReceiptView, \
+from .views import CartAddView, CartBulkView, CartItemDeleteView, CartListView, CheckoutView, OrderListView, ReceiptView, \
     LatestOrderAPIView
 
 urlpatterns = [
     path('cart/', CartAddView.as_view(), name='cart-add'),
+    path('cart/bulk/', CartBulkView.as_view(), name='cart-bulk'),
     path('cart/items', CartListView.as_view(), name='cart-list'),
     path('cart/item/<int:pk>/', CartItemDeleteView.as_view(), name='cart-item-delete'),
     path('checkout/', CheckoutView.as_view(), name='checkout'),
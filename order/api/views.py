@@ -1,77 +1,121 @@
+from django.db import transaction
+from django.db.models import Prefetch
 from rest_framework import generics, status
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from order.models import OrderItem, Order
-from product.models import Product
-from .serializers import CartAddSerializer, OrderItemSerializer, CheckoutSerializer, OrderListSerializer
+from order.models import OrderItem, Order, StockReservation
+from order.reservations import InsufficientStock, commit_order, hold_expiry, release_items, take_stock
+from src.pagination import KeysetPagination
+from order.cart import apply_cart_lines
+from .serializers import CartAddSerializer, OrderItemSerializer, CheckoutSerializer, OrderListSerializer, \
+    CartBulkSerializer, CartLineSerializer
 
 
 class CartAddView(generics.CreateAPIView):
     serializer_class = CartAddSerializer
     permission_classes = [IsAuthenticated]
+    read_from_primary = True
 
     def post(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
 
-        product = Product.objects.get(id=serializer.validated_data['product_id'])
+        product = serializer.validated_data['product']
         quantity = serializer.validated_data['quantity']
         selected_color = serializer.validated_data.get('selected_color')
         selected_features = serializer.validated_data.get('selected_features', {})
 
+        stock_item = serializer.validated_data['stock_item']
+
         order, created = Order.objects.get_or_create(user=request.user, is_paid=False)
 
+        with transaction.atomic():
+            granted, available = take_stock([(stock_item.id, quantity)])
+            if not granted[0]:
+                raise ValidationError(f"Only {available.get(stock_item.id, 0)} items available in stock.")
+
+            # Saving the item refreshes the order totals with a single aggregate query and UPDATE.
+            order_item = OrderItem.objects.create(
+                order=order,
+                product=product,
+                quantity=quantity,
+                price=serializer.validated_data['price'],
+                selected_color=selected_color,
+                selected_features=selected_features,
+            )
+            StockReservation.objects.create(
+                order_item=order_item, stock_item=stock_item, quantity=quantity, expires_at=hold_expiry()
+            )
 
-        if created or not order.pk:
-            Order.objects.filter(id=order.id).update(total_price=0)
+        return Response(OrderItemSerializer(order_item).data, status=status.HTTP_201_CREATED)
 
 
-        order_item = OrderItem.objects.create(
-            order=order,
-            product=product,
-            quantity=quantity,
-            price=product.get_final_price(),
-            selected_color=selected_color,
-            selected_features=selected_features,
-        )
+class CartBulkView(generics.GenericAPIView):
+    serializer_class = CartBulkSerializer
+    permission_classes = [IsAuthenticated]
+    read_from_primary = True
 
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
 
-        order.total_price += order_item.total_price
-        order.save()
+        results, lines = {}, []
+        for index, raw_line in enumerate(serializer.validated_data['lines']):
+            line = CartLineSerializer(data=raw_line)
+            if line.is_valid():
+                lines.append((index, line.validated_data))
+            else:
+                results[index] = {'index': index, 'errors': line.errors}
 
-        return Response(OrderItemSerializer(order_item).data, status=status.HTTP_201_CREATED)
+        order, created = Order.objects.get_or_create(user=request.user, is_paid=False)
+        for (index, _), result in zip(lines, apply_cart_lines(order, [line for _, line in lines])):
+            if 'item' in result:
+                item = result.pop('item')
+                result['item'] = OrderItemSerializer(item).data if item else None
+            results[index] = {**result, 'index': index}
+
+        ordered = [results[index] for index in sorted(results)]
+        all_failed = all('errors' in result for result in ordered)
+        return Response({
+            'results': ordered,
+            'total_price': str(order.total_price),
+            'final_price': str(order.final_price),
+        }, status=status.HTTP_400_BAD_REQUEST if all_failed else status.HTTP_200_OK)
 
 
 class CartListView(generics.ListAPIView):
     serializer_class = OrderItemSerializer
     permission_classes = [IsAuthenticated]
+    read_from_primary = True
 
     def get_queryset(self):
         order = Order.objects.filter(user=self.request.user, is_paid=False).first()
-        return order.items.all() if order else OrderItem.objects.none()
+        return order.items.select_related('product') if order else OrderItem.objects.none()
 
 
 class CartItemDeleteView(generics.DestroyAPIView):
     queryset = OrderItem.objects.all()
     permission_classes = [IsAuthenticated]
+    read_from_primary = True
 
     def delete(self, request, *args, **kwargs):
         item = self.get_object()
         if item.order.user != request.user or item.order.is_paid:
             return Response({"detail": "Unauthorized"}, status=status.HTTP_403_FORBIDDEN)
 
-        order = item.order
-        order.total_price -= item.total_price
-        item.delete()
-        order.save()
+        with transaction.atomic():
+            release_items([item])
+            item.delete()
 
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
 class CheckoutView(APIView):
     permission_classes = [IsAuthenticated]
+    read_from_primary = True
 
     def get(self, request):
         order = Order.objects.filter(user=request.user, is_paid=False).first()
@@ -96,14 +140,19 @@ class CheckoutView(APIView):
 class OrderListView(generics.ListAPIView):
     serializer_class = OrderListSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
+    keyset_ordering = ('-created_at', '-id')
 
     def get_queryset(self):
-        return Order.objects.filter(user=self.request.user, is_paid=True).order_by('-created_at')
+        return Order.objects.filter(user=self.request.user, is_paid=True).prefetch_related(
+            Prefetch('items', queryset=OrderItem.objects.select_related('product'))
+        )
 
 class ReceiptView(generics.RetrieveUpdateAPIView):
     queryset = Order.objects.all()
     serializer_class = CheckoutSerializer
     permission_classes = [IsAuthenticated]
+    read_from_primary = True
 
     def get_queryset(self):
         return Order.objects.filter(user=self.request.user)
@@ -113,8 +162,14 @@ class ReceiptView(generics.RetrieveUpdateAPIView):
         if order.is_paid:
             return Response({"detail": "Order already confirmed."}, status=status.HTTP_400_BAD_REQUEST)
 
-        order.is_paid = True
-        order.save()
+        # Paid stock must be committed, or the sweeper would hand the expired holds back.
+        try:
+            with transaction.atomic():
+                commit_order(order)
+                order.is_paid = True
+                order.save()
+        except InsufficientStock as error:
+            return Response({"detail": str(error)}, status=status.HTTP_400_BAD_REQUEST)
         return Response({"message": "Order confirmed!"}, status=status.HTTP_200_OK)
 
 
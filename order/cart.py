@@ -0,0 +1,203 @@
+from collections import Counter
+from functools import reduce
+from operator import or_
+
+from django.db import transaction
+from django.db.models import Q
+
+from order.models import OrderItem, StockReservation
+from order.reservations import hold_expiry, release_items, return_stock, take_stock
+from product.models import FeatureValue, Product, ProductColor
+from product.pricing import final_prices
+from product.stock_matrix import get_matrices
+
+
+class CartLineError(Exception):
+    """ Raised when a single cart line cannot be applied. """
+
+
+# === Cart Resolver ===
+class CartResolver:
+    """
+    Resolves products, colors, feature values, stock rows and prices for many
+    cart lines at once, in a constant number of queries. Stock rows come from
+    the cached per-product stock matrices.
+
+    Every line is a dict with `product_id`, `selected_color` and optionally
+    `selected_features` ({feature name: value}).
+    """
+
+    def __init__(self, lines):
+        product_ids = {line['product_id'] for line in lines}
+        pairs = {pair for line in lines for pair in (line.get('selected_features') or {}).items()}
+
+        self.products = Product.objects.filter(is_active=True, is_deleted=False).in_bulk(product_ids)
+        self.colors = {
+            (color.product_id, color.name): color
+            for color in ProductColor.objects.filter(product_id__in=product_ids)
+        }
+        self.feature_values = {}
+        if pairs:
+            lookup = reduce(or_, (Q(feature__name=name, value=value) for name, value in pairs))
+            self.feature_values = {
+                (fv.feature.name, fv.value): fv for fv in FeatureValue.objects.filter(lookup).select_related('feature')
+            }
+        self.matrices = get_matrices(self.products)
+        self.prices = final_prices(list(self.products.values()))
+
+    def resolve(self, line, quantity):
+        """
+        Validates one line against the preloaded rows.
+
+        Returns:
+            tuple: (product, stock item)
+        Raises:
+            CartLineError: if the product, color, features or stock do not match.
+        """
+        product = self.products.get(line['product_id'])
+        if product is None:
+            raise CartLineError("Invalid product.")
+
+        color = self.colors.get((product.id, line['selected_color']))
+        if color is None:
+            raise CartLineError("Invalid color for selected product.")
+
+        feature_value_ids = set()
+        for feature_name, value in (line.get('selected_features') or {}).items():
+            feature_value = self.feature_values.get((feature_name, value))
+            if feature_value is None:
+                raise CartLineError(f"Feature '{feature_name}' with value '{value}' not found.")
+            feature_value_ids.add(feature_value.id)
+
+        matrix = self.matrices[product.id]
+        variant = matrix.find(color.id, feature_value_ids)
+        if variant is None:
+            raise CartLineError("No stock found for this combination.")
+
+        if variant['stock'] < quantity:
+            raise CartLineError(f"Only {variant['stock']} items available in stock.")
+
+        return product, matrix.stock_item(variant)
+
+
+# === Bulk cart operations ===
+def duplicate_item_ids(lines):
+    """ The item_ids that more than one update/remove line refers to. """
+    counts = Counter(line['item_id'] for line in lines if line['op'] != 'add')
+    return sorted(item_id for item_id, count in counts.items() if count > 1)
+
+
+def apply_cart_lines(order, lines):
+    """
+    Applies many `add` / `update` / `remove` operations to a cart in one pass.
+
+    Invalid lines are reported and skipped; valid ones take their stock under
+    row locks and are written with bulk_create / bulk_update / a single
+    DELETE, and the order totals are recomputed once at the end.
+
+    Every cart item may appear in at most one line: two lines for one item
+    would both adjust stock against the same original hold, so all lines of
+    a repeated item are reported instead.
+
+    Returns:
+        list: one dict per line, in input order, with either `item` (the
+        affected OrderItem, None when removed) or `errors`.
+    """
+    duplicates = set(duplicate_item_ids(lines))
+    items = OrderItem.objects.filter(
+        order=order, id__in={line['item_id'] for line in lines if line['op'] != 'add'}
+    ).select_related('reservation').in_bulk()
+
+    specs = []
+    for line in lines:
+        item = items.get(line.get('item_id'))
+        if line['op'] == 'add':
+            specs.append(line)
+        elif line['op'] == 'update' and item is not None and item.pk not in duplicates:
+            specs.append({
+                'product_id': item.product_id,
+                'selected_color': item.selected_color,
+                'selected_features': item.selected_features,
+            })
+        else:
+            specs.append(None)
+    resolver = CartResolver([spec for spec in specs if spec is not None])
+
+    results, pending, to_delete = [], [], []
+    for index, (line, spec) in enumerate(zip(lines, specs)):
+        results.append({'index': index})
+        try:
+            if line['op'] != 'add' and line['item_id'] in duplicates:
+                raise CartLineError(f"Cart item {line['item_id']} appears in more than one line.")
+            if line['op'] != 'add' and line['item_id'] not in items:
+                raise CartLineError("Cart item not found.")
+
+            if line['op'] == 'remove':
+                to_delete.append(items[line['item_id']])
+                results[index]['item'] = None
+                continue
+
+            held = 0
+            if line['op'] == 'update':
+                reservation = getattr(items[line['item_id']], 'reservation', None)
+                if reservation is not None and reservation.status == StockReservation.HELD:
+                    held = reservation.quantity
+            needed = line['quantity'] - held
+
+            product, stock_item = resolver.resolve(spec, max(needed, 0))
+            if line['op'] == 'add':
+                item = OrderItem(
+                    order=order, product=product, quantity=line['quantity'], price=resolver.prices[product.id],
+                    selected_color=spec['selected_color'], selected_features=spec.get('selected_features') or {},
+                )
+            else:
+                item = items[line['item_id']]
+                item.quantity = line['quantity']
+            item.total_price = item.quantity * item.price
+            pending.append((index, item, stock_item, needed))
+        except CartLineError as error:
+            results[index]['errors'] = [str(error)]
+
+    with transaction.atomic():
+        release_items(to_delete)
+        granted, available = take_stock([
+            (stock_item.id, needed) for _, _, stock_item, needed in pending if needed > 0
+        ])
+        granted = iter(granted)
+        to_create, to_update, released = [], [], Counter()
+        for index, item, stock_item, needed in pending:
+            if needed > 0 and not next(granted):
+                results[index]['errors'] = [f"Only {available.get(stock_item.id, 0)} items available in stock."]
+                continue
+            if needed < 0:
+                released[stock_item.id] -= needed
+            (to_update if item.pk else to_create).append((item, stock_item))
+            results[index]['item'] = item
+
+        OrderItem.objects.bulk_create([item for item, _ in to_create])
+        OrderItem.objects.bulk_update([item for item, _ in to_update], ['quantity', 'total_price'])
+        OrderItem.objects.filter(order=order, id__in=[item.pk for item in to_delete]).delete()
+        return_stock(released)
+
+        expires_at = hold_expiry()
+        new_holds = [
+            StockReservation(order_item=item, stock_item=stock_item, quantity=item.quantity, expires_at=expires_at)
+            for item, stock_item in to_create
+        ]
+        changed_holds = []
+        for item, stock_item in to_update:
+            reservation = getattr(item, 'reservation', None)
+            if reservation is None:
+                new_holds.append(StockReservation(
+                    order_item=item, stock_item=stock_item, quantity=item.quantity, expires_at=expires_at
+                ))
+            else:
+                reservation.quantity = item.quantity
+                reservation.status = StockReservation.HELD
+                reservation.expires_at = expires_at
+                changed_holds.append(reservation)
+        StockReservation.objects.bulk_create(new_holds)
+        StockReservation.objects.bulk_update(changed_holds, ['quantity', 'status', 'expires_at'])
+        order.refresh_totals()
+
+    return results
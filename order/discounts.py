@@ -0,0 +1,30 @@
+from django.db import transaction
+from django.db.models import F
+
+from order.models import DiscountCodeRedemption
+from product.models import DiscountCode
+
+
+class DiscountUnavailable(Exception):
+    """ Raised when a discount code has no uses left or is no longer in effect. """
+
+
+def redeem(order, discount_code):
+    """
+    Spends one use of `discount_code` on `order`.
+
+    The counter is bumped with a single conditional UPDATE
+    (`used_count = used_count + 1 WHERE used_count < max_uses ...`), so the
+    database serialises concurrent checkouts and never lets the count pass
+    `max_uses`. The ledger entry is written in the same transaction.
+
+    Raises:
+        DiscountUnavailable: if no use could be taken.
+    """
+    with transaction.atomic():
+        taken = DiscountCode.objects.redeemable().filter(pk=discount_code.pk).update(used_count=F('used_count') + 1)
+        if not taken:
+            raise DiscountUnavailable("Discount code is expired or overused.")
+        return DiscountCodeRedemption.objects.create(
+            discount_code=discount_code, order=order, user_id=order.user_id
+        )
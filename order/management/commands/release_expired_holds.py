@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from order.reservations import release_expired
+
+
+class Command(BaseCommand):
+    help = "Releases cart stock holds that have expired and returns their stock."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--interval', type=int, default=0,
+                            help="Keep running and sweep every N seconds (0 runs once).")
+
+    def handle(self, *args, **options):
+        while True:
+            released = release_expired(batch_size=options['batch_size'])
+            self.stdout.write(f"Released {released} expired stock holds.")
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
@@ -1,11 +1,12 @@
 from decimal import Decimal
 
 from django.db import models
-from django.db import models
+from django.db.models import DecimalField, F, Sum
 from django.utils.timezone import now
 from django.core.validators import MinValueValidator
 from account.models import User, Address
-from product.models import Product, DiscountCode
+from product.models import Product, DiscountCode, ProductStock
+from order.totals import compute_totals, discount_amount_for, refresh_order_totals, shipping_cost_for
 
 
 # === Order Model ===
@@ -49,46 +50,45 @@ class Order(models.Model):
 
     class Meta:
         ordering = ['-created_at']
-        indexes = [models.Index(fields=['-created_at'])]
+        indexes = [
+            models.Index(fields=['-created_at', '-id']),
+            models.Index(fields=['user', '-created_at', '-id']),
+        ]
         verbose_name_plural = 'orders'
         db_table = 'order'
 
-    from decimal import Decimal
+    def get_total_weight(self):
+        """ Returns the total weight of the order's items, computed in the database. """
+        return self.items.aggregate(
+            weight=Sum(F('quantity') * F('product__weight'), output_field=DecimalField(max_digits=12, decimal_places=2))
+        )['weight'] or Decimal('0')
 
     def calculate_shipping_cost(self):
         """ Calculates shipping cost based on total weight of the order. """
-        total_weight = sum(item.get_total_weight() for item in self.items.all())
-        if total_weight == 0:
-            return Decimal('0')
-        elif total_weight <= 5:
-            return Decimal('5')
-        elif total_weight <= 10:
-            return Decimal('10')
-        else:
-            return Decimal(str(total_weight)) * Decimal('1.5')
+        return shipping_cost_for(self.get_total_weight())
 
     def apply_discount(self):
         """ Applies discount code if valid and updates discount amount. """
-        if self.discount_code and self.discount_code.is_valid():
-            self.discount_amount = self.discount_code.apply_discount(self.total_price)
-        else:
-            self.discount_amount = 0
+        self.discount_amount = discount_amount_for(self.total_price, self.discount_code)
 
     def update_final_price(self):
         """ Updates final price including shipping and discount. """
-        self.apply_discount()
-        self.shipping_cost = self.calculate_shipping_cost()
-        self.final_price = max(self.total_price - self.discount_amount + self.shipping_cost, 0)
+        totals = compute_totals(self.total_price, self.get_total_weight(), self.discount_code)
+        self.shipping_cost = totals.shipping_cost
+        self.discount_amount = totals.discount_amount
+        self.final_price = totals.final_price
+
+    def refresh_totals(self):
+        """ Recomputes subtotal and every derived amount from the items and saves them with one UPDATE. """
+        return refresh_order_totals(self)
 
     def save(self, *args, **kwargs):
         """ Ensures that final price and shipping cost are updated before saving. """
-
-        is_new = self.pk is None
-        super().save(*args, **kwargs)
-
-        if not is_new:
+        if self.pk is not None:
             self.update_final_price()
-            super().save(update_fields=["shipping_cost", "final_price", "discount_amount"])
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'shipping_cost', 'final_price', 'discount_amount'}
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"Order #{self.id} - {self.user.email}"
@@ -122,7 +122,13 @@ class OrderItem(models.Model):
         """ Ensures total price is updated before saving. """
         self.total_price = self.quantity * self.price
         super().save(*args, **kwargs)
-        self.order.update_final_price()
+        self.order.refresh_totals()
+
+    def delete(self, *args, **kwargs):
+        """ Keeps the order totals in sync when an item is removed. """
+        result = super().delete(*args, **kwargs)
+        self.order.refresh_totals()
+        return result
 
     def get_total_weight(self):
         """ Returns the total weight of this item in the order. """
@@ -132,3 +138,71 @@ class OrderItem(models.Model):
         return f"{self.quantity} x {self.product.name} in Order #{self.order.id}"
 
 
+
+
+# === StockReservation Model ===
+class StockReservation(models.Model):
+    """
+    A hold on stock for a cart line.
+
+    Stock is taken from ProductStock when the line is added, committed at
+    checkout, or handed back when the hold expires or the line is removed.
+
+    Attributes:
+        order_item (OrderItem): The cart line holding the stock.
+        stock_item (ProductStock): The variant the stock was taken from.
+        quantity (int): The number of units held.
+        status (str): held, committed or released.
+        expires_at (datetime): When an uncommitted hold is released by the sweeper.
+    """
+    HELD = 'held'
+    COMMITTED = 'committed'
+    RELEASED = 'released'
+    STATUS_CHOICES = [
+        (HELD, 'Held'),
+        (COMMITTED, 'Committed'),
+        (RELEASED, 'Released'),
+    ]
+
+    order_item = models.OneToOneField(OrderItem, on_delete=models.CASCADE, related_name='reservation')
+    stock_item = models.ForeignKey(ProductStock, on_delete=models.CASCADE, related_name='reservations')
+    quantity = models.PositiveIntegerField(validators=[MinValueValidator(1)])
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=HELD)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'expires_at'])]
+        verbose_name_plural = 'stock reservations'
+        db_table = 'stock_reservation'
+
+    def __str__(self):
+        return f"{self.quantity} x {self.stock_item_id} for item #{self.order_item_id} ({self.status})"
+
+
+# === DiscountCodeRedemption Model ===
+class DiscountCodeRedemption(models.Model):
+    """
+    A ledger entry for one use of a discount code.
+
+    Written in the same transaction as the conditional `used_count` increment,
+    so the number of entries per code always matches its usage counter.
+
+    Attributes:
+        discount_code (DiscountCode): The redeemed code.
+        order (Order): The order the use was spent on.
+        user (User): The customer who redeemed it.
+        redeemed_at (datetime): When the code was redeemed.
+    """
+    discount_code = models.ForeignKey(DiscountCode, on_delete=models.CASCADE, related_name='redemptions')
+    order = models.OneToOneField(Order, on_delete=models.CASCADE, related_name='discount_redemption')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='discount_redemptions')
+    redeemed_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['discount_code', 'redeemed_at'])]
+        verbose_name_plural = 'discount code redemptions'
+        db_table = 'discount_code_redemption'
+
+    def __str__(self):
+        return f"{self.discount_code.code} redeemed on Order #{self.order_id}"
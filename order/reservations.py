@@ -0,0 +1,153 @@
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils.timezone import now
+
+from order.models import StockReservation
+from product.models import ProductStock
+from product.stock_matrix import stock_levels_changed
+
+
+class InsufficientStock(Exception):
+    """ Raised when stock cannot be held or committed for some cart lines. """
+
+    def __init__(self, message, items=()):
+        super().__init__(message)
+        self.items = list(items)
+
+
+def hold_expiry():
+    return now() + timedelta(minutes=settings.CART_HOLD_MINUTES)
+
+
+# === Stock holds ===
+def take_stock(requests):
+    """
+    Takes stock for many (stock_item_id, quantity) requests under row locks.
+
+    Rows are locked with SELECT ... FOR UPDATE in primary key order, so
+    concurrent callers queue up instead of overselling or deadlocking. Must
+    run inside a transaction.
+
+    Returns:
+        tuple: (list of booleans, one per request; {stock_item_id: stock left})
+    """
+    stock_ids = sorted({stock_item_id for stock_item_id, _ in requests})
+    locked = {
+        stock_item.pk: stock_item
+        for stock_item in ProductStock.objects.select_for_update().filter(pk__in=stock_ids).order_by('pk')
+    }
+
+    granted, changed = [], {}
+    for stock_item_id, quantity in requests:
+        stock_item = locked.get(stock_item_id)
+        if stock_item is not None and stock_item.stock >= quantity:
+            stock_item.stock -= quantity
+            changed[stock_item_id] = stock_item
+            granted.append(True)
+        else:
+            granted.append(False)
+
+    ProductStock.objects.bulk_update(changed.values(), ['stock'])
+    stock_levels_changed(
+        {stock_item.product_id for stock_item in changed.values()},
+        crossed_zero={stock_item.product_id for stock_item in changed.values() if stock_item.stock == 0},
+    )
+    return granted, {stock_item_id: stock_item.stock for stock_item_id, stock_item in locked.items()}
+
+
+def return_stock(quantities):
+    """ Adds {stock_item_id: quantity} back to stock with one conditional UPDATE per variant. """
+    quantities = {stock_item_id: quantity for stock_item_id, quantity in quantities.items() if quantity}
+    if not quantities:
+        return
+    for stock_item_id, quantity in sorted(quantities.items()):
+        ProductStock.objects.filter(pk=stock_item_id).update(stock=F('stock') + quantity)
+
+    levels = list(ProductStock.objects.filter(pk__in=quantities).values_list('pk', 'product_id', 'stock'))
+    stock_levels_changed(
+        {product_id for _, product_id, _ in levels},
+        # A variant now holding exactly what was returned was sold out before.
+        crossed_zero={product_id for pk, product_id, stock in levels if stock == quantities[pk]},
+    )
+
+
+def release(reservations):
+    """
+    Releases held reservations and hands their stock back.
+
+    Only rows still `held` are released, so a reservation is never returned twice.
+    """
+    with transaction.atomic():
+        held = list(
+            StockReservation.objects.select_for_update()
+            .filter(pk__in=[reservation.pk for reservation in reservations], status=StockReservation.HELD)
+            .order_by('pk')
+        )
+        quantities = Counter()
+        for reservation in held:
+            quantities[reservation.stock_item_id] += reservation.quantity
+        StockReservation.objects.filter(pk__in=[r.pk for r in held]).update(status=StockReservation.RELEASED)
+        return_stock(quantities)
+    return len(held)
+
+
+def release_items(items):
+    """ Releases the held stock of cart lines that are about to be removed. """
+    return release(StockReservation.objects.filter(order_item__in=items, status=StockReservation.HELD))
+
+
+def release_expired(batch_size=500, at=None):
+    """
+    Releases every hold that expired before `at`, in batches.
+
+    Rows locked by a concurrent checkout are skipped and picked up by the next run;
+    holds of paid orders are never released, their stock is sold.
+    """
+    at = at or now()
+    released = 0
+    while True:
+        with transaction.atomic():
+            batch = list(
+                StockReservation.objects.select_for_update(skip_locked=True)
+                .filter(status=StockReservation.HELD, expires_at__lte=at)
+                .exclude(order_item__order__is_paid=True)
+                .order_by('pk')[:batch_size]
+            )
+            if not batch:
+                return released
+            released += release(batch)
+
+
+# === Checkout ===
+def commit_order(order):
+    """
+    Turns the holds of an order into committed stock at checkout.
+
+    Lines whose hold expired in the meantime are reserved again; if any of them
+    is now out of stock nothing is committed and InsufficientStock is raised.
+    """
+    with transaction.atomic():
+        reservations = list(
+            StockReservation.objects.select_for_update(of=('self',))
+            .filter(order_item__order=order)
+            .exclude(status=StockReservation.COMMITTED)
+            .select_related('order_item__product')
+            .order_by('pk')
+        )
+        lapsed = [r for r in reservations if r.status == StockReservation.RELEASED]
+        if lapsed:
+            granted, _ = take_stock([(r.stock_item_id, r.order_item.quantity) for r in lapsed])
+            missing = [r.order_item for r, ok in zip(lapsed, granted) if not ok]
+            if missing:
+                names = ", ".join(item.product.name for item in missing)
+                raise InsufficientStock(f"No longer in stock: {names}.", missing)
+
+        for reservation in lapsed:
+            reservation.quantity = reservation.order_item.quantity
+        for reservation in reservations:
+            reservation.status = StockReservation.COMMITTED
+        StockReservation.objects.bulk_update(reservations, ['status', 'quantity'])
@@ -1,10 +1,25 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from decimal import Decimal
+from io import StringIO
+from unittest import mock, skipUnless
 
-from django.test import TestCase
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils.timezone import now, timedelta
+from rest_framework.exceptions import ValidationError
 
 from account.models import User, Address
-from order.models import Order, OrderItem
-from product.models import Product, DiscountCode
+from order.api.serializers import CheckoutSerializer
+from order.discounts import DiscountUnavailable, redeem
+from order.models import DiscountCodeRedemption, Order, OrderItem, StockReservation
+from order.reservations import release_expired, take_stock
+from order.totals import compute_totals
+from product.models import Product, DiscountCode, Category, Brand, Feature, FeatureValue, ProductColor, ProductStock
+from product.stock_matrix import get_matrix
+from src.admin_performance import RelatedLookupFilter
 
 
 # Create your tests here.
@@ -97,3 +112,477 @@ class OrderItemModelTest(TestCase):
         """ Test if the order updates its final price when an item is added """
         self.order.refresh_from_db()
         self.assertEqual(self.order.final_price, Decimal("100.00"))  # Initial total price
+
+
+class OrderHistoryPaginationTest(TestCase):
+
+    def setUp(self):
+        """ Set up a user with more paid orders than fit on one page """
+        self.user = User.objects.create_user(email="user@example.com", password="password123")
+        self.orders = [Order.objects.create(user=self.user, is_paid=True) for _ in range(12)]
+        Order.objects.create(user=self.user, is_paid=False)
+        self.client.force_login(self.user)
+
+    def test_order_history_pages(self):
+        """ Test order history is paginated newest first with a cursor """
+        first = self.client.get("/api/orders/", HTTP_ACCEPT="application/json").json()
+        self.assertEqual(len(first["results"]), 10)
+        self.assertIsNone(first["count"])
+        second = self.client.get(first["next"], HTTP_ACCEPT="application/json").json()
+        self.assertIsNone(second["next"])
+        ids = [order["id"] for order in first["results"] + second["results"]]
+        self.assertEqual(ids, [order.id for order in reversed(self.orders)])
+
+    def test_items_do_not_add_queries(self):
+        """ Test order items and their product names are loaded in one query per page """
+        category = Category.objects.create(name="Electronics", slug="electronics")
+        brand = Brand.objects.create(name="Acme", slug="acme")
+        product = Product.objects.create(category=category, brand=brand, name="Phone", price=Decimal("100.00"))
+        with CaptureQueriesContext(connection) as without_items:
+            self.client.get("/api/orders/", HTTP_ACCEPT="application/json")
+        for order in self.orders:
+            OrderItem.objects.create(order=order, product=product, quantity=1, price=product.price)
+        with CaptureQueriesContext(connection) as with_items:
+            response = self.client.get("/api/orders/", HTTP_ACCEPT="application/json")
+        self.assertEqual(response.json()["results"][0]["items"][0]["product_name"], "Phone")
+        self.assertEqual(len(with_items.captured_queries), len(without_items.captured_queries))
+
+
+class OrderTotalsTest(TestCase):
+
+    def setUp(self):
+        """ Set up a cart and a product """
+        self.user = User.objects.create_user(email="user@example.com", password="password123")
+        self.order = Order.objects.create(user=self.user)
+        category = Category.objects.create(name="Electronics", slug="electronics")
+        brand = Brand.objects.create(name="Acme", slug="acme")
+        self.product = Product.objects.create(
+            category=category, brand=brand, name="Laptop", price=Decimal("50.00"), weight=Decimal("2.00")
+        )
+
+    def add_item(self, quantity=1):
+        return OrderItem.objects.create(order=self.order, product=self.product, quantity=quantity, price=self.product.price)
+
+    def test_compute_totals(self):
+        """ Test the pure totals calculation across shipping tiers and discounts """
+        code = DiscountCode(value=Decimal("10"), discount_type="percent", end_date=now() + timedelta(days=1), max_uses=1)
+        self.assertEqual(compute_totals(Decimal("0"), 0), (0, 0, 0, 0, 0))
+        self.assertEqual(compute_totals(Decimal("100.00"), Decimal("4")).final_price, Decimal("105.00"))
+        self.assertEqual(compute_totals(Decimal("100.00"), Decimal("8")).shipping_cost, Decimal("10"))
+        self.assertEqual(compute_totals(Decimal("100.00"), Decimal("12")).shipping_cost, Decimal("18.00"))
+        totals = compute_totals(Decimal("100.00"), Decimal("4"), code)
+        self.assertEqual(totals.discount_amount, Decimal("10.00"))
+        self.assertEqual(totals.final_price, Decimal("95.00"))
+
+    def test_totals_persisted_on_add_and_delete(self):
+        """ Test adding and removing items keeps the stored totals in sync """
+        self.add_item(quantity=2)
+        item = self.add_item(quantity=3)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.total_price, Decimal("250.00"))
+        self.assertEqual(self.order.shipping_cost, Decimal("10.00"))
+        self.assertEqual(self.order.final_price, Decimal("260.00"))
+
+        item.delete()
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.total_price, Decimal("100.00"))
+        self.assertEqual(self.order.final_price, Decimal("105.00"))
+
+    def test_add_item_query_count_is_constant(self):
+        """ Test adding the 50th item costs the same number of queries as the first """
+        with CaptureQueriesContext(connection) as first:
+            self.add_item()
+        for _ in range(48):
+            self.add_item()
+        with CaptureQueriesContext(connection) as fiftieth:
+            self.add_item()
+        self.assertEqual(len(fiftieth.captured_queries), len(first.captured_queries))
+        self.assertEqual(len(fiftieth.captured_queries), 3)
+
+
+class CartBulkTest(TestCase):
+
+    def setUp(self):
+        """ Set up a product with two stocked colors and a storage feature """
+        self.user = User.objects.create_user(email="user@example.com", password="password123")
+        self.client.force_login(self.user)
+        category = Category.objects.create(name="Electronics", slug="electronics")
+        brand = Brand.objects.create(name="Acme", slug="acme")
+        storage = Feature.objects.create(name="Storage")
+        self.gb128 = FeatureValue.objects.create(feature=storage, value="128GB")
+        self.products = []
+        for i in range(20):
+            product = Product.objects.create(
+                category=category, brand=brand, name=f"Phone {i}", price=Decimal("100.00"), weight=Decimal("0.5")
+            )
+            for name in ("Black", "White"):
+                color = ProductColor.objects.create(product=product, name=name)
+                stock = ProductStock.objects.create(product=product, color=color, stock=5)
+                stock.feature_values.add(self.gb128)
+            self.products.append(product)
+
+    def post(self, lines):
+        return self.client.post("/api/cart/bulk/", {"lines": lines}, content_type="application/json")
+
+    def add_line(self, product, quantity=1, color="Black"):
+        return {"op": "add", "product_id": product.id, "quantity": quantity, "selected_color": color,
+                "selected_features": {"Storage": "128GB"}}
+
+    def test_partial_success(self):
+        """ Test invalid lines are reported without aborting the valid ones """
+        response = self.post([
+            self.add_line(self.products[0], quantity=2),
+            self.add_line(self.products[1], color="Red"),
+            self.add_line(self.products[2], quantity=9),
+            {"op": "update"},
+        ])
+        self.assertEqual(response.status_code, 200)
+        results = response.json()["results"]
+        self.assertEqual(results[0]["item"]["quantity"], 2)
+        self.assertEqual(results[1]["errors"], ["Invalid color for selected product."])
+        self.assertEqual(results[2]["errors"], ["Only 5 items available in stock."])
+        self.assertIn("item_id", results[3]["errors"])
+        self.assertEqual(response.json()["total_price"], "200.00")
+
+    def test_update_and_remove(self):
+        """ Test existing cart lines can be updated and removed in the same request """
+        added = self.post([self.add_line(self.products[0]), self.add_line(self.products[1])]).json()["results"]
+        response = self.post([
+            {"op": "update", "item_id": added[0]["item"]["id"], "quantity": 3},
+            {"op": "remove", "item_id": added[1]["item"]["id"]},
+        ])
+        self.assertEqual(response.status_code, 200)
+        order = Order.objects.get(user=self.user, is_paid=False)
+        self.assertEqual(list(order.items.values_list("quantity", flat=True)), [3])
+        self.assertEqual(order.total_price, Decimal("300.00"))
+
+    def test_repeated_item_lines_fail(self):
+        """ Test every line naming an already named cart item fails without touching its stock, the rest apply """
+        item_id = self.post([self.add_line(self.products[0], quantity=2)]).json()["results"][0]["item"]["id"]
+        response = self.post([
+            {"op": "update", "item_id": item_id, "quantity": 4},
+            self.add_line(self.products[1]),
+            {"op": "remove", "item_id": item_id},
+        ])
+        self.assertEqual(response.status_code, 200)
+        results = response.json()["results"]
+        error = [f"Cart item {item_id} appears in more than one line."]
+        self.assertEqual((results[0]["errors"], results[2]["errors"]), (error, error))
+        self.assertEqual(results[1]["item"]["quantity"], 1)
+        self.assertEqual(OrderItem.objects.get(pk=item_id).quantity, 2)
+        self.assertEqual(ProductStock.objects.get(product=self.products[0], color__name="Black").stock, 3)
+
+    def test_all_lines_failing(self):
+        """ Test a request where every line fails is rejected """
+        response = self.post([{"op": "remove", "item_id": 999}])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["results"][0]["errors"], ["Cart item not found."])
+
+    def test_query_count_is_constant(self):
+        """ Test 2 and 20 lines cost the same number of queries """
+        with CaptureQueriesContext(connection) as small:
+            self.post([self.add_line(product) for product in self.products[:2]])
+        Order.objects.all().delete()
+        with CaptureQueriesContext(connection) as large:
+            self.post([self.add_line(product) for product in self.products])
+        self.assertEqual(len(large.captured_queries), len(small.captured_queries))
+        self.assertEqual(Order.objects.get(user=self.user).items.count(), 20)
+
+
+class StockReservationTest(TestCase):
+
+    def setUp(self):
+        """ Set up a product variant with 5 units in stock """
+        self.user = User.objects.create_user(email="user@example.com", password="password123")
+        self.client.force_login(self.user)
+        category = Category.objects.create(name="Electronics", slug="electronics")
+        brand = Brand.objects.create(name="Acme", slug="acme")
+        self.product = Product.objects.create(category=category, brand=brand, name="Phone", price=Decimal("100.00"))
+        color = ProductColor.objects.create(product=self.product, name="Black")
+        self.stock = ProductStock.objects.create(product=self.product, color=color, stock=5)
+
+    def add_to_cart(self, quantity):
+        return self.client.post("/api/cart/", {
+            "product_id": self.product.id, "quantity": quantity, "selected_color": "Black"
+        }, content_type="application/json")
+
+    def test_add_holds_stock(self):
+        """ Test adding to the cart takes the stock and records a hold """
+        response = self.add_to_cart(3)
+        self.assertEqual(response.status_code, 201)
+        self.stock.refresh_from_db()
+        self.assertEqual(self.stock.stock, 2)
+        reservation = StockReservation.objects.get()
+        self.assertEqual((reservation.quantity, reservation.status), (3, StockReservation.HELD))
+        self.assertEqual(self.add_to_cart(3).status_code, 400)
+
+    def test_remove_releases_stock(self):
+        """ Test removing a cart line hands its stock back """
+        item_id = self.add_to_cart(3).json()["id"]
+        self.assertEqual(self.client.delete(f"/api/cart/item/{item_id}/").status_code, 204)
+        self.stock.refresh_from_db()
+        self.assertEqual(self.stock.stock, 5)
+
+    def test_bulk_update_adjusts_hold(self):
+        """ Test changing a line's quantity takes or returns only the difference """
+        item_id = self.add_to_cart(2).json()["id"]
+        self.client.post("/api/cart/bulk/", {"lines": [{"op": "update", "item_id": item_id, "quantity": 4}]},
+                         content_type="application/json")
+        self.stock.refresh_from_db()
+        self.assertEqual(self.stock.stock, 1)
+        self.client.post("/api/cart/bulk/", {"lines": [{"op": "update", "item_id": item_id, "quantity": 1}]},
+                         content_type="application/json")
+        self.stock.refresh_from_db()
+        self.assertEqual(self.stock.stock, 4)
+        self.assertEqual(StockReservation.objects.get().quantity, 1)
+
+    def test_sweeper_releases_expired_holds(self):
+        """ Test the sweeper command returns the stock of expired holds only """
+        self.add_to_cart(2)
+        self.add_to_cart(1)
+        StockReservation.objects.filter(quantity=2).update(expires_at=now() - timedelta(minutes=1))
+        call_command("release_expired_holds", stdout=StringIO())
+        self.stock.refresh_from_db()
+        self.assertEqual(self.stock.stock, 4)
+        self.assertEqual(StockReservation.objects.get(quantity=2).status, StockReservation.RELEASED)
+        self.assertEqual(StockReservation.objects.get(quantity=1).status, StockReservation.HELD)
+
+    def test_checkout_commits_holds(self):
+        """ Test checkout commits held stock and re-takes stock for expired holds """
+        self.add_to_cart(2)
+        StockReservation.objects.update(expires_at=now() - timedelta(minutes=1))
+        release_expired()
+        self.add_to_cart(1)
+        response = self.client.post("/api/checkout/", {}, content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        self.stock.refresh_from_db()
+        self.assertEqual(self.stock.stock, 2)
+        self.assertEqual(set(StockReservation.objects.values_list("status", flat=True)), {StockReservation.COMMITTED})
+
+    def test_checkout_fails_when_expired_hold_is_gone(self):
+        """ Test checkout is refused if an expired hold can no longer be honoured """
+        self.add_to_cart(2)
+        StockReservation.objects.update(expires_at=now() - timedelta(minutes=1))
+        release_expired()
+        ProductStock.objects.update(stock=1)
+        response = self.client.post("/api/checkout/", {}, content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.get(user=self.user).is_paid)
+
+    def test_paid_receipt_commits_holds(self):
+        """ Test paying through the receipt commits the holds, so the sweeper leaves the stock sold """
+        self.add_to_cart(2)
+        order = Order.objects.get(user=self.user)
+        response = self.client.patch(f"/api/receipt/{order.id}/", {}, content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(StockReservation.objects.get().status, StockReservation.COMMITTED)
+
+        StockReservation.objects.update(status=StockReservation.HELD, expires_at=now() - timedelta(minutes=1))
+        release_expired()
+        self.stock.refresh_from_db()
+        self.assertEqual(self.stock.stock, 3)
+        self.assertEqual(StockReservation.objects.get().status, StockReservation.HELD)
+
+    def test_take_stock_grants_only_what_is_left(self):
+        """ Test competing requests for one variant are granted until the stock runs out, never past it """
+        with transaction.atomic():
+            granted, left = take_stock([(self.stock.id, 2)] * 4)
+        self.assertEqual(granted, [True, True, False, False])
+        self.assertEqual(left, {self.stock.id: 1})
+        self.stock.refresh_from_db()
+        self.assertEqual(self.stock.stock, 1)
+
+    def test_stock_matrix_follows_holds(self):
+        """ Test taking and returning stock drops the cached stock matrix """
+        self.assertEqual(get_matrix(self.product.id).variants[0]["stock"], 5)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.add_to_cart(5)
+        self.assertEqual(get_matrix(self.product.id).variants[0]["stock"], 0)
+        self.assertEqual(self.add_to_cart(1).json()["non_field_errors"], ["Only 0 items available in stock."])
+
+
+@skipUnless(connection.features.has_select_for_update,
+            "Row locking needs a database with SELECT ... FOR UPDATE; run with src.settings_test_postgres")
+class StockReservationConcurrencyTest(TransactionTestCase):
+
+    def test_no_oversell_under_contention(self):
+        """ Test 50 concurrent buyers of 10 units never oversell """
+        category = Category.objects.create(name="Electronics", slug="electronics")
+        brand = Brand.objects.create(name="Acme", slug="acme")
+        product = Product.objects.create(category=category, brand=brand, name="Phone", price=Decimal("100.00"))
+        color = ProductColor.objects.create(product=product, name="Black")
+        stock = ProductStock.objects.create(product=product, color=color, stock=10)
+        barrier = threading.Barrier(50)
+
+        def buy():
+            try:
+                barrier.wait()
+                with transaction.atomic():
+                    return take_stock([(stock.id, 1)])[0][0]
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=50) as pool:
+            granted = list(pool.map(lambda _: buy(), range(50)))
+
+        stock.refresh_from_db()
+        self.assertEqual(granted.count(True), 10)
+        self.assertEqual(stock.stock, 0)
+
+
+class DiscountRedemptionTest(TestCase):
+
+    def setUp(self):
+        """ Set up a cart and a code with two uses """
+        self.user = User.objects.create_user(email="user@example.com", password="password123")
+        self.client.force_login(self.user)
+        category = Category.objects.create(name="Electronics", slug="electronics")
+        brand = Brand.objects.create(name="Acme", slug="acme")
+        self.product = Product.objects.create(
+            category=category, brand=brand, name="Phone", price=Decimal("100.00"), weight=1
+        )
+        self.code = DiscountCode.objects.create(
+            code="SAVE10", value=Decimal("10"), discount_type="percent", end_date=now() + timedelta(days=1), max_uses=2
+        )
+
+    def test_redeem_counts_and_records_use(self):
+        """ Test a redemption bumps the counter and writes a ledger entry """
+        order = Order.objects.create(user=self.user)
+        redemption = redeem(order, self.code)
+        self.code.refresh_from_db()
+        self.assertEqual(self.code.used_count, 1)
+        self.assertEqual((redemption.order, redemption.user), (order, self.user))
+
+    def test_redeem_refuses_exhausted_code(self):
+        """ Test a code with no uses left is refused without touching the ledger """
+        DiscountCode.objects.filter(pk=self.code.pk).update(used_count=2)
+        with self.assertRaises(DiscountUnavailable):
+            redeem(Order.objects.create(user=self.user), self.code)
+        self.assertFalse(DiscountCodeRedemption.objects.exists())
+
+    def test_redeem_checks_uses_in_the_database(self):
+        """ Test a stale code object cannot take more uses than the database has left """
+        stale = DiscountCode.objects.get(pk=self.code.pk)
+        for _ in range(2):
+            redeem(Order.objects.create(user=self.user), stale)
+        self.assertEqual(stale.used_count, 0)
+        with self.assertRaises(DiscountUnavailable):
+            redeem(Order.objects.create(user=self.user), stale)
+        self.assertEqual(DiscountCode.objects.get(pk=self.code.pk).used_count, 2)
+        self.assertEqual(DiscountCodeRedemption.objects.count(), 2)
+
+    def test_checkout_keeps_discount_after_last_use(self):
+        """ Test taking the last use of a code still discounts the order that took it """
+        DiscountCode.objects.filter(pk=self.code.pk).update(used_count=1)
+        order = Order.objects.create(user=self.user)
+        OrderItem.objects.create(order=order, product=self.product, quantity=1, price=self.product.price)
+        response = self.client.post("/api/checkout/", {"discount_code": "SAVE10"}, content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        order.refresh_from_db()
+        self.assertEqual(order.discount_amount, Decimal("10.00"))
+        self.assertEqual(DiscountCode.objects.get(pk=self.code.pk).used_count, 2)
+
+    def test_repeated_checkout_is_rejected(self):
+        """ Test a checkout of a cart another request paid meanwhile fails with 400, the code used once """
+        order = Order.objects.create(user=self.user)
+        OrderItem.objects.create(order=order, product=self.product, quantity=1, price=self.product.price)
+        serializer = CheckoutSerializer(instance=order, data={"discount_code": "SAVE10"},
+                                        context={"request": mock.Mock(user=self.user)})
+        serializer.is_valid(raise_exception=True)
+        self.assertEqual(self.client.post("/api/checkout/", {"discount_code": "SAVE10"},
+                                          content_type="application/json").status_code, 200)
+        with self.assertRaisesMessage(ValidationError, "This order is already checked out."):
+            serializer.save()
+        self.assertEqual(DiscountCode.objects.get(pk=self.code.pk).used_count, 1)
+
+
+@skipUnless(connection.features.has_select_for_update,
+            "Concurrent writers need a database with row-level locking; run with src.settings_test_postgres")
+class DiscountRedemptionConcurrencyTest(TransactionTestCase):
+
+    def test_no_overuse_under_contention(self):
+        """ Test 200 concurrent redemptions of a code with 10 uses succeed exactly 10 times """
+        user = User.objects.create_user(email="user@example.com", password="password123")
+        orders = Order.objects.bulk_create([Order(user=user) for _ in range(200)])
+        code = DiscountCode.objects.create(
+            code="RUSH", value=Decimal("10"), discount_type="percent", end_date=now() + timedelta(days=1), max_uses=10
+        )
+
+        def attempt(order):
+            try:
+                redeem(order, code)
+                return True
+            except DiscountUnavailable:
+                return False
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=50) as pool:
+            results = list(pool.map(attempt, orders))
+
+        code.refresh_from_db()
+        self.assertEqual(results.count(True), 10)
+        self.assertEqual(code.used_count, 10)
+        self.assertEqual(code.redemptions.count(), 10)
+
+
+
+@override_settings(ADMIN_PERFORMANCE_MODE=True, ADMIN_FULL_FILTER_LIMIT=2)
+class AdminChangelistPerformanceTest(TestCase):
+
+    def setUp(self):
+        """ Set up a superuser and a product with variants """
+        self.admin = User.objects.create_superuser(email="admin@example.com", password="password123")
+        self.client.force_login(self.admin)
+        category = Category.objects.create(name="Electronics", slug="electronics")
+        brand = Brand.objects.create(name="Acme", slug="acme")
+        self.product = Product.objects.create(category=category, brand=brand, name="Phone", price=Decimal("100.00"))
+        # A relation filter is only shown with at least two related rows to choose from.
+        Product.objects.create(category=category, brand=brand, name="Tablet", price=Decimal("200.00"))
+        self.feature = Feature.objects.create(name="Size")
+        self.rows = 0
+
+    def add_rows(self, count):
+        """ Adds `count` orders with one line each and `count` stock variants with two features each """
+        # Numbered on from earlier calls: colors and feature values are unique per product and feature.
+        start, self.rows = self.rows, self.rows + count
+        for i in range(start, self.rows):
+            order = Order.objects.create(user=self.admin)
+            OrderItem.objects.create(order=order, product=self.product, quantity=1, price=Decimal("100.00"))
+            color = ProductColor.objects.create(product=self.product, name=f"Color {i}")
+            stock = ProductStock.objects.create(product=self.product, color=color, stock=1)
+            stock.feature_values.add(*(FeatureValue.objects.create(feature=self.feature, value=f"{i}-{j}")
+                                       for j in range(2)))
+
+    def changelist_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response, len(context)
+
+    def test_query_count_does_not_grow_with_rows(self):
+        """ Test each changelist runs the same number of queries for 3 and 10 rows """
+        urls = ("/admin/order/order/", "/admin/order/orderitem/", "/admin/product/productstock/")
+        self.add_rows(3)
+        few = [self.changelist_queries(url)[1] for url in urls]
+        self.add_rows(7)
+        many = [self.changelist_queries(url)[1] for url in urls]
+        self.assertEqual(few, many)
+
+    def test_big_relations_get_lookup_filters(self):
+        """ Test relations to tables over ADMIN_FULL_FILTER_LIMIT rows are filtered by id, not listed """
+        self.add_rows(3)
+        order = Order.objects.first()
+        response, _ = self.changelist_queries(f"/admin/order/orderitem/?order__id__exact={order.id}")
+        specs = {spec.field.name: type(spec) for spec in response.context["cl"].filter_specs}
+        self.assertIs(specs["order"], RelatedLookupFilter)
+        self.assertIsNot(specs["product"], RelatedLookupFilter)
+        self.assertEqual(response.context["cl"].result_count, 1)
+        self.assertContains(response, f"Order #{order.id}")
+
+    def test_stock_admin_offers_autocomplete(self):
+        """ Test foreign keys to searchable admins use autocomplete widgets on the change form """
+        self.add_rows(1)
+        stock = ProductStock.objects.first()
+        response = self.client.get(f"/admin/product/productstock/{stock.pk}/change/")
+        self.assertContains(response, "admin-autocomplete")
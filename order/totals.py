@@ -0,0 +1,87 @@
+from collections import namedtuple
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db.models import DecimalField, F, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils.timezone import now
+
+CENT = Decimal('0.01')
+
+OrderTotals = namedtuple('OrderTotals', ['subtotal', 'total_weight', 'shipping_cost', 'discount_amount', 'final_price'])
+
+
+# === Pure calculations ===
+def shipping_cost_for(total_weight):
+    """ Returns the shipping tier price for a total weight (kg). """
+    total_weight = Decimal(total_weight)
+    if total_weight == 0:
+        return Decimal('0')
+    elif total_weight <= 5:
+        return Decimal('5')
+    elif total_weight <= 10:
+        return Decimal('10')
+    return (total_weight * Decimal('1.5')).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def discount_amount_for(subtotal, discount_code):
+    """
+    Returns how much `discount_code` takes off `subtotal` (0 if there is no code in effect).
+
+    A code is only attached to an order once one of its uses has been redeemed
+    for it, so the usage limit is not checked again here.
+    """
+    if discount_code is None or not discount_code.is_in_effect():
+        return Decimal('0')
+    discounted = discount_code.apply_discount(subtotal, redeemed=True)
+    return (subtotal - discounted).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def compute_totals(subtotal, total_weight, discount_code=None):
+    """
+    Computes every derived order amount from the item subtotal and total weight.
+
+    Returns:
+        OrderTotals: subtotal, total_weight, shipping_cost, discount_amount and final_price.
+    """
+    subtotal = Decimal(subtotal).quantize(CENT, rounding=ROUND_HALF_UP)
+    shipping_cost = shipping_cost_for(total_weight)
+    discount_amount = discount_amount_for(subtotal, discount_code)
+    final_price = max(subtotal - discount_amount + shipping_cost, Decimal('0'))
+    return OrderTotals(subtotal, Decimal(total_weight), shipping_cost, discount_amount, final_price)
+
+
+# === Database ===
+def _money(expression):
+    return Coalesce(expression, Value(Decimal('0')), output_field=DecimalField(max_digits=12, decimal_places=2))
+
+
+def aggregate_totals(order_id):
+    """ Loads the item subtotal, total weight and discount code of an order in one aggregate query. """
+    from order.models import Order
+
+    order = (
+        Order.objects.filter(pk=order_id)
+        .select_related('discount_code')
+        .annotate(
+            items_subtotal=_money(Sum('items__total_price')),
+            items_weight=_money(Sum(F('items__quantity') * F('items__product__weight'),
+                                    output_field=DecimalField(max_digits=12, decimal_places=2))),
+        )
+        .get()
+    )
+    return compute_totals(order.items_subtotal, order.items_weight, order.discount_code)
+
+
+def refresh_order_totals(order):
+    """ Recomputes an order's totals from its items and persists them with a single UPDATE. """
+    totals = aggregate_totals(order.pk)
+    values = {
+        'total_price': totals.subtotal,
+        'shipping_cost': totals.shipping_cost,
+        'discount_amount': totals.discount_amount,
+        'final_price': totals.final_price,
+    }
+    type(order).objects.filter(pk=order.pk).update(updated_at=now(), **values)
+    for field, value in values.items():
+        setattr(order, field, value)
+    return totals
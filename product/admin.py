@@ -1,5 +1,9 @@
 from django.contrib import admin
+from django.contrib.admin.views.main import ChangeList
 from django.utils.html import format_html
+from account.roles import RoleAdminMixin
+from src.admin_performance import PerformanceAdminMixin
+from .pricing import final_prices
 from .models import (
     Category, Product, Discount, DiscountCode, Image,
     ProductFeature, Brand, Feature, FeatureValue,
@@ -7,24 +11,15 @@ from .models import (
 )
 
 # === Permission Mixin ===
-class ProductAdminPermissionMixin:
-    def has_view_permission(self, request, obj=None):
-        return request.user.groups.filter(name__in=['Product Manager', 'Supervisor']).exists() or request.user.is_superuser
-
-    def has_add_permission(self, request):
-        return request.user.groups.filter(name='Product Manager').exists() or request.user.is_superuser
-
-    def has_change_permission(self, request, obj=None):
-        return request.user.groups.filter(name='Product Manager').exists() or request.user.is_superuser
-
-    def has_delete_permission(self, request, obj=None):
-        return request.user.groups.filter(name='Product Manager').exists() or request.user.is_superuser
+class ProductAdminPermissionMixin(RoleAdminMixin):
+    view_roles = ('Product Manager', 'Supervisor')
+    edit_roles = ('Product Manager',)
 
 
 # === Admins with permission ===
 
 @admin.register(Category)
-class CategoryAdmin(ProductAdminPermissionMixin, admin.ModelAdmin):
+class CategoryAdmin(ProductAdminPermissionMixin, PerformanceAdminMixin, admin.ModelAdmin):
     list_display = ['name', 'parent', 'updated', 'is_deleted']
     ordering = ['name']
     list_filter = ['parent', 'is_deleted']
@@ -33,9 +28,19 @@ class CategoryAdmin(ProductAdminPermissionMixin, admin.ModelAdmin):
     prepopulated_fields = {'slug': ['name']}
 
 
+class ProductChangeList(ChangeList):
+    """ Prices the whole changelist page with one pricing-engine call. """
+
+    def get_results(self, request):
+        super().get_results(request)
+        prices = final_prices(list(self.result_list))
+        for product in self.result_list:
+            product.computed_final_price = prices[product.id]
+
+
 @admin.register(Product)
-class ProductAdmin(ProductAdminPermissionMixin, admin.ModelAdmin):
-    list_display = ['name', 'category', 'price', 'is_active', 'created']
+class ProductAdmin(ProductAdminPermissionMixin, PerformanceAdminMixin, admin.ModelAdmin):
+    list_display = ['name', 'category', 'price', 'final_price', 'is_active', 'created']
     ordering = ['-created']
     list_filter = ['category', 'is_active', 'created']
     search_fields = ['name', 'description']
@@ -43,15 +48,22 @@ class ProductAdmin(ProductAdminPermissionMixin, admin.ModelAdmin):
     list_editable = ['price', 'is_active']
     prepopulated_fields = {'slug': ['name']}
 
+    def get_changelist(self, request, **kwargs):
+        return ProductChangeList
+
+    def final_price(self, obj):
+        return getattr(obj, 'computed_final_price', obj.price)
+    final_price.short_description = "Final price"
+
 
 @admin.register(Feature)
-class FeatureAdmin(ProductAdminPermissionMixin, admin.ModelAdmin):
+class FeatureAdmin(ProductAdminPermissionMixin, PerformanceAdminMixin, admin.ModelAdmin):
     list_display = ['name']
     search_fields = ['name']
 
 
 @admin.register(FeatureValue)
-class FeatureValueAdmin(ProductAdminPermissionMixin, admin.ModelAdmin):
+class FeatureValueAdmin(ProductAdminPermissionMixin, PerformanceAdminMixin, admin.ModelAdmin):
     list_display = ['feature', 'value', 'hex_code', 'color_swatch_display']
     list_filter = ['feature']
     search_fields = ['value']
@@ -66,14 +78,15 @@ class FeatureValueAdmin(ProductAdminPermissionMixin, admin.ModelAdmin):
 
 
 @admin.register(ProductFeature)
-class ProductFeatureAdmin(ProductAdminPermissionMixin, admin.ModelAdmin):
+class ProductFeatureAdmin(ProductAdminPermissionMixin, PerformanceAdminMixin, admin.ModelAdmin):
     list_display = ['product', 'feature_value']
+    list_select_related = ['feature_value__feature']
     list_filter = ['feature_value__feature']
     search_fields = ['product__name', 'feature_value__value']
 
 
 @admin.register(ProductColor)
-class ProductColorAdmin(ProductAdminPermissionMixin, admin.ModelAdmin):
+class ProductColorAdmin(ProductAdminPermissionMixin, PerformanceAdminMixin, admin.ModelAdmin):
     list_display = ['product', 'name', 'hex_code', 'color_display']
     list_filter = ['product']
     search_fields = ['name', 'product__name']
@@ -86,14 +99,14 @@ class ProductColorAdmin(ProductAdminPermissionMixin, admin.ModelAdmin):
 
 
 @admin.register(Brand)
-class BrandAdmin(ProductAdminPermissionMixin, admin.ModelAdmin):
+class BrandAdmin(ProductAdminPermissionMixin, PerformanceAdminMixin, admin.ModelAdmin):
     list_display = ['name', 'slug']
     search_fields = ['name', 'description']
     prepopulated_fields = {'slug': ['name']}
 
 
 @admin.register(Discount)
-class DiscountAdmin(ProductAdminPermissionMixin, admin.ModelAdmin):
+class DiscountAdmin(ProductAdminPermissionMixin, PerformanceAdminMixin, admin.ModelAdmin):
     list_display = ['product', 'discount_type', 'value', 'start_date', 'end_date', 'active']
     ordering = ['-start_date']
     list_filter = ['discount_type', 'active']
@@ -102,7 +115,7 @@ class DiscountAdmin(ProductAdminPermissionMixin, admin.ModelAdmin):
 
 
 @admin.register(DiscountCode)
-class DiscountCodeAdmin(ProductAdminPermissionMixin, admin.ModelAdmin):
+class DiscountCodeAdmin(ProductAdminPermissionMixin, PerformanceAdminMixin, admin.ModelAdmin):
     list_display = ['code', 'discount_type', 'value', 'start_date', 'end_date', 'max_uses', 'used_count', 'active']
     ordering = ['-start_date']
     list_filter = ['discount_type', 'active']
@@ -111,16 +124,19 @@ class DiscountCodeAdmin(ProductAdminPermissionMixin, admin.ModelAdmin):
 
 
 @admin.register(Image)
-class ImageAdmin(ProductAdminPermissionMixin, admin.ModelAdmin):
+class ImageAdmin(ProductAdminPermissionMixin, PerformanceAdminMixin, admin.ModelAdmin):
     list_display = ['product', 'title', 'created']
     ordering = ['-created']
     search_fields = ['product__name', 'title']
 
 
 @admin.register(ProductStock)
-class ProductStockAdmin(ProductAdminPermissionMixin, admin.ModelAdmin):
+class ProductStockAdmin(ProductAdminPermissionMixin, PerformanceAdminMixin, admin.ModelAdmin):
     list_display = ('product', 'color', 'get_features', 'stock')
     filter_horizontal = ('feature_values',)
+    # ProductColor.__str__ reads its product's name.
+    list_select_related = ['color__product']
+    list_prefetch_related = ['feature_values__feature']
 
     def get_features(self, obj):
         return ", ".join(f"{fv.feature.name}: {fv.value}" for fv in obj.feature_values.all())
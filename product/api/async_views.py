@@ -0,0 +1,161 @@
+"""
+Async (ASGI) versions of the catalog read endpoints.
+
+Independent sub-fetches of a page run concurrently with `asyncio.gather`
+through Django's async ORM. Redis calls and serialization, which may queue
+image variants over Redis (see images.py), run through `sync_to_async`, so
+the event loop is never blocked on I/O. The JSON bodies match the sync API
+and share its Redis response cache.
+"""
+import asyncio
+import logging
+import weakref
+from functools import wraps
+
+import redis
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponseNotAllowed, JsonResponse
+from rest_framework.utils.encoders import JSONEncoder
+
+from product.models import Brand, Category, Image, Product, ProductColor, ProductFeature
+from product.stock_matrix import get_matrices
+from src.instrumentation import timed
+from src.settings import redis_client
+from .cache import CATALOG_MODELS, cached_response, response_cache_key, store_response
+from .query_plans import plan_queryset
+from .serializers import BrandSerializer, CategorySerializer, ProductSerializer
+
+logger = logging.getLogger(__name__)
+
+
+def json_response(data, status=200):
+    return JsonResponse(data, status=status, safe=False, encoder=JSONEncoder)
+
+
+def not_found():
+    return json_response({'detail': "Not found."}, status=404)
+
+
+_db_slots = weakref.WeakKeyDictionary()
+
+
+def db_slots():
+    """
+    The semaphore capping how many requests of this process's event loop query
+    the database at once (ASYNC_CATALOG_DB_CONCURRENCY). Every request's ORM
+    calls run on their own thread with their own connection, so without a cap
+    a burst of connections turns into a burst of Postgres connections. Excess
+    requests wait on the loop instead.
+    """
+    loop = asyncio.get_running_loop()
+    if loop not in _db_slots:
+        _db_slots[loop] = asyncio.Semaphore(settings.ASYNC_CATALOG_DB_CONCURRENCY)
+    return _db_slots[loop]
+
+
+def cached_async(dependencies=CATALOG_MODELS):
+    """
+    The CachedResponseMixin of async views: GET only, with JSON bodies served
+    and stored by catalog version. Misses are rendered within `db_slots()`.
+    """
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return HttpResponseNotAllowed(['GET', 'HEAD'])
+            try:
+                key = await sync_to_async(response_cache_key)(request, dependencies)
+                cached = await sync_to_async(redis_client.get)(key)
+            except redis.RedisError:
+                logger.warning("Catalog cache unavailable", exc_info=True)
+                async with db_slots():
+                    return await view(request, *args, **kwargs)
+
+            if cached is not None:
+                return await sync_to_async(cached_response)(request, cached)
+            async with db_slots():
+                response = await view(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            return await sync_to_async(store_response)(request, key, response)
+        return wrapper
+    return decorator
+
+
+async def fetch(queryset):
+    """ Evaluates a queryset from async code, prefetches included. """
+    if queryset._prefetch_related_lookups:
+        return await sync_to_async(list)(queryset)
+    return [obj async for obj in queryset]
+
+
+@sync_to_async
+def serialize(serializer_class, instance, many=False):
+    """ Serializes on a thread: image srcsets may queue their variants over Redis. """
+    with timed():
+        return serializer_class(instance, many=many).data
+
+
+# === Product detail ===
+@cached_async()
+async def product_detail(request, slug):
+    """
+    One product with its images, colors, features and stock matrix.
+
+    The product row is loaded first. Its four child collections then load concurrently
+    and are attached as prefetched relations, so serializing runs no queries.
+    """
+    product = await Product.objects.select_related('category', 'brand', 'discount') \
+        .filter(slug=slug, is_active=True, is_deleted=False).afirst()
+    if product is None:
+        return not_found()
+
+    images, colors, features, matrices = await asyncio.gather(
+        fetch(Image.objects.filter(product_id=product.id)),
+        fetch(ProductColor.objects.filter(product_id=product.id)),
+        fetch(ProductFeature.objects.filter(product_id=product.id).select_related('feature_value__feature')),
+        sync_to_async(get_matrices)([product.id]),
+    )
+    product._prefetched_objects_cache = {'images': images, 'colors': colors, 'features': features}
+
+    data = await serialize(ProductSerializer, product)
+    data['stocks'] = matrices[product.id].variants
+    return json_response(data)
+
+
+# === Category page ===
+@cached_async()
+async def category_detail(request, slug):
+    """
+    A category and a page of its active products, fetched concurrently by slug.
+
+    This replaces the storefront's two chained calls (category by slug, then
+    its products by id). `?page=` selects the page; pages have
+    REST_FRAMEWORK['PAGE_SIZE'] products.
+    """
+    try:
+        page = max(int(request.GET.get('page', 1)), 1)
+    except ValueError:
+        page = 1
+    size = settings.REST_FRAMEWORK['PAGE_SIZE']
+    products = plan_queryset(
+        Product.objects.filter(category__slug=slug, is_active=True, is_deleted=False), ProductSerializer
+    ).order_by('-created', '-id')
+
+    category, products = await asyncio.gather(
+        plan_queryset(Category.objects.filter(is_deleted=False), CategorySerializer).filter(slug=slug).afirst(),
+        fetch(products[(page - 1) * size:page * size]),
+    )
+    if category is None:
+        return not_found()
+
+    data = await serialize(CategorySerializer, category)
+    data['products'] = await serialize(ProductSerializer, products, many=True)
+    return json_response(data)
+
+
+# === Brands ===
+@cached_async(dependencies=('product.brand',))
+async def brand_list(request):
+    return json_response(await serialize(BrandSerializer, await fetch(Brand.objects.all()), many=True))
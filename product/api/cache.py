@@ -0,0 +1,144 @@
+import hashlib
+import logging
+
+import redis
+from django.conf import settings
+from django.db import transaction
+from django.http import HttpResponse, HttpResponseNotModified
+
+from src.settings import redis_client
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = "catalog:version:{}"
+RESPONSE_KEY = "catalog:response:{}"
+HITS_KEY = "catalog:cache:hits"
+MISSES_KEY = "catalog:cache:misses"
+
+# Every model whose rows end up in a catalog API response.
+CATALOG_MODELS = (
+    'product.product', 'product.category', 'product.brand', 'product.discount', 'product.image',
+    'product.productcolor', 'product.productfeature', 'product.feature', 'product.featurevalue',
+    'product.productstock',
+)
+
+
+# === Version Counters ===
+def bump_version(label):
+    """ Invalidates every cached response that depends on the model `label`. """
+    try:
+        redis_client.incr(VERSION_KEY.format(label))
+    except redis.RedisError:
+        logger.warning("Could not bump catalog cache version for %s", label, exc_info=True)
+
+
+def bump_version_on_commit(label):
+    """
+    Bumps `label` now and again once the current transaction commits. A
+    request that reads the old rows in between caches them under the first new
+    version only; the second bump makes that entry unreachable.
+    """
+    bump_version(label)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: bump_version(label))
+
+
+def count_lookup(key):
+    """ Increments a hit/miss counter; the counters are not worth failing a request for. """
+    try:
+        redis_client.incr(key)
+    except redis.RedisError:
+        logger.warning("Could not count catalog cache %s", key, exc_info=True)
+
+
+def get_versions(labels):
+    return redis_client.mget([VERSION_KEY.format(label) for label in labels])
+
+
+def cache_stats():
+    """ Returns the response cache hit/miss counters. """
+    hits, misses = redis_client.mget([HITS_KEY, MISSES_KEY])
+    hits, misses = int(hits or 0), int(misses or 0)
+    total = hits + misses
+    return {'hits': hits, 'misses': misses, 'hit_ratio': hits / total if total else 0.0}
+
+
+# === Response Cache ===
+def response_cache_key(request, labels):
+    """ Builds a cache key from the URL, query string, Accept header and the current model versions. """
+    versions = ",".join(version or "0" for version in get_versions(labels))
+    raw = "|".join([request.get_full_path(), request.META.get('HTTP_ACCEPT', ''), versions])
+    return RESPONSE_KEY.format(hashlib.sha1(raw.encode()).hexdigest())
+
+
+def etag_matches(request, etag):
+    header = request.META.get('HTTP_IF_NONE_MATCH')
+    if not header:
+        return False
+    tags = [tag.strip().removeprefix('W/') for tag in header.split(',')]
+    return '*' in tags or etag in tags
+
+
+def cached_response(request, cached):
+    """ Builds the response (or a 304) for a stored "<etag>\n<body>" entry. """
+    count_lookup(HITS_KEY)
+    etag, body = cached.split("\n", 1)
+    response = HttpResponseNotModified() if etag_matches(request, etag) else \
+        HttpResponse(body, content_type='application/json')
+    response['ETag'] = etag
+    response['X-Cache'] = 'HIT'
+    return response
+
+
+def store_response(request, key, response):
+    """ Stores a rendered JSON response under `key` and tags it with its ETag (or answers 304). """
+    count_lookup(MISSES_KEY)
+    etag = f'"{hashlib.sha1(response.content).hexdigest()}"'
+    try:
+        redis_client.setex(key, settings.CATALOG_CACHE_TIMEOUT, f"{etag}\n{response.content.decode()}")
+    except redis.RedisError:
+        logger.warning("Could not store catalog response", exc_info=True)
+
+    response['ETag'] = etag
+    response['X-Cache'] = 'MISS'
+    if etag_matches(request, etag):
+        not_modified = HttpResponseNotModified()
+        not_modified['ETag'] = etag
+        return not_modified
+    return response
+
+
+class CachedResponseMixin:
+    """
+    Caches rendered JSON responses of read-only catalog views in Redis.
+
+    Entries are keyed by the version counters of `cache_dependencies`, so a
+    write to any of those models makes them unreachable immediately; they then
+    expire on their own after `CATALOG_CACHE_TIMEOUT` seconds. ViewSet actions
+    listed in `uncached_actions` are always served fresh.
+    """
+    cache_dependencies = CATALOG_MODELS
+    uncached_actions = ()
+
+    def dispatch(self, request, *args, **kwargs):
+        action = getattr(self, 'action_map', {}).get(request.method.lower())
+        if request.method != 'GET' or action in self.uncached_actions:
+            return super().dispatch(request, *args, **kwargs)
+
+        try:
+            key = response_cache_key(request, self.cache_dependencies)
+            cached = redis_client.get(key)
+        except redis.RedisError:
+            logger.warning("Catalog cache unavailable", exc_info=True)
+            return super().dispatch(request, *args, **kwargs)
+
+        if cached is not None:
+            return cached_response(request, cached)
+
+        response = super().dispatch(request, *args, **kwargs)
+        renderer = getattr(response, 'accepted_renderer', None)
+        if response.status_code != 200 or renderer is None or renderer.format != 'json':
+            return response
+
+        response.render()
+        return store_response(request, key, response)
@@ -0,0 +1,157 @@
+"""
+Page data for the storefront templates.
+
+Every storefront page (home, category, product) is served by one composite
+response built from sections. Each section has a fixed query plan and its own
+cache entry keyed by the versions of the models it reads, so a product write
+leaves the category sections cached.
+"""
+import hashlib
+import json
+import logging
+
+import redis
+from django.conf import settings
+from django.core.paginator import EmptyPage, Paginator
+from rest_framework.utils.encoders import JSONEncoder
+
+from product.models import Category, Product
+from product.stock_matrix import get_matrix
+from src.settings import redis_client
+from .cache import CATALOG_MODELS, VERSION_KEY
+from .query_plans import plan_queryset
+from .serializers import CategorySerializer, ProductSerializer
+
+logger = logging.getLogger(__name__)
+
+SECTION_KEY = "catalog:section:{}"
+FEATURED_COUNT = 6
+
+
+# === Section cache ===
+class Section:
+    """
+    A cacheable part of a page. `build()` returns JSON-serializable data, or
+    None for "not found". The section is cached under its name, its `params`
+    and the versions of its `dependencies`.
+    """
+
+    def __init__(self, name, dependencies, build, params=()):
+        self.name = name
+        self.dependencies = dependencies
+        self.build = build
+        self.params = params
+
+
+def load_sections(sections):
+    """
+    Returns {name: data} for `sections`.
+
+    Reads every dependency version with one MGET and every cached section with
+    a second one. Only missing sections are built, and they are stored in one pipeline.
+    """
+    labels = sorted({label for section in sections for label in section.dependencies})
+    try:
+        versions = dict(zip(labels, redis_client.mget([VERSION_KEY.format(label) for label in labels])))
+        keys = []
+        for section in sections:
+            raw = "|".join([section.name, *map(str, section.params)] + [
+                versions[label] or "0" for label in section.dependencies
+            ])
+            keys.append(SECTION_KEY.format(hashlib.sha1(raw.encode()).hexdigest()))
+        cached = redis_client.mget(keys)
+    except redis.RedisError:
+        logger.warning("Catalog cache unavailable", exc_info=True)
+        return {section.name: section.build() for section in sections}
+
+    data, missing = {}, []
+    for section, key, raw in zip(sections, keys, cached):
+        if raw is None:
+            missing.append(key)
+            data[section.name] = json.loads(json.dumps(section.build(), cls=JSONEncoder))
+        else:
+            data[section.name] = json.loads(raw)
+    if missing:
+        try:
+            with redis_client.pipeline() as pipe:
+                for section, key in zip(sections, keys):
+                    if key in missing:
+                        pipe.setex(key, settings.CATALOG_CACHE_TIMEOUT, json.dumps(data[section.name]))
+                pipe.execute()
+        except redis.RedisError:
+            logger.warning("Could not store page sections", exc_info=True)
+    return data
+
+
+# === Sections ===
+def category_tree():
+    """ The whole non-deleted category tree, loaded with a single query. """
+    nodes = {}
+    for category in Category.objects.filter(is_deleted=False).values('id', 'name', 'slug', 'parent'):
+        category['is_main_branch'] = category['parent'] is None
+        category['subcategories'] = []
+        nodes[category['id']] = category
+
+    roots = []
+    for category in nodes.values():
+        if category['parent'] is None:
+            roots.append(category)
+        elif category['parent'] in nodes:
+            nodes[category['parent']]['subcategories'].append(category)
+    return roots
+
+
+def active_products():
+    return plan_queryset(Product.objects.filter(is_active=True, is_deleted=False), ProductSerializer)
+
+
+def featured_products():
+    return ProductSerializer(active_products().order_by('-created', '-id')[:FEATURED_COUNT], many=True).data
+
+
+def category_detail(slug):
+    category = plan_queryset(Category.objects.filter(is_deleted=False), CategorySerializer).filter(slug=slug).first()
+    return CategorySerializer(category).data if category is not None else None
+
+
+def category_products(slug, page):
+    """ A page of a category's products: {count, page, pages, results}. """
+    paginator = Paginator(
+        active_products().filter(category__slug=slug).order_by('-created', '-id'),
+        settings.REST_FRAMEWORK['PAGE_SIZE'],
+    )
+    try:
+        current = paginator.page(page)
+    except EmptyPage:
+        return None
+    return {
+        'count': paginator.count, 'page': current.number, 'pages': paginator.num_pages,
+        'results': ProductSerializer(current.object_list, many=True).data,
+    }
+
+
+def product_detail(slug):
+    product = active_products().filter(slug=slug).first()
+    return ProductSerializer(product).data if product is not None else None
+
+
+# === Pages ===
+def home_page():
+    return load_sections([
+        Section('categories', ('product.category',), category_tree),
+        Section('featured', CATALOG_MODELS, featured_products),
+    ])
+
+
+def category_page(slug, page=1):
+    return load_sections([
+        Section('category', ('product.category',), lambda: category_detail(slug), params=(slug,)),
+        Section('products', CATALOG_MODELS, lambda: category_products(slug, page), params=(slug, page)),
+    ])
+
+
+def product_page(slug):
+    """ The product section is cached. `stocks` comes from the product's own stock matrix cache. """
+    data = load_sections([Section('product', CATALOG_MODELS, lambda: product_detail(slug), params=(slug,))])
+    data['stocks'] = get_matrix(data['product']['id']).variants if data['product'] is not None else None
+    return data
@@ -0,0 +1,76 @@
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework import serializers
+from rest_framework.relations import ManyRelatedField, RelatedField
+
+
+# === Query Planner ===
+def _relation(model, name):
+    """ Returns the relation field `name` on `model`, or None for plain columns and properties. """
+    try:
+        field = model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return None
+    return field if field.is_relation else None
+
+
+def _walk(serializer, model, prefix, select, prefetch):
+    """ Collects select_related paths and Prefetch objects for every nested field of `serializer`. """
+    for field in serializer.fields.values():
+        if field.write_only or field.source == '*':
+            continue
+
+        # Follow dotted sources (e.g. `product.name`) through to-one relations.
+        current_model, path = model, prefix
+        attrs = field.source.split('.')
+        for attr in attrs[:-1]:
+            relation = _relation(current_model, attr)
+            if relation is None or not (relation.many_to_one or relation.one_to_one):
+                break
+            path = f"{path}{attr}"
+            select.append(path)
+            path = f"{path}__"
+            current_model = relation.related_model
+        else:
+            relation = _relation(current_model, attrs[-1])
+            if relation is None:
+                continue
+            lookup = f"{path}{attrs[-1]}"
+
+            if relation.one_to_many or relation.many_to_many:
+                child = getattr(field, 'child', None) or getattr(field, 'child_relation', None)
+                if isinstance(child, serializers.BaseSerializer):
+                    queryset = plan_queryset(relation.related_model._default_manager.all(), child)
+                    prefetch.append(Prefetch(lookup, queryset=queryset))
+                elif isinstance(field, (serializers.ListSerializer, ManyRelatedField)):
+                    prefetch.append(lookup)
+            elif isinstance(field, serializers.BaseSerializer):
+                select.append(lookup)
+                _walk(field, relation.related_model, f"{lookup}__", select, prefetch)
+            elif isinstance(field, RelatedField) and not field.use_pk_only_optimization():
+                select.append(lookup)
+
+
+def build_plan(serializer):
+    """
+    Builds a query plan from a serializer's declared fields.
+
+    Returns a tuple of (select_related paths, prefetch_related lookups) so that
+    serializing any number of instances runs a fixed number of queries.
+    """
+    if isinstance(serializer, type):
+        serializer = serializer()
+    select, prefetch = [], []
+    _walk(serializer, serializer.Meta.model, '', select, prefetch)
+    return select, prefetch
+
+
+def plan_queryset(queryset, serializer):
+    """ Applies the plan built for `serializer` to `queryset`. """
+    select, prefetch = build_plan(serializer)
+    if select:
+        queryset = queryset.select_related(*select)
+    if prefetch:
+        queryset = queryset.prefetch_related(*prefetch)
+    return queryset
+
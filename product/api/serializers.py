@@ -1,13 +1,21 @@
 from rest_framework import serializers
+from product.images import srcset
+from product.pricing import final_prices
+from product.search import headline
 from product.models import Category, Brand, Product, ProductFeature, Discount, DiscountCode, Image, FeatureValue, \
     Feature, ProductColor, ProductStock
 
 
 # === Image Serializer ===
 class ImageSerializer(serializers.ModelSerializer):
+    srcset = serializers.SerializerMethodField()
+
     class Meta:
         model = Image
-        fields = ['id', 'file', 'title', 'description']
+        fields = ['id', 'file', 'srcset', 'title', 'description']
+
+    def get_srcset(self, obj):
+        return srcset(obj, self.context.get('request'))
 
 
 class FeatureSerializer(serializers.ModelSerializer):
@@ -45,6 +53,15 @@ class ProductColorSerializer(serializers.ModelSerializer):
         fields = ['name', 'hex_code']
 
 # === Product Serializer (Main) ===
+class ProductListSerializer(serializers.ListSerializer):
+    """ Prices every product of the list with a single pricing-engine call. """
+
+    def to_representation(self, data):
+        products = list(data.all() if hasattr(data, 'all') else data)
+        self.child.final_prices = final_prices(products)
+        return super().to_representation(products)
+
+
 class ProductSerializer(serializers.ModelSerializer):
     category = serializers.StringRelatedField()
     brand = serializers.StringRelatedField()
@@ -53,16 +70,48 @@ class ProductSerializer(serializers.ModelSerializer):
     images = ImageSerializer(many=True, read_only=True)
     final_price = serializers.SerializerMethodField()
     colors = ProductColorSerializer(many=True, read_only=True)
+    image_srcset = serializers.SerializerMethodField()
 
 
     class Meta:
         model = Product
         fields = ['id', 'name', 'slug', 'description', 'category', 'brand',
-                  'price', 'weight', 'image', 'created', 'updated',
+                  'price', 'weight', 'image', 'image_srcset', 'created', 'updated',
                   'is_active', 'final_price', 'features', 'images', 'discount', 'colors']
+        list_serializer_class = ProductListSerializer
 
     def get_final_price(self, obj):
-        return obj.get_final_price()
+        prices = getattr(self, 'final_prices', None)
+        if prices is None or obj.id not in prices:
+            prices = final_prices([obj])
+        return prices[obj.id]
+
+    def get_image_srcset(self, obj):
+        return srcset(obj, self.context.get('request'))
+
+
+class ProductSearchSerializer(ProductSerializer):
+    rank = serializers.FloatField(read_only=True)
+    headline = serializers.SerializerMethodField()
+
+    class Meta(ProductSerializer.Meta):
+        fields = ProductSerializer.Meta.fields + ['rank', 'headline']
+
+    def get_headline(self, obj):
+        return headline(obj, self.context.get('search_terms', []))
+
+
+class FacetQuerySerializer(serializers.Serializer):
+    """ Validates the facet filters of the product list (`?brand=&feature=RAM:16GB&color=&price_min=...`). """
+    brand = serializers.ListField(child=serializers.SlugField(), required=False, default=list)
+    feature = serializers.ListField(
+        child=serializers.RegexField(r'^[^:]+:.+$', error_messages={'invalid': "Use the form <name>:<value>."}),
+        required=False, default=list,
+    )
+    color = serializers.ListField(child=serializers.CharField(), required=False, default=list)
+    price_min = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0, required=False)
+    price_max = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0, required=False)
+    in_stock = serializers.BooleanField(required=False, default=False)
 
 
 # === Nested Category Serializer ===
@@ -94,8 +143,8 @@ class BrandSerializer(serializers.ModelSerializer):
 # === ProductStock Serializer ===
 class ProductStockSerializer(serializers.ModelSerializer):
     color = ProductColorSerializer()
-    feature_value = FeatureValueSerializer()
+    feature_values = FeatureValueSerializer(many=True)
 
     class Meta:
         model = ProductStock
-        fields = ['id', 'color', 'feature_value', 'price', 'quantity']
+        fields = ['id', 'color', 'feature_values', 'stock']
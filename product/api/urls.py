@@ -1,13 +1,18 @@
 from rest_framework.routers import DefaultRouter
 from django.urls import path, include
-from .views import ProductViewSet, CategoryViewSet, BrandViewSet
+from .views import ProductViewSet, CategoryViewSet, BrandViewSet, StorefrontPageViewSet
+from . import async_views
 
 router = DefaultRouter()
 router.register('products', ProductViewSet, basename='product')
 router.register('categories', CategoryViewSet, basename='category')
 router.register('brands', BrandViewSet, basename='brand')
+router.register('pages', StorefrontPageViewSet, basename='page')
 
 urlpatterns = [
     path('', include(router.urls)),
+    path('async/products/<slug:slug>/', async_views.product_detail, name='async-product-detail'),
+    path('async/categories/<slug:slug>/', async_views.category_detail, name='async-category-detail'),
+    path('async/brands/', async_views.brand_list, name='async-brand-list'),
 
 ]
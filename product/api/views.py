@@ -1,60 +1,199 @@
+from django.conf import settings
 from django.shortcuts import get_object_or_404
 from rest_framework import viewsets, generics
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
-from product.models import Category, Brand, Product, Discount, DiscountCode, ProductStock
+from src.instrumentation import timed
+from src.pagination import KeysetPagination
+from product.models import Category, Brand, Product, Discount, DiscountCode, ProductSnapshot
+from product.facets import FacetFilters, facet_counts
+from product.search import search_products, search_terms
+from product.snapshots import SNAPSHOT_ORDERING, snapshot_payloads
+from product.stock_matrix import get_matrix
+from .cache import CachedResponseMixin
+from .pages import category_page, category_tree, home_page, product_page
+from .query_plans import plan_queryset
 from .serializers import (
-    CategorySerializer, BrandSerializer, ProductSerializer, ProductStockSerializer
+    CategorySerializer, BrandSerializer, FacetQuerySerializer, ProductSerializer, ProductSearchSerializer
 )
 
-class ProductViewSet(viewsets.ReadOnlyModelViewSet):
+class ProductViewSet(CachedResponseMixin, viewsets.ReadOnlyModelViewSet):
     serializer_class = ProductSerializer
+    pagination_class = KeysetPagination
+    keyset_ordering = ('-created', '-id')
     lookup_field = 'slug'
+    # Stock levels move with every cart add; the stock matrix has its own cache. Facet counts
+    # come from the in-process index, which may still be rebuilding after a write.
+    uncached_actions = ('stocks', 'facets')
 
     def get_queryset(self):
+        queryset = self.get_facet_filters().apply(self.get_category_queryset())
+        return plan_queryset(queryset, self.get_serializer_class())
+
+    def get_category_queryset(self):
+        """ The active products narrowed by `?category=`, before facet filters and loading plans. """
         request = self.request
 
         queryset = Product.objects.filter(is_active=True, is_deleted=False)
 
         category_slug = request.GET.get('category')
         if category_slug:
-            queryset = queryset.filter(category__slug=category_slug)
+            if request.GET.get('include_descendants') in ('1', 'true'):
+                queryset = queryset.filter(category__ancestor_links__ancestor__slug=category_slug)
+            else:
+                queryset = queryset.filter(category__slug=category_slug)
 
         return queryset
 
+    def get_facet_filters(self):
+        serializer = FacetQuerySerializer(data=self.request.query_params)
+        serializer.is_valid(raise_exception=True)
+        return FacetFilters(**serializer.validated_data)
+
+    def list(self, request, *args, **kwargs):
+        if not settings.SERVE_PRODUCT_SNAPSHOTS:
+            return super().list(request, *args, **kwargs)
+
+        products = self.get_facet_filters().apply(self.get_category_queryset())
+        self.keyset_ordering = SNAPSHOT_ORDERING
+        page = self.paginate_queryset(ProductSnapshot.objects.filter(product__in=products.values('pk')))
+        with timed():
+            data = snapshot_payloads(page, request)
+        return self.get_paginated_response(data)
+
+    def retrieve(self, request, *args, **kwargs):
+        if settings.SERVE_PRODUCT_SNAPSHOTS:
+            snapshot = ProductSnapshot.objects.filter(slug=kwargs[self.lookup_field]).first()
+            if snapshot is not None:
+                return Response(snapshot_payloads([snapshot], request)[0])
+        return super().retrieve(request, *args, **kwargs)
+
+    def get_serializer_class(self):
+        if self.action == 'search':
+            return ProductSearchSerializer
+        return super().get_serializer_class()
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.action == 'search':
+            context['search_terms'] = search_terms(self.request.GET.get('q', ''))
+        return context
+
     @action(detail=False)
     def featured(self, request):
         featured = self.get_queryset()[:6]
-        serializer = self.get_serializer(featured, many=True)
-        return Response(serializer.data)
+        with timed():
+            data = self.get_serializer(featured, many=True).data
+        return Response(data)
+
+    @action(detail=False, methods=['get'])
+    def facets(self, request):
+        """
+        Facet counts (brands, colors, feature values, price range, in stock) of
+        the listing selected by the same query parameters as the product list,
+        served from the in-memory bitmap index.
+        """
+        category_ids = None
+        category_slug = request.GET.get('category')
+        if category_slug:
+            categories = Category.objects.filter(slug=category_slug)
+            if request.GET.get('include_descendants') in ('1', 'true'):
+                categories = Category.objects.filter(ancestor_links__ancestor__slug=category_slug)
+            category_ids = list(categories.values_list('pk', flat=True))
+        return Response(facet_counts(self.get_facet_filters(), category_ids))
+
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """
+        Full-text product search: `?q=` matches word prefixes in the name, brand,
+        category and description, best match first, with a highlighted snippet.
+        Ranked results are paginated by page number.
+        """
+        terms = search_terms(request.GET.get('q', ''))
+        if not terms:
+            raise ValidationError({'q': "This query parameter is required."})
+
+        paginator = PageNumberPagination()
+        page = paginator.paginate_queryset(search_products(self.get_queryset(), terms), request, view=self)
+        with timed():
+            data = self.get_serializer(page, many=True).data
+        return paginator.get_paginated_response(data)
 
     @action(detail=True, methods=['get'])
     def stocks(self, request, slug=None):
-        product = self.get_object()
-        stocks = ProductStock.objects.filter(product=product).select_related('color', 'feature_value')
-        serializer = ProductStockSerializer(stocks, many=True)
-        return Response(serializer.data)
+        """
+        The variant picker data: every stock row with its color, feature values
+        and stock, read from the product's cached stock matrix.
+        """
+        product_id = get_object_or_404(
+            Product.objects.values_list('pk', flat=True), slug=slug, is_active=True, is_deleted=False
+        )
+        return Response(get_matrix(product_id).variants)
 
 
-class CategoryViewSet(viewsets.ReadOnlyModelViewSet):
-    queryset = Category.objects.filter(is_deleted=False)
+class CategoryViewSet(CachedResponseMixin, viewsets.ReadOnlyModelViewSet):
+    queryset = plan_queryset(Category.objects.filter(is_deleted=False), CategorySerializer)
     serializer_class = CategorySerializer
 
     @action(detail=True, url_path='products', methods=['get'])
     def products(self, request, pk=None):
         category = self.get_object()
-        products = Product.objects.filter(category=category, is_active=True, is_deleted=False)
-        serializer = ProductSerializer(products, many=True)
-        return Response(serializer.data)
+        products = plan_queryset(
+            Product.objects.filter(category=category, is_active=True, is_deleted=False), ProductSerializer
+        ).order_by('-created', '-id')
+        page = self.paginate_queryset(products)
+        with timed():
+            data = ProductSerializer(page, many=True).data
+        return self.get_paginated_response(data)
+
+    @action(detail=False, methods=['get'])
+    def tree(self, request):
+        """ Returns the whole non-deleted category tree, loaded with a single query. """
+        return Response(category_tree())
 
     @action(detail=False, url_path='slug/(?P<slug>[^/.]+)', methods=['get'])
     def get_by_slug(self, request, slug=None):
-        category = get_object_or_404(Category, slug=slug, is_deleted=False)
-        serializer = self.get_serializer(category)
-        return Response(serializer.data)
+        category = get_object_or_404(self.get_queryset(), slug=slug)
+        with timed():
+            data = self.get_serializer(category).data
+        return Response(data)
 
 
 
-class BrandViewSet(viewsets.ReadOnlyModelViewSet):
+class BrandViewSet(CachedResponseMixin, viewsets.ReadOnlyModelViewSet):
+    cache_dependencies = ('product.brand',)
     queryset = Brand.objects.all()
     serializer_class = BrandSerializer
+
+
+class StorefrontPageViewSet(viewsets.ViewSet):
+    """
+    One response with everything a storefront template needs, instead of
+    chained browser fetches. Sections are cached separately (see pages.py).
+    """
+
+    @action(detail=False, methods=['get'])
+    def home(self, request):
+        return Response(home_page())
+
+    @action(detail=False, url_path='category/(?P<slug>[^/.]+)', methods=['get'])
+    def category(self, request, slug=None):
+        try:
+            page = int(request.GET.get('page', 1))
+        except ValueError:
+            raise NotFound("Invalid page.")
+        data = category_page(slug, page)
+        if data['category'] is None:
+            raise NotFound()
+        if data['products'] is None:
+            raise NotFound("Invalid page.")
+        return Response(data)
+
+    @action(detail=False, url_path='product/(?P<slug>[^/.]+)', methods=['get'])
+    def product(self, request, slug=None):
+        data = product_page(slug)
+        if data['product'] is None:
+            raise NotFound()
+        return Response(data)
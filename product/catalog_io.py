@@ -0,0 +1,490 @@
+"""
+Bulk catalog import and export.
+
+Each kind (brands, categories, features, products, colors, stock) is one
+flat CSV or JSONL file; rows refer to each other by natural keys (slugs,
+names), so a catalog is loaded kind by kind in that order. Rows are read and
+written as streams and processed in batches: every batch resolves its
+foreign keys with one query per relation, allocates missing slugs with one
+query, and writes with `bulk_create`, upserting on the natural key. Memory
+use depends on the batch size, not the file size.
+
+bulk_create bypasses model signals, so after an import the caches, search
+documents, snapshots and stock matrices that the signals maintain are
+refreshed here for the rows written.
+
+Existing categories keep their place in the tree: a changed parent is
+ignored, as the closure table is only re-linked through `Category.save`.
+"""
+import csv
+import json
+from decimal import Decimal, InvalidOperation
+from functools import reduce
+from itertools import islice
+from operator import or_
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Q
+
+from product.api.cache import bump_version
+from product.models import (
+    Brand, Category, CategoryClosure, Feature, FeatureValue, Product, ProductColor, ProductStock
+)
+from product.search import update_search_vectors
+from product.slugs import unique_slugs
+from product.snapshots import refresh_snapshots
+from product.stock_matrix import invalidate as invalidate_stock_matrices
+
+COLUMNS = {
+    'brands': ('slug', 'name', 'description'),
+    'categories': ('slug', 'name', 'parent'),
+    'features': ('feature', 'value', 'hex_code'),
+    'products': ('slug', 'name', 'category', 'brand', 'description', 'price', 'weight', 'is_active'),
+    'colors': ('product', 'name', 'hex_code'),
+    'stock': ('product', 'color', 'features', 'stock'),
+}
+KINDS = tuple(COLUMNS)
+# Feature values of a stock row: "Size:M|Fit:Slim".
+FEATURE_SEPARATOR = '|'
+MAX_REPORTED_ERRORS = 20
+
+
+class ImportReport:
+    """ Counts of one import; keeps the first MAX_REPORTED_ERRORS skipped rows, by line, for the summary. """
+
+    def __init__(self):
+        self.rows = 0
+        self.written = 0
+        self.skipped = 0
+        self.errors = []
+
+    def skip(self, row, reason):
+        self.skipped += 1
+        # Rows of a batch are skipped by check, not in file order.
+        self.errors.append((row.get('_line'), reason))
+        self.errors.sort(key=lambda error: error[0] or 0)
+        del self.errors[MAX_REPORTED_ERRORS:]
+
+
+# === Reading and writing ===
+def read_rows(stream, fmt):
+    """
+    Yields one dict per CSV row or JSONL line, tagged with its line number in
+    `_line`. A line that is not a JSON object yields only its `_error`, so the
+    import skips it instead of stopping.
+    """
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield {**row, '_line': reader.line_num}
+    else:
+        for number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as error:
+                yield {'_line': number, '_error': f"invalid JSON: {error}"}
+                continue
+            if isinstance(row, dict):
+                yield {**row, '_line': number}
+            else:
+                yield {'_line': number, '_error': "not a JSON object"}
+
+
+def write_rows(stream, fmt, kind, rows):
+    """ Writes `rows` (dicts keyed by the kind's columns) and returns how many were written. """
+    count = 0
+    if fmt == 'csv':
+        writer = csv.DictWriter(stream, fieldnames=COLUMNS[kind])
+        writer.writeheader()
+        for count, row in enumerate(rows, start=1):
+            writer.writerow(row)
+    else:
+        for count, row in enumerate(rows, start=1):
+            stream.write(json.dumps(row, cls=DjangoJSONEncoder) + '\n')
+    return count
+
+
+def batches(rows, size):
+    rows = iter(rows)
+    while batch := list(islice(rows, size)):
+        yield batch
+
+
+def text(row, column):
+    value = row.get(column)
+    return '' if value is None else str(value).strip()
+
+
+def keep(batch, report, problem):
+    """ The rows of `batch` for which `problem(row)` is empty; the others are skipped with that reason. """
+    rows = []
+    for row in batch:
+        reason = problem(row)
+        if reason:
+            report.skip(row, reason)
+        else:
+            rows.append(row)
+    return rows
+
+
+def taken_names(model, rows):
+    """
+    A keep() problem for the unique `name` of `model`: the name is held by
+    another slug, in the database or by an earlier row of the batch.
+    """
+    holders = dict(model.objects.filter(name__in={text(row, 'name') for row in rows}).values_list('name', 'slug'))
+
+    def problem(row):
+        name = text(row, 'name')
+        holder = holders.setdefault(name, row['slug'])
+        return holder != row['slug'] and f"name {name!r} already used by {holder!r}"
+    return problem
+
+
+def last_per_key(objects, key):
+    """ Drops earlier duplicates: one upsert statement cannot touch the same row twice. """
+    return list({key(obj): obj for obj in objects}.values())
+
+
+def fill_slugs(model, rows):
+    """ Gives rows without a slug a free one, avoiding the slugs other rows of the batch bring. """
+    given = {text(row, 'slug') for row in rows} - {''}
+    slugs = iter(unique_slugs(model, [text(row, 'name') for row in rows if not text(row, 'slug')], taken=given))
+    for row in rows:
+        row['slug'] = text(row, 'slug') or next(slugs)
+
+
+def parse_decimal(value):
+    """ A non-negative amount with at most 8 integer digits, as the price and weight columns hold. """
+    try:
+        amount = Decimal(value or 0)
+    except InvalidOperation:
+        raise ValueError(value)
+    if not amount.is_finite() or not 0 <= amount < 10 ** 8:
+        raise ValueError(value)
+    return amount
+
+
+def parse_count(value):
+    count = int(value or 0)
+    if count < 0:
+        raise ValueError(value)
+    return count
+
+
+def invalid(row, column, parse):
+    """ The reason `parse` rejects the row's `column`, or '' when it parses. """
+    try:
+        parse(text(row, column))
+    except ValueError:
+        return f"invalid {column} {text(row, column)!r}"
+    return ''
+
+
+def parse_bool(value, default=True):
+    if value in (None, ''):
+        return default
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ('1', 'true', 'yes', 'y')
+
+
+# === Import ===
+def import_catalog(kind, rows, batch_size=1000):
+    """ Imports `rows` of `kind` in batches and returns an ImportReport. """
+    importer = IMPORTERS[kind]
+    report = ImportReport()
+    product_ids = set()
+    for batch in batches(rows, batch_size):
+        report.rows += len(batch)
+        batch = keep(batch, report, lambda row: row.get('_error'))
+        with transaction.atomic():
+            product_ids.update(importer(batch, report))
+    after_import(kind, product_ids)
+    return report
+
+
+def import_brands(batch, report):
+    rows = keep(batch, report, lambda row: not text(row, 'name') and "missing name")
+    fill_slugs(Brand, rows)
+    rows = keep(rows, report, taken_names(Brand, rows))
+    brands = last_per_key([
+        Brand(slug=row['slug'], name=text(row, 'name'), description=text(row, 'description') or None)
+        for row in rows
+    ], key=lambda brand: brand.slug)
+    Brand.objects.bulk_create(brands, update_conflicts=True, unique_fields=['slug'],
+                              update_fields=['name', 'description'])
+    report.written += len(brands)
+    return Product.objects.filter(brand__slug__in=[brand.slug for brand in brands]).values_list('pk', flat=True) \
+        if brands else []
+
+
+def import_categories(batch, report):
+    rows = keep(batch, report, lambda row: not text(row, 'name') and "missing name")
+    fill_slugs(Category, rows)
+    rows = keep(rows, report, taken_names(Category, rows))
+    rows = last_per_key(rows, key=lambda row: row['slug'])
+
+    keys = {row['slug'] for row in rows} | {text(row, 'parent') for row in rows if text(row, 'parent')}
+    known = dict(Category.objects.filter(slug__in=keys).values_list('slug', 'pk'))
+
+    existing = Category.objects.in_bulk([row['slug'] for row in rows if row['slug'] in known], field_name='slug')
+    for row in rows:
+        if row['slug'] in existing:
+            existing[row['slug']].name = text(row, 'name')
+    Category.objects.bulk_update(existing.values(), ['name'])
+    report.written += len(existing)
+
+    # Parents are created before their children: one bulk insert per tree level present in the batch.
+    pending = [row for row in rows if row['slug'] not in existing]
+    while pending:
+        ready = [row for row in pending if not text(row, 'parent') or text(row, 'parent') in known]
+        if not ready:
+            for row in pending:
+                report.skip(row, f"unknown parent category {text(row, 'parent')!r}")
+            break
+        created = Category.objects.bulk_create([
+            Category(slug=row['slug'], name=text(row, 'name'), parent_id=known.get(text(row, 'parent')))
+            for row in ready
+        ])
+        link_categories(created)
+        known.update((category.slug, category.pk) for category in created)
+        report.written += len(created)
+        pending = [row for row in pending if row['slug'] not in known]
+    return Product.objects.filter(category__slug__in=list(existing)).values_list('pk', flat=True) \
+        if existing else []
+
+
+def link_categories(categories):
+    """ Adds the closure rows of new categories, reading their parents' ancestor links in one query. """
+    parent_ids = {category.parent_id for category in categories if category.parent_id}
+    ancestors = {}
+    for link in CategoryClosure.objects.filter(descendant_id__in=parent_ids):
+        ancestors.setdefault(link.descendant_id, []).append(link)
+    CategoryClosure.objects.bulk_create([
+        link
+        for category in categories
+        for link in [
+            CategoryClosure(ancestor_id=category.pk, descendant_id=category.pk, depth=0),
+            *(CategoryClosure(ancestor_id=parent_link.ancestor_id, descendant_id=category.pk,
+                              depth=parent_link.depth + 1)
+              for parent_link in ancestors.get(category.parent_id, ())),
+        ]
+    ])
+
+
+def import_features(batch, report):
+    rows = keep(batch, report, lambda row: not (text(row, 'feature') and text(row, 'value'))
+                and "missing feature or value")
+    names = {text(row, 'feature') for row in rows}
+    features = dict(Feature.objects.filter(name__in=names).values_list('name', 'pk'))
+    created = Feature.objects.bulk_create([Feature(name=name) for name in names - set(features)])
+    features.update((feature.name, feature.pk) for feature in created)
+
+    values = last_per_key([
+        FeatureValue(feature_id=features[text(row, 'feature')], value=text(row, 'value'),
+                     hex_code=text(row, 'hex_code') or None)
+        for row in rows
+    ], key=lambda value: (value.feature_id, value.value))
+    FeatureValue.objects.bulk_create(values, update_conflicts=True, unique_fields=['feature', 'value'],
+                                     update_fields=['hex_code'])
+    report.written += len(values)
+    return []
+
+
+def import_products(batch, report):
+    categories = dict(Category.objects.filter(slug__in={text(row, 'category') for row in batch})
+                      .values_list('slug', 'pk'))
+    brands = dict(Brand.objects.filter(slug__in={text(row, 'brand') for row in batch}).values_list('slug', 'pk'))
+    rows = keep(batch, report, lambda row: (
+        not text(row, 'name') and "missing name"
+        or text(row, 'category') not in categories and f"unknown category {text(row, 'category')!r}"
+        or text(row, 'brand') not in brands and f"unknown brand {text(row, 'brand')!r}"
+        or invalid(row, 'price', parse_decimal)
+        or invalid(row, 'weight', parse_decimal)
+    ))
+    fill_slugs(Product, rows)
+    products = last_per_key([
+        Product(
+            slug=row['slug'], name=text(row, 'name'),
+            category_id=categories[text(row, 'category')], brand_id=brands[text(row, 'brand')],
+            description=text(row, 'description') or None, price=parse_decimal(text(row, 'price')),
+            weight=parse_decimal(text(row, 'weight')), is_active=parse_bool(row.get('is_active')),
+        )
+        for row in rows
+    ], key=lambda product: product.slug)
+    Product.objects.bulk_create(
+        products, update_conflicts=True, unique_fields=['slug'],
+        update_fields=['name', 'category', 'brand', 'description', 'price', 'weight', 'is_active', 'updated'],
+    )
+    report.written += len(products)
+    return Product.objects.filter(slug__in=[product.slug for product in products]).values_list('pk', flat=True) \
+        if products else []
+
+
+def import_colors(batch, report):
+    products = dict(Product.objects.filter(slug__in={text(row, 'product') for row in batch})
+                    .values_list('slug', 'pk'))
+    rows = keep(batch, report, lambda row: (
+        text(row, 'product') not in products and f"unknown product {text(row, 'product')!r}"
+        or not text(row, 'name') and "missing name"
+    ))
+    existing = {
+        (color.product_id, color.name): color
+        for color in ProductColor.objects.filter(product_id__in={products[text(row, 'product')] for row in rows})
+    }
+    new, changed = {}, []
+    for row in rows:
+        key = (products[text(row, 'product')], text(row, 'name'))
+        hex_code = text(row, 'hex_code') or None
+        if key in existing:
+            existing[key].hex_code = hex_code
+            changed.append(existing[key])
+        else:
+            new[key] = ProductColor(product_id=key[0], name=key[1], hex_code=hex_code)
+    ProductColor.objects.bulk_update(changed, ['hex_code'])
+    ProductColor.objects.bulk_create(new.values())
+    report.written += len(changed) + len(new)
+    return {product_id for product_id, _ in [*existing, *new]}
+
+
+def parse_features(value):
+    """ "Size:M|Fit:Slim" -> [('Size', 'M'), ('Fit', 'Slim')] """
+    pairs = []
+    for item in filter(None, (part.strip() for part in (value or '').split(FEATURE_SEPARATOR))):
+        feature, _, feature_value = item.partition(':')
+        pairs.append((feature.strip(), feature_value.strip()))
+    return pairs
+
+
+def import_stock(batch, report):
+    products = dict(Product.objects.filter(slug__in={text(row, 'product') for row in batch})
+                    .values_list('slug', 'pk'))
+    colors = {
+        (product_id, name): pk
+        for pk, product_id, name in ProductColor.objects.filter(product_id__in=products.values())
+        .values_list('pk', 'product_id', 'name')
+    }
+    pairs = {pair for row in batch for pair in parse_features(text(row, 'features'))}
+    values = {
+        (feature, value): pk
+        for pk, feature, value in FeatureValue.objects.filter(
+            reduce(or_, (Q(feature__name=feature, value=value) for feature, value in pairs), Q(pk__in=[]))
+        ).values_list('pk', 'feature__name', 'value')
+    }
+
+    stocks, features = {}, {}
+    for row in batch:
+        product_id = products.get(text(row, 'product'))
+        color_id = colors.get((product_id, text(row, 'color')))
+        row_pairs = parse_features(text(row, 'features'))
+        missing = [f"{feature}:{value}" for feature, value in row_pairs if (feature, value) not in values]
+        if color_id is None:
+            report.skip(row, f"unknown product or color {text(row, 'product')!r} / {text(row, 'color')!r}")
+        elif missing:
+            report.skip(row, f"unknown feature values {', '.join(missing)}")
+        elif reason := invalid(row, 'stock', parse_count):
+            report.skip(row, reason)
+        else:
+            stocks[product_id, color_id] = ProductStock(product_id=product_id, color_id=color_id,
+                                                        stock=parse_count(text(row, 'stock')))
+            features[product_id, color_id] = {values[pair] for pair in row_pairs}
+
+    ProductStock.objects.bulk_create(stocks.values(), update_conflicts=True, unique_fields=['product', 'color'],
+                                     update_fields=['stock'])
+    report.written += len(stocks)
+
+    # Upserts do not return ids of updated rows on every backend: read them back, then replace the links.
+    stock_ids = {
+        (product_id, color_id): pk
+        for pk, product_id, color_id in ProductStock.objects.filter(
+            product_id__in={product_id for product_id, _ in stocks}, color_id__in={color_id for _, color_id in stocks}
+        ).values_list('pk', 'product_id', 'color_id')
+    }
+    through = ProductStock.feature_values.through
+    through.objects.filter(productstock_id__in=[stock_ids[key] for key in stocks]).delete()
+    through.objects.bulk_create([
+        through(productstock_id=stock_ids[key], featurevalue_id=value_id)
+        for key, value_ids in features.items()
+        for value_id in value_ids
+    ])
+    return {product_id for product_id, _ in stocks}
+
+
+IMPORTERS = {
+    'brands': import_brands,
+    'categories': import_categories,
+    'features': import_features,
+    'products': import_products,
+    'colors': import_colors,
+    'stock': import_stock,
+}
+CACHE_LABELS = {
+    'brands': ('product.brand',),
+    'categories': ('product.category',),
+    'features': ('product.feature', 'product.featurevalue'),
+    'products': ('product.product',),
+    'colors': ('product.productcolor',),
+    'stock': ('product.productstock',),
+}
+
+
+def after_import(kind, product_ids):
+    """ Does what the skipped model signals would have done, once for the whole import. """
+    for label in CACHE_LABELS[kind]:
+        bump_version(label)
+    product_ids = sorted(product_ids)
+    if kind in ('brands', 'categories', 'products'):
+        for start in range(0, len(product_ids), 10000):
+            update_search_vectors(Product.objects.filter(pk__in=product_ids[start:start + 10000]))
+    if kind in ('colors', 'stock'):
+        invalidate_stock_matrices(product_ids)
+    refresh_snapshots(product_ids)
+
+
+# === Export ===
+EXPORTS = {
+    'brands': (Brand.objects.order_by('pk'), {'slug': 'slug', 'name': 'name', 'description': 'description'}),
+    'categories': (Category.objects.order_by('pk'), {'slug': 'slug', 'name': 'name', 'parent': 'parent__slug'}),
+    'features': (FeatureValue.objects.order_by('pk'),
+                 {'feature': 'feature__name', 'value': 'value', 'hex_code': 'hex_code'}),
+    'products': (Product.objects.filter(is_deleted=False).order_by('pk'), {
+        'slug': 'slug', 'name': 'name', 'category': 'category__slug', 'brand': 'brand__slug',
+        'description': 'description', 'price': 'price', 'weight': 'weight', 'is_active': 'is_active',
+    }),
+    'colors': (ProductColor.objects.order_by('pk'), {'product': 'product__slug', 'name': 'name', 'hex_code': 'hex_code'}),
+}
+
+
+def export_catalog(kind, chunk_size=2000):
+    """
+    Yields the rows of `kind` in import format. Rows come from `iterator()`,
+    which reads through a server-side cursor on PostgreSQL, so memory stays
+    flat however large the table is.
+    """
+    if kind == 'stock':
+        yield from export_stock(chunk_size)
+        return
+    queryset, columns = EXPORTS[kind]
+    paths = list(columns.values())
+    for values in queryset.values_list(*paths).iterator(chunk_size=chunk_size):
+        yield dict(zip(columns, values))
+
+
+def export_stock(chunk_size):
+    stocks = (
+        ProductStock.objects.order_by('pk').select_related('product', 'color')
+        .prefetch_related('feature_values__feature')
+    )
+    for stock in stocks.iterator(chunk_size=chunk_size):
+        yield {
+            'product': stock.product.slug,
+            'color': stock.color.name,
+            'features': FEATURE_SEPARATOR.join(sorted(
+                f"{value.feature.name}:{value.value}" for value in stock.feature_values.all()
+            )),
+            'stock': stock.stock,
+        }
@@ -0,0 +1,301 @@
+import bisect
+import logging
+import threading
+from collections import defaultdict
+from functools import reduce
+from operator import or_
+
+import redis
+from django.conf import settings
+from django.db import connection
+from django.db.models import Exists, OuterRef
+
+from product.api.cache import get_versions
+from product.models import Brand, FeatureValue, Product, ProductColor, ProductFeature, ProductStock
+
+logger = logging.getLogger(__name__)
+
+# Models whose rows feed the facet index; a version bump of any of them triggers a rebuild.
+FACET_MODELS = (
+    'product.product', 'product.brand', 'product.productcolor', 'product.productfeature',
+    'product.feature', 'product.featurevalue', 'product.productstock',
+)
+PRICE_BUCKETS = 64
+
+
+# === Facet filters ===
+class FacetFilters:
+    """
+    The facet selection of a product listing.
+
+    Different dimensions narrow the result (AND); several values of the same
+    dimension widen it (OR), e.g. `brand=dell&brand=lenovo&feature=RAM:16GB`.
+    Prices are compared against the list price.
+    """
+
+    def __init__(self, brand=(), feature=(), color=(), price_min=None, price_max=None, in_stock=False):
+        self.brands = list(brand)
+        self.colors = list(color)
+        self.price_min = price_min
+        self.price_max = price_max
+        self.in_stock = in_stock
+        self.features = defaultdict(list)
+        for pair in feature:
+            name, value = pair.split(':', 1)
+            self.features[name].append(value)
+
+    def apply(self, queryset):
+        """ Narrows a Product queryset to the selection. """
+        if self.brands:
+            queryset = queryset.filter(brand__slug__in=self.brands)
+        if self.colors:
+            queryset = queryset.filter(
+                Exists(ProductColor.objects.filter(product=OuterRef('pk'), name__in=self.colors))
+            )
+        if self.price_min is not None:
+            queryset = queryset.filter(price__gte=self.price_min)
+        if self.price_max is not None:
+            queryset = queryset.filter(price__lte=self.price_max)
+        if self.in_stock:
+            queryset = queryset.filter(Exists(ProductStock.objects.filter(product=OuterRef('pk'), stock__gt=0)))
+        for name, values in self.features.items():
+            queryset = queryset.filter(Exists(ProductFeature.objects.filter(
+                product=OuterRef('pk'), feature_value__feature__name=name, feature_value__value__in=values
+            )))
+        return queryset
+
+
+# === Bitmap index ===
+def _bitmap(positions):
+    """ Packs index positions into a Python int with bit `position` set. """
+    positions = list(positions)
+    if not positions:
+        return 0
+    bits = bytearray(max(positions) // 8 + 1)
+    for position in positions:
+        bits[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(bits, 'little')
+
+
+def _members(bitmap):
+    """ Yields the index positions set in `bitmap`. """
+    digits = bin(bitmap)[:1:-1]
+    position = digits.find('1')
+    while position != -1:
+        yield position
+        position = digits.find('1', position + 1)
+
+
+class FacetIndex:
+    """
+    An in-memory bitmap per facet value of the active catalog.
+
+    Active products are numbered 0..n-1 in primary key order, and every
+    brand, category, color, feature value and the in-stock set is a Python
+    int whose bit `i` is set when product `i` has that value, so a selection
+    is a handful of ANDs/ORs and every facet count is one `bit_count()`.
+    Numbering by position keeps each bitmap at most n bits, however sparse
+    the ids. Prices are kept sorted with a bitmap per price bucket for range
+    filters and min/max lookups. Built in six queries.
+    """
+
+    def __init__(self):
+        self.categories = defaultdict(list)
+        self.brands = defaultdict(list)
+        self.colors = defaultdict(list)
+        self.features = defaultdict(list)
+
+        positions, self.prices = {}, []
+        for pk, category_id, brand_id, price in Product.objects.filter(is_active=True, is_deleted=False) \
+                .order_by('pk').values_list('pk', 'category_id', 'brand_id', 'price').iterator(chunk_size=10000):
+            position = positions[pk] = len(self.prices)
+            self.categories[category_id].append(position)
+            self.brands[brand_id].append(position)
+            self.prices.append(price)
+        for pk, name in ProductColor.objects.order_by().values_list('product_id', 'name').iterator(chunk_size=10000):
+            if pk in positions:
+                self.colors[name].append(positions[pk])
+        for pk, value_id in ProductFeature.objects.order_by().values_list('product_id', 'feature_value_id') \
+                .iterator(chunk_size=10000):
+            if pk in positions:
+                self.features[value_id].append(positions[pk])
+
+        self.active = (1 << len(self.prices)) - 1
+        self.categories = {key: _bitmap(ids) for key, ids in self.categories.items()}
+        self.brands = {key: _bitmap(ids) for key, ids in self.brands.items()}
+        self.colors = {key: _bitmap(ids) for key, ids in self.colors.items()}
+        self.features = {key: _bitmap(ids) for key, ids in self.features.items()}
+        self.in_stock = _bitmap(
+            positions[pk] for pk in ProductStock.objects.filter(stock__gt=0).order_by()
+            .values_list('product_id', flat=True).distinct() if pk in positions
+        )
+
+        self.brand_labels = {pk: (slug, name) for pk, slug, name in Brand.objects.values_list('pk', 'slug', 'name')}
+        self.brand_ids = {slug: pk for pk, (slug, _) in self.brand_labels.items()}
+        self.feature_labels = {
+            pk: (name, value) for pk, name, value in FeatureValue.objects.values_list('pk', 'feature__name', 'value')
+        }
+        self.feature_ids = {label: pk for pk, label in self.feature_labels.items()}
+
+        self.price_order = sorted((price, position) for position, price in enumerate(self.prices))
+        size = max(len(self.price_order) // PRICE_BUCKETS, 1)
+        self.bucket_starts = list(range(0, len(self.price_order), size))
+        self.buckets = [_bitmap(position for _, position in self.price_order[start:start + size])
+                        for start in self.bucket_starts]
+
+    # --- Selection ---
+    def price_range(self, price_min=None, price_max=None):
+        """ Bitmap of the products priced within [price_min, price_max]. """
+        low = 0 if price_min is None else bisect.bisect_left(self.price_order, (price_min, -1))
+        high = len(self.price_order) if price_max is None \
+            else bisect.bisect_right(self.price_order, (price_max, float('inf')))
+        if low >= high:
+            return 0
+        first = bisect.bisect_right(self.bucket_starts, low)
+        last = bisect.bisect_right(self.bucket_starts, high) - 1
+        if first > last:
+            return _bitmap(position for _, position in self.price_order[low:high])
+        bitmap = reduce(or_, self.buckets[first:last], 0)
+        edges = self.price_order[low:self.bucket_starts[first]] + self.price_order[self.bucket_starts[last]:high]
+        return bitmap | _bitmap(position for _, position in edges)
+
+    def select(self, filters, base, exclude=None):
+        """
+        Bitmap of the products in `base` matching `filters`.
+
+        `exclude` leaves one dimension out ('brand', 'color', 'price',
+        'in_stock' or a feature name); that is what its own counts are taken over.
+        """
+        bitmap = base
+        if filters.brands and exclude != 'brand':
+            bitmap &= reduce(or_, (self.brands.get(self.brand_ids.get(slug), 0) for slug in filters.brands))
+        if filters.colors and exclude != 'color':
+            bitmap &= reduce(or_, (self.colors.get(name, 0) for name in filters.colors))
+        if (filters.price_min is not None or filters.price_max is not None) and exclude != 'price':
+            bitmap &= self.price_range(filters.price_min, filters.price_max)
+        if filters.in_stock and exclude != 'in_stock':
+            bitmap &= self.in_stock
+        for name, values in filters.features.items():
+            if name != exclude:
+                bitmap &= reduce(or_, (self.features.get(self.feature_ids.get((name, value)), 0) for value in values))
+        return bitmap
+
+    def price_bounds(self, bitmap):
+        """ (min, max) list price of the products in `bitmap`. """
+        hits = [index for index, bucket in enumerate(self.buckets) if bucket & bitmap]
+        if not hits:
+            return None, None
+        low = min(self.prices[position] for position in _members(self.buckets[hits[0]] & bitmap))
+        high = max(self.prices[position] for position in _members(self.buckets[hits[-1]] & bitmap))
+        return low, high
+
+    # --- Counts ---
+    def counts(self, filters, category_ids=None):
+        """
+        Facet counts of the listing selected by `filters` (and optionally a set of categories).
+
+        Each dimension is counted with every filter but its own applied, so
+        picking one brand still shows how many products the other brands would add.
+        """
+        base = self.active
+        if category_ids is not None:
+            base &= reduce(or_, (self.categories.get(pk, 0) for pk in category_ids), 0)
+
+        selected = self.select(filters, base)
+        without_brand = self.select(filters, base, exclude='brand')
+        without_color = self.select(filters, base, exclude='color')
+        stocked = self.select(filters, base, exclude='in_stock') & self.in_stock
+        price_min, price_max = self.price_bounds(self.select(filters, base, exclude='price'))
+
+        features = defaultdict(list)
+        scopes = {name: self.select(filters, base, exclude=name) for name in filters.features}
+        for pk, bitmap in self.features.items():
+            name, value = self.feature_labels[pk]
+            count = (bitmap & scopes.get(name, selected)).bit_count()
+            if count:
+                features[name].append({'value': value, 'count': count})
+
+        def ranked(rows):
+            return sorted(rows, key=lambda row: -row['count'])
+
+        brands = []
+        for pk, bitmap in self.brands.items():
+            count = (bitmap & without_brand).bit_count()
+            if count:
+                slug, name = self.brand_labels[pk]
+                brands.append({'value': slug, 'label': name, 'count': count})
+
+        return {
+            'total': selected.bit_count(),
+            'in_stock': stocked.bit_count(),
+            'price': {'min': price_min, 'max': price_max},
+            'brand': ranked(brands),
+            'color': ranked(
+                {'value': name, 'count': (bitmap & without_color).bit_count()}
+                for name, bitmap in self.colors.items() if bitmap & without_color
+            ),
+            'features': {name: ranked(rows) for name, rows in features.items()},
+        }
+
+
+_index = None
+_index_versions = None
+_index_lock = threading.Lock()
+_rebuilding = False
+
+
+def _rebuild(versions):
+    """ Builds a fresh index and swaps it in; runs on a background thread with its own connection. """
+    global _index, _index_versions, _rebuilding
+    try:
+        index = FacetIndex()
+        with _index_lock:
+            _index, _index_versions = index, versions
+    except Exception:
+        logger.exception("Facet index rebuild failed; serving the previous index")
+    finally:
+        _rebuilding = False
+        connection.close()
+
+
+def get_index():
+    """
+    Returns this process's facet index, rebuilding it when the catalog
+    version counters show that one of FACET_MODELS changed.
+
+    Only the first index is built in the request. After that, a changed
+    version starts one background rebuild and requests keep getting the
+    previous index until it is swapped in, so writes never stall facet
+    requests (FACET_INDEX_BACKGROUND_REBUILD turns this off for tests).
+    Versions are read before the build, so writes during it trigger another.
+    """
+    global _index, _index_versions, _rebuilding
+    try:
+        versions = tuple(get_versions(FACET_MODELS))
+    except redis.RedisError:
+        logger.warning("Could not read catalog versions; serving the current facet index", exc_info=True)
+        versions = _index_versions
+
+    if _index is None or (versions != _index_versions and not settings.FACET_INDEX_BACKGROUND_REBUILD):
+        with _index_lock:
+            if _index is None or versions != _index_versions:
+                _index, _index_versions = FacetIndex(), versions
+    elif versions != _index_versions and not _rebuilding:
+        with _index_lock:
+            if _rebuilding or versions == _index_versions:
+                return _index
+            _rebuilding = True
+        threading.Thread(target=_rebuild, args=(versions,), name="facet-index-rebuild", daemon=True).start()
+    return _index
+
+
+def reset():
+    """ Drops this process's index, so the next request builds one from the database (for tests). """
+    global _index, _index_versions, _rebuilding
+    with _index_lock:
+        _index, _index_versions, _rebuilding = None, None, False
+
+
+def facet_counts(filters, category_ids=None):
+    """ Facet counts for a selection, from the bitmap index. """
+    return get_index().counts(filters, category_ids)
@@ -0,0 +1,138 @@
+"""
+Responsive image variants.
+
+Every product image is also stored as WebP and JPEG copies at the widths in
+IMAGE_VARIANT_WIDTHS, next to the original and named after a hash of its
+content (`<name>.<hash>.<width>w.webp`), so they can be cached forever. The
+names are kept on the row (`Image.variants`, `Product.image_variants`)
+together with the source file they were made from.
+
+Variants are made lazily: the first serialization of an image without
+current variants enqueues `generate_variants` for the job worker, behind a
+Redis lock (SET NX) so that concurrent requests for the same image queue one
+render, not one each. Until it ran the image is served without a srcset.
+"""
+import hashlib
+import logging
+import posixpath
+from io import BytesIO
+
+import redis
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image as PILImage, ImageOps
+
+from product.api.cache import bump_version
+from src.jobs import enqueue
+from src.settings import redis_client
+
+logger = logging.getLogger(__name__)
+
+LOCK_KEY = "image-variants:lock:{}:{}"
+# model label -> (image field, variants field)
+VARIANT_FIELDS = {
+    'product.image': ('file', 'variants'),
+    'product.product': ('image', 'image_variants'),
+}
+EXTENSIONS = {'webp': 'webp', 'jpeg': 'jpg'}
+
+
+# === Rendering ===
+def content_hash(field_file):
+    digest = hashlib.sha256()
+    with field_file.open('rb') as source:
+        for chunk in source.chunks():
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+def variant_name(source_name, digest, width, fmt):
+    stem, _ = posixpath.splitext(source_name)
+    return f"{stem}.{digest}.{width}w.{EXTENSIONS[fmt]}"
+
+
+def render_variants(field_file):
+    """
+    Writes the variants of `field_file` to its storage and returns
+    {'source': name, <format>: {<width>: name}}. Images are never upscaled:
+    widths above the original are left out, and an image narrower than every
+    width gets a single variant at its own width.
+    """
+    digest = content_hash(field_file)
+    with field_file.open('rb') as source:
+        original = ImageOps.exif_transpose(PILImage.open(source))
+        original.load()
+
+    widths = [width for width in sorted(settings.IMAGE_VARIANT_WIDTHS) if width < original.width] \
+        or [original.width]
+    storage = field_file.storage
+    variants = {'source': field_file.name}
+    for fmt in settings.IMAGE_VARIANT_FORMATS:
+        image = original.convert('RGB') if fmt == 'jpeg' or original.mode not in ('RGB', 'RGBA') else original
+        variants[fmt] = {}
+        for width in widths:
+            name = variant_name(field_file.name, digest, width, fmt)
+            if not storage.exists(name):
+                height = max(round(original.height * width / original.width), 1)
+                buffer = BytesIO()
+                image.resize((width, height), PILImage.LANCZOS).save(
+                    buffer, format=fmt.upper(), quality=settings.IMAGE_VARIANT_QUALITY
+                )
+                # Content-hashed names never change meaning, so an existing file is reused as is.
+                name = storage.save(name, ContentFile(buffer.getvalue()))
+            variants[fmt][str(width)] = name
+    return variants
+
+
+def generate_variants(label, pk):
+    """ Job: renders the variants of one image row and republishes what shows them. """
+    model = apps.get_model(label)
+    field, store = VARIANT_FIELDS[label]
+    instance = model._default_manager.filter(pk=pk).first()
+    if instance is None or not getattr(instance, field):
+        return
+    variants = render_variants(getattr(instance, field))
+    # update() rather than save(): the row itself did not change, only what is derived from it.
+    model._default_manager.filter(pk=pk).update(**{store: variants})
+    redis_client.delete(LOCK_KEY.format(label, pk))
+
+    from product.snapshots import refresh_snapshots
+    bump_version(label)
+    refresh_snapshots([instance.product_id if label == 'product.image' else instance.pk])
+
+
+# === Serving ===
+def request_variants(instance):
+    """ Queues one render for `instance`, however many requests ask for it meanwhile. """
+    label = instance._meta.label_lower
+    try:
+        if redis_client.set(LOCK_KEY.format(label, instance.pk), '1', nx=True,
+                            ex=settings.IMAGE_VARIANT_LOCK_SECONDS):
+            enqueue(generate_variants, label, instance.pk)
+    except redis.RedisError:
+        logger.warning("Could not queue image variants of %s %s", label, instance.pk, exc_info=True)
+
+
+def srcset(instance, request=None):
+    """
+    {format: "url 320w, url 640w"} for `instance`'s image, ready for a
+    <source srcset>; empty until the variants of its current file exist.
+    """
+    field, store = VARIANT_FIELDS[instance._meta.label_lower]
+    field_file = getattr(instance, field)
+    if not field_file:
+        return {}
+    variants = getattr(instance, store) or {}
+    if variants.get('source') != field_file.name:
+        request_variants(instance)
+        return {}
+
+    def url(name):
+        url = field_file.storage.url(name)
+        return request.build_absolute_uri(url) if request is not None else url
+
+    return {
+        fmt: ", ".join(f"{url(name)} {width}w" for width, name in sorted(widths.items(), key=lambda item: int(item[0])))
+        for fmt, widths in variants.items() if fmt != 'source'
+    }
@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from product.catalog_io import KINDS, export_catalog, write_rows
+
+
+class Command(BaseCommand):
+    help = "Exports brands, categories, features, products, colors or stock as CSV or JSONL."
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=KINDS)
+        parser.add_argument('path', nargs='?', default='-', help="File to write, or - for standard output.")
+        parser.add_argument('--format', choices=('csv', 'jsonl'),
+                            help="Defaults to the file extension, or jsonl for standard output.")
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('csv' if path.endswith('.csv') else 'jsonl')
+        try:
+            stream = self.stdout if path == '-' else open(path, 'w', newline='', encoding='utf-8')
+        except OSError as error:
+            raise CommandError(error)
+
+        start = time.perf_counter()
+        rows = export_catalog(options['kind'], chunk_size=options['chunk_size'])
+        if path == '-':
+            count = write_rows(stream, fmt, options['kind'], rows)
+        else:
+            with stream:
+                count = write_rows(stream, fmt, options['kind'], rows)
+        elapsed = time.perf_counter() - start
+        self.stderr.write(f"Exported {count} {options['kind']} rows in {elapsed:.1f}s, "
+                          f"{count / elapsed if elapsed else 0:.0f} rows/s.")
@@ -0,0 +1,39 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from product.catalog_io import KINDS, import_catalog, read_rows
+
+
+class Command(BaseCommand):
+    help = "Imports brands, categories, features, products, colors or stock from a CSV or JSONL file."
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=KINDS)
+        parser.add_argument('path', help="File to read, or - for standard input.")
+        parser.add_argument('--format', choices=('csv', 'jsonl'),
+                            help="Defaults to the file extension, or jsonl for standard input.")
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('csv' if path.endswith('.csv') else 'jsonl')
+        try:
+            stream = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+        except OSError as error:
+            raise CommandError(error)
+
+        start = time.perf_counter()
+        with stream:
+            report = import_catalog(options['kind'], read_rows(stream, fmt), batch_size=options['batch_size'])
+        elapsed = time.perf_counter() - start
+
+        for line, reason in report.errors:
+            self.stderr.write(f"line {line}: {reason}")
+        if report.skipped > len(report.errors):
+            self.stderr.write(f"... and {report.skipped - len(report.errors)} more skipped rows")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {report.written} of {report.rows} {options['kind']} rows ({report.skipped} skipped) "
+            f"in {elapsed:.1f}s, {report.rows / elapsed if elapsed else 0:.0f} rows/s."
+        ))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from product.models import CategoryClosure
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the category closure table from the category parent links."
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            count = CategoryClosure.objects.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt category closure table ({count} links)."))
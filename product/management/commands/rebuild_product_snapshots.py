@@ -0,0 +1,37 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from product.models import Product, ProductSnapshot
+from product.snapshots import refresh_snapshots
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the product snapshots (storefront read model) in parallel chunks."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=2000)
+        parser.add_argument('--workers', type=int, default=4)
+
+    def handle(self, *args, **options):
+        ids = list(Product.objects.order_by('pk').values_list('pk', flat=True))
+        chunks = [ids[start:start + options['chunk_size']] for start in range(0, len(ids), options['chunk_size'])]
+
+        def rebuild(chunk):
+            try:
+                return refresh_snapshots(chunk)
+            finally:
+                connection.close()
+
+        if options['workers'] > 1:
+            with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+                written = sum(pool.map(rebuild, chunks))
+        else:
+            written = sum(map(refresh_snapshots, chunks))
+
+        stale = ProductSnapshot.objects.exclude(product__in=Product.objects.filter(is_active=True, is_deleted=False))
+        removed, _ = stale.delete()
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {written} product snapshots in {len(chunks)} chunks; removed {removed} stale ones."
+        ))
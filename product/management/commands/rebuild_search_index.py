@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from product.search import is_supported, rebuild_search_vectors
+
+
+class Command(BaseCommand):
+    help = "Recomputes the full-text search document of every product."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        if not is_supported():
+            self.stdout.write(self.style.WARNING("Full-text search needs PostgreSQL; nothing to rebuild."))
+            return
+        count = rebuild_search_vectors(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt the search document of {count} products."))
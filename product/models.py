@@ -1,11 +1,13 @@
-from django.db import models
+from django.db import models, transaction
 from django.urls import reverse
-from django.utils.text import slugify
 from django.core.validators import MinValueValidator
 from django.utils.timezone import now
 from django.core.exceptions import ValidationError
 import uuid
 from django.core.validators import FileExtensionValidator
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
+from product.slugs import save_with_unique_slug
 
 
 # === Category Model ===
@@ -27,12 +29,52 @@ class Category(models.Model):
         verbose_name_plural = 'categories'
         db_table = 'category'
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if 'parent_id' in instance.__dict__:
+            instance._loaded_parent_id = instance.parent_id
+        return instance
+
+    def save(self, *args, **kwargs):
+        """
+        Saves the category, giving it a free slug from its name when it has none,
+        and keeps the closure table in sync with its position in the tree.
+        """
+        is_new = self._state.adding
+        is_moved = not is_new and self.parent_id != getattr(self, '_loaded_parent_id', self.parent_id)
+        if is_moved and CategoryClosure.objects.filter(ancestor=self, descendant_id=self.parent_id).exists():
+            raise ValueError("A category cannot be moved under itself or one of its subcategories")
+
+        with transaction.atomic():
+            save_with_unique_slug(self, super().save, *args, **kwargs)
+            if is_new:
+                CategoryClosure.objects.insert_node(self)
+            elif is_moved:
+                CategoryClosure.objects.move_subtree(self)
+        self._loaded_parent_id = self.parent_id
+
     def get_absolute_api_url(self):
         return reverse('api:category-detail', args=[self.id])
 
+    def descendants(self, include_self=False):
+        """ Returns every non-deleted category below this one, at any depth, in a single query. """
+        return Category.objects.filter(
+            ancestor_links__ancestor=self,
+            ancestor_links__depth__gte=0 if include_self else 1,
+            is_deleted=False,
+        )
+
+    def ancestors(self, include_self=False):
+        """ Returns the path from the root down to this category's parent (or itself) in a single query. """
+        return Category.objects.filter(
+            descendant_links__descendant=self,
+            descendant_links__depth__gte=0 if include_self else 1,
+        ).order_by('-descendant_links__depth')
+
     def is_main_branch(self):
         """ Checks if the category is a main branch (has no parent). """
-        return self.parent is None  # True if it has no parent
+        return self.parent_id is None  # True if it has no parent
 
     def get_all_branches(self):
         """ Returns all subcategories of this category if it's a main branch. """
@@ -68,12 +110,80 @@ class Category(models.Model):
         return self.name
 
 
+# === Category Closure Table ===
+class CategoryClosureManager(models.Manager):
+
+    def insert_node(self, category):
+        """ Links a new category to itself and to every ancestor of its parent. """
+        links = [self.model(ancestor=category, descendant=category, depth=0)]
+        if category.parent_id:
+            links += [
+                self.model(ancestor_id=link.ancestor_id, descendant=category, depth=link.depth + 1)
+                for link in self.filter(descendant_id=category.parent_id)
+            ]
+        self.bulk_create(links)
+
+    def move_subtree(self, category):
+        """ Re-attaches the subtree rooted at `category` under its new parent. """
+        subtree = list(self.filter(ancestor=category).values_list('descendant_id', 'depth'))
+        subtree_ids = [descendant_id for descendant_id, _ in subtree]
+        self.filter(descendant_id__in=subtree_ids).exclude(ancestor_id__in=subtree_ids).delete()
+        if category.parent_id:
+            self.bulk_create([
+                self.model(ancestor_id=link.ancestor_id, descendant_id=descendant_id,
+                           depth=link.depth + depth + 1)
+                for link in self.filter(descendant_id=category.parent_id)
+                for descendant_id, depth in subtree
+            ])
+
+    def rebuild(self):
+        """ Rebuilds the whole closure table from the `parent` adjacency list. """
+        parents = dict(Category.objects.values_list('id', 'parent_id'))
+        links = []
+        for category_id in parents:
+            ancestor_id, depth = category_id, 0
+            while ancestor_id is not None and depth <= len(parents):
+                links.append(self.model(ancestor_id=ancestor_id, descendant_id=category_id, depth=depth))
+                ancestor_id, depth = parents.get(ancestor_id), depth + 1
+        self.all().delete()
+        self.bulk_create(links, batch_size=5000)
+        return len(links)
+
+
+class CategoryClosure(models.Model):
+    """
+    Closure table over the category tree: one row per (ancestor, descendant) pair.
+
+    Attributes:
+        ancestor (Category): A category at or above `descendant` in the tree.
+        descendant (Category): A category at or below `ancestor` in the tree.
+        depth (int): Number of levels between the two (0 for the self link).
+    """
+    ancestor = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='descendant_links')
+    descendant = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='ancestor_links')
+    depth = models.PositiveIntegerField()
+
+    objects = CategoryClosureManager()
+
+    class Meta:
+        unique_together = ('ancestor', 'descendant')
+        indexes = [models.Index(fields=['descendant', 'depth'])]
+        db_table = 'category_closure'
+
+    def __str__(self):
+        return f"{self.ancestor} > {self.descendant} ({self.depth})"
+
+
 # === Brand Model ===
 class Brand(models.Model):
     name = models.CharField(max_length=255, unique=True)
     slug = models.SlugField(max_length=255, unique=True)
     description = models.TextField(null=True, blank=True)
 
+    def save(self, *args, **kwargs):
+        """ Saves the brand, giving it a free slug from its name when it has none. """
+        save_with_unique_slug(self, super().save, *args, **kwargs)
+
     def __str__(self):
         return self.name
 
@@ -92,9 +202,12 @@ class Product(models.Model):
         price (Decimal): The original price of the product.
         weight (Decimal): The weight of the product.
         image (ImageField, optional): The main image of the product.
+        image_variants (dict): Resized copies of `image`, maintained by product.images.
         created (datetime): Timestamp when the product was created.
         updated (datetime): Timestamp when the product was last updated.
         is_active (bool): Determines if the product is available for purchase.
+        search_vector (tsvector): Weighted full-text document over name, brand,
+            category and description, maintained by product.search.
     """
     category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='products')
     name = models.CharField(max_length=255)
@@ -104,32 +217,27 @@ class Product(models.Model):
     price = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     weight = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     image = models.ImageField(upload_to="product_images/%Y/%m/%d", blank=True, null=True)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
     is_active = models.BooleanField(default=True)
     is_deleted = models.BooleanField(default=False)
+    search_vector = SearchVectorField(null=True, editable=False)
 
     class Meta:
         ordering = ['-created']
         indexes = [
             models.Index(fields=['id', 'slug']),
             models.Index(fields=['name']),
-            models.Index(fields=['-created']),
+            models.Index(fields=['-created', '-id']),
+            GinIndex(fields=['search_vector'], name='product_search_vector_gin'),
         ]
         verbose_name_plural = 'products'
         db_table = 'product'
 
     def save(self, *args, **kwargs):
-        """ Generates a unique slug if not provided and ensures no duplicates. """
-        if not self.slug:
-            base_slug = slugify(self.name)
-            unique_slug = base_slug
-            num = 1
-            while Product.objects.filter(slug=unique_slug).exists():
-                unique_slug = f"{base_slug}-{num}"
-                num += 1
-            self.slug = unique_slug
-        super().save(*args, **kwargs)
+        """ Saves the product, giving it a free slug from its name when it has none. """
+        save_with_unique_slug(self, super().save, *args, **kwargs)
 
     def get_absolute_api_url(self):
         return reverse('api:product-detail', args=[self.id])
@@ -300,6 +408,16 @@ class Discount(models.Model):
 
 
 # === DiscountCode Model ===
+class DiscountCodeQuerySet(models.QuerySet):
+    def redeemable(self, at=None):
+        """ Codes that are active, inside their date window and still have uses left. """
+        at = at or now()
+        return self.filter(
+            active=True, start_date__lte=at, end_date__gte=at, used_count__lt=models.F('max_uses')
+        )
+
+
+
 class DiscountCode(models.Model):
     """
     Represents a discount code that can be applied to an order.
@@ -323,6 +441,8 @@ class DiscountCode(models.Model):
     used_count = models.PositiveIntegerField(default=0)
     active = models.BooleanField(default=True)
 
+    objects = DiscountCodeQuerySet.as_manager()
+
     class Meta:
         verbose_name_plural = "discount codes"
         db_table = "discount_code"
@@ -343,13 +463,22 @@ class DiscountCode(models.Model):
         self.clean()
         super().save(*args, **kwargs)
 
+    def is_in_effect(self):
+        """ Checks if the discount code is active and inside its date window, regardless of its usage. """
+        return self.active and self.start_date <= now() <= self.end_date
+
     def is_valid(self):
         """ Checks if the discount code is still valid (not expired and not overused). """
-        return self.active and self.start_date <= now() <= self.end_date and self.used_count < self.max_uses
+        return self.is_in_effect() and self.used_count < self.max_uses
 
-    def apply_discount(self, price):
-        """ Applies the discount to the given order price. """
-        if self.is_valid():
+    def apply_discount(self, price, redeemed=False):
+        """
+        Applies the discount to the given order price.
+
+        `redeemed` is set for an order that already holds one of the code's uses,
+        so taking the last use does not take the discount away from that order.
+        """
+        if self.is_in_effect() if redeemed else self.is_valid():
             if self.discount_type == 'percent':
                 return price * (1 - (self.value / 100))
             elif self.discount_type == 'amount':
@@ -378,6 +507,8 @@ class Image(models.Model):
     )
     title = models.CharField(max_length=255, blank=True, null=True)
     description = models.TextField(blank=True, null=True)
+    # Resized WebP/JPEG copies of `file`, maintained by product.images.
+    variants = models.JSONField(default=dict, blank=True, editable=False)
     created = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -388,3 +519,38 @@ class Image(models.Model):
 
     def __str__(self):
         return f"Image for {self.product.name}"
+
+
+# === Product Snapshot (read model) ===
+class ProductSnapshot(models.Model):
+    """
+    The pre-serialized storefront payload of an active product.
+
+    Rebuilt by product.snapshots whenever one of its source rows changes, so
+    the list and detail endpoints can serve a product with one indexed query.
+
+    Attributes:
+        product (Product): The product this snapshot renders.
+        slug (str): Copy of the product slug, for detail lookups.
+        created (datetime): Copy of the product creation time, for keyset pagination.
+        in_stock (bool): Whether any variant of the product has stock left.
+        payload (dict): The ProductSerializer output plus `in_stock`.
+        valid_until (datetime, optional): When the product's discount starts or
+            ends, i.e. when the stored final price stops being correct.
+        updated (datetime): When the snapshot was last rebuilt.
+    """
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='snapshot')
+    slug = models.SlugField(max_length=255, unique=True)
+    created = models.DateTimeField()
+    in_stock = models.BooleanField(default=False)
+    payload = models.JSONField()
+    valid_until = models.DateTimeField(null=True, blank=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['-created', '-product'])]
+        verbose_name_plural = 'product snapshots'
+        db_table = 'product_snapshot'
+
+    def __str__(self):
+        return f"Snapshot of {self.slug}"
@@ -0,0 +1,71 @@
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db.models import QuerySet
+from django.utils.timezone import now
+
+from product.models import Discount, Product
+
+CENT = Decimal('0.01')
+
+
+# === Pricing Engine ===
+def discounted_price(price, discount):
+    """ Applies `discount` to `price` with exact Decimal arithmetic, rounded to the cent. """
+    price = Decimal(price)
+    if discount is None:
+        return price.quantize(CENT, rounding=ROUND_HALF_UP)
+
+    if discount.discount_type == 'percent':
+        price = price * (Decimal(100) - discount.value) / Decimal(100)
+    elif discount.discount_type == 'amount':
+        price = max(price - discount.value, Decimal(0))
+    return price.quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def _is_active(discount, at):
+    return discount is not None and discount.active and discount.start_date <= at <= discount.end_date
+
+
+def active_discounts(products, at):
+    """
+    Returns a {product_id: Discount} map of the discounts valid at `at`.
+
+    Discounts already loaded through select_related are reused; otherwise all
+    active rows are fetched in a single query.
+    """
+    if isinstance(products, QuerySet):
+        rows = Discount.objects.filter(product__in=products.values('id'))
+    else:
+        relation = Product._meta.get_field('discount')
+        if all(relation.is_cached(product) for product in products):
+            discounts = (getattr(product, 'discount', None) for product in products)
+            return {d.product_id: d for d in discounts if _is_active(d, at)}
+        rows = Discount.objects.filter(product_id__in=[product.id for product in products])
+
+    rows = rows.filter(active=True, start_date__lte=at, end_date__gte=at)
+    return {discount.product_id: discount for discount in rows}
+
+
+def final_prices(products, at=None):
+    """
+    Calculates the final price of many products at once.
+
+    Every discount is evaluated against the same timestamp, so a page of
+    products is always priced consistently.
+
+    Returns:
+        dict: {product_id: Decimal final price}
+    """
+    at = at or now()
+    if isinstance(products, QuerySet):
+        discounts = active_discounts(products, at)
+        products = products.only('id', 'price')
+    else:
+        products = list(products)
+        discounts = active_discounts(products, at)
+    return {product.id: discounted_price(product.price, discounts.get(product.id)) for product in products}
+
+
+def final_price(product, at=None):
+    """ Calculates the final price of a single product. """
+    return final_prices([product], at)[product.id]
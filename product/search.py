@@ -0,0 +1,122 @@
+import re
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank, SearchVector
+from django.db import connection
+from django.db.models import Case, F, FloatField, OuterRef, Q, Subquery, Value, When
+from django.utils.html import escape
+
+from product.models import Brand, Category, Product
+
+FALLBACK_FIELDS = ('name', 'description', 'brand__name', 'category__name')
+MAX_TERMS = 8
+# ts_headline does not escape the text around its markers; it marks matches with these
+# private-use characters instead, and `headline` turns them into <mark> after escaping.
+START_SEL, STOP_SEL = '\ue000', '\ue001'
+
+
+def is_supported():
+    """ Full-text search needs PostgreSQL; other databases use the icontains fallback. """
+    return connection.vendor == 'postgresql'
+
+
+# === Search document ===
+def search_document():
+    """
+    The weighted tsvector stored on every product: name (A), brand and
+    category names (B) and description (C). Brand and category names come from
+    correlated subqueries, so the document can be written with a plain UPDATE.
+    """
+    config = settings.PRODUCT_SEARCH_CONFIG
+    brand_name = Subquery(Brand.objects.filter(pk=OuterRef('brand_id')).values('name')[:1])
+    category_name = Subquery(Category.objects.filter(pk=OuterRef('category_id')).values('name')[:1])
+    return (
+        SearchVector('name', weight='A', config=config)
+        + SearchVector(brand_name, weight='B', config=config)
+        + SearchVector(category_name, weight='B', config=config)
+        + SearchVector('description', weight='C', config=config)
+    )
+
+
+def update_search_vectors(queryset):
+    """ Recomputes the search document of every product in `queryset` with a single UPDATE. """
+    if not is_supported():
+        return 0
+    return queryset.update(search_vector=search_document())
+
+
+def rebuild_search_vectors(batch_size=10000):
+    """ Recomputes every product's search document in primary key batches and returns the row count. """
+    updated, last_id = 0, 0
+    while True:
+        ids = list(Product.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return updated
+        updated += update_search_vectors(Product.objects.filter(pk__gte=ids[0], pk__lte=ids[-1]))
+        last_id = ids[-1]
+
+
+# === Queries ===
+def search_terms(q):
+    """ Splits a user query into at most MAX_TERMS lower-case word tokens. """
+    return re.findall(r'\w+', q.lower())[:MAX_TERMS]
+
+
+def prefix_query(terms):
+    """ Every term must match as a word prefix (`lap:* & del:*`). """
+    return SearchQuery(
+        ' & '.join(f'{term}:*' for term in terms), search_type='raw', config=settings.PRODUCT_SEARCH_CONFIG
+    )
+
+
+def search_products(queryset, terms):
+    """
+    Filters `queryset` to the products matching every term, best match first.
+
+    On PostgreSQL this is a GIN-indexed tsvector match annotated with `rank`
+    and a `search_headline` snippet; elsewhere every term must appear in one
+    of the FALLBACK_FIELDS and products matching by name rank first.
+    """
+    if not terms:
+        return queryset.none()
+
+    if is_supported():
+        query = prefix_query(terms)
+        return queryset.filter(search_vector=query).annotate(
+            rank=SearchRank(F('search_vector'), query),
+            search_headline=SearchHeadline(
+                'description', query, config=settings.PRODUCT_SEARCH_CONFIG,
+                start_sel=START_SEL, stop_sel=STOP_SEL, max_words=30, min_words=10, max_fragments=2,
+            ),
+        ).order_by('-rank', '-id')
+
+    for term in terms:
+        queryset = queryset.filter(reduce(or_, (Q(**{f'{field}__icontains': term}) for field in FALLBACK_FIELDS)))
+    return queryset.annotate(
+        rank=Case(When(name__icontains=terms[0], then=Value(1.0)), default=Value(0.5), output_field=FloatField()),
+    ).order_by('-rank', '-id')
+
+
+def highlight(text, terms, width=160):
+    """ Marks the terms in a snippet of `text` around their first match, like ts_headline. """
+    if not text:
+        return ''
+    pattern = re.compile(r'\b(?:%s)\w*' % '|'.join(map(re.escape, terms)), re.IGNORECASE)
+    match = pattern.search(text)
+    start = max(match.start() - width // 4, 0) if match else 0
+    snippet = text[start:start + width]
+    return pattern.sub(lambda found: f'<mark>{found.group(0)}</mark>', escape(snippet))
+
+
+def mark_headline(text):
+    """ Escapes a ts_headline snippet and turns its START_SEL/STOP_SEL markers into <mark> tags. """
+    return escape(text or '').replace(START_SEL, '<mark>').replace(STOP_SEL, '</mark>')
+
+
+def headline(product, terms):
+    """ The highlighted description snippet of a search result, safe to render as HTML. """
+    if hasattr(product, 'search_headline'):
+        return mark_headline(product.search_headline)
+    return highlight(product.description, terms)
@@ -0,0 +1,121 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from product.api.cache import bump_version_on_commit
+from product.models import (
+    Brand, Category, Discount, Feature, FeatureValue, Image, Product, ProductColor, ProductFeature, ProductStock
+)
+from product.search import update_search_vectors
+from product.snapshots import refresh_on_commit
+from product.stock_matrix import invalidate as invalidate_stock_matrices
+
+CATALOG_SENDERS = (
+    Product, Category, Brand, Discount, Image, ProductColor, ProductFeature, Feature, FeatureValue, ProductStock,
+)
+
+
+# === Catalog cache invalidation ===
+def bump_catalog_version(sender, **kwargs):
+    """ Soft deletes go through save(), so post_save covers them as well. """
+    bump_version_on_commit(sender._meta.label_lower)
+
+
+for model in CATALOG_SENDERS:
+    post_save.connect(bump_catalog_version, sender=model, dispatch_uid=f"catalog-save-{model._meta.label_lower}")
+    post_delete.connect(bump_catalog_version, sender=model, dispatch_uid=f"catalog-delete-{model._meta.label_lower}")
+
+
+@receiver(m2m_changed, sender=ProductStock.feature_values.through)
+def bump_stock_features_version(sender, **kwargs):
+    bump_version_on_commit(ProductStock._meta.label_lower)
+
+
+# === Search document maintenance ===
+SEARCH_FIELDS = {'name', 'description', 'brand', 'brand_id', 'category', 'category_id'}
+
+
+@receiver(post_save, sender=Product, dispatch_uid="search-product")
+def update_product_search_vector(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or SEARCH_FIELDS & set(update_fields):
+        update_search_vectors(Product.objects.filter(pk=instance.pk))
+
+
+@receiver(post_save, sender=Brand, dispatch_uid="search-brand")
+def update_brand_search_vectors(sender, instance, created, **kwargs):
+    if not created:
+        update_search_vectors(Product.objects.filter(brand=instance))
+
+
+@receiver(post_save, sender=Category, dispatch_uid="search-category")
+def update_category_search_vectors(sender, instance, created, **kwargs):
+    if not created:
+        update_search_vectors(Product.objects.filter(category=instance))
+
+
+# === Product snapshot maintenance ===
+SNAPSHOT_SOURCES = {
+    Product: lambda instance: [instance.pk],
+    Category: lambda instance: Product.objects.filter(category_id=instance.pk).values_list('pk', flat=True),
+    Brand: lambda instance: Product.objects.filter(brand_id=instance.pk).values_list('pk', flat=True),
+    Discount: lambda instance: [instance.product_id],
+    Image: lambda instance: [instance.product_id],
+    ProductColor: lambda instance: [instance.product_id],
+    ProductFeature: lambda instance: [instance.product_id],
+    ProductStock: lambda instance: [instance.product_id],
+    FeatureValue: lambda instance: Product.objects.filter(
+        features__feature_value_id=instance.pk
+    ).values_list('pk', flat=True),
+    Feature: lambda instance: Product.objects.filter(
+        features__feature_value__feature_id=instance.pk
+    ).values_list('pk', flat=True),
+}
+
+
+def refresh_product_snapshots(sender, instance, **kwargs):
+    """
+    Affected products are resolved now, before a delete cascades through the
+    rows that link them, and rebuilt once the transaction commits.
+    """
+    refresh_on_commit(SNAPSHOT_SOURCES[sender](instance))
+
+
+for model in SNAPSHOT_SOURCES:
+    post_save.connect(refresh_product_snapshots, sender=model, dispatch_uid=f"snapshot-save-{model._meta.label_lower}")
+    if model is not Product:
+        pre_delete.connect(
+            refresh_product_snapshots, sender=model, dispatch_uid=f"snapshot-delete-{model._meta.label_lower}"
+        )
+
+
+# === Stock matrix invalidation ===
+MATRIX_SOURCES = {
+    ProductStock: lambda instance: [instance.product_id],
+    ProductColor: lambda instance: [instance.product_id],
+    FeatureValue: lambda instance: ProductStock.objects.filter(
+        feature_values=instance.pk
+    ).values_list('product_id', flat=True),
+    Feature: lambda instance: ProductStock.objects.filter(
+        feature_values__feature_id=instance.pk
+    ).values_list('product_id', flat=True),
+}
+
+
+def drop_stock_matrices(sender, instance, **kwargs):
+    invalidate_stock_matrices(MATRIX_SOURCES[sender](instance))
+
+
+for model in MATRIX_SOURCES:
+    post_save.connect(drop_stock_matrices, sender=model, dispatch_uid=f"matrix-save-{model._meta.label_lower}")
+    pre_delete.connect(drop_stock_matrices, sender=model, dispatch_uid=f"matrix-delete-{model._meta.label_lower}")
+
+
+@receiver(m2m_changed, sender=ProductStock.feature_values.through, dispatch_uid="matrix-stock-features")
+def drop_stock_feature_matrices(sender, instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith('post_') and action != 'pre_clear':
+        return
+    if not reverse:
+        invalidate_stock_matrices([instance.product_id])
+    elif action == 'pre_clear':
+        invalidate_stock_matrices(instance.stock_items.values_list('product_id', flat=True))
+    elif pk_set:
+        invalidate_stock_matrices(ProductStock.objects.filter(pk__in=pk_set).values_list('product_id', flat=True))
@@ -0,0 +1,84 @@
+import re
+from functools import reduce
+from operator import or_
+
+from django.db import IntegrityError, transaction
+from django.db.models import BigIntegerField, Count, Max, Q
+from django.db.models.functions import Cast, Substr
+from django.utils.text import slugify
+
+SUFFIX = re.compile(r'-(\d+)$')
+SAVE_ATTEMPTS = 5
+
+
+def base_slug(model, name, field='slug'):
+    """ slugify(name), shortened so a `-<n>` suffix still fits the field. """
+    max_length = model._meta.get_field(field).max_length
+    return slugify(name)[:max_length - 11].strip('-') or model._meta.model_name
+
+
+def unique_slugs(model, names, field='slug', taken=()):
+    """
+    Returns one free slug per name, in order, with a single query.
+
+    Slugs follow the `name`, `name-1`, `name-2` scheme of the save-time loop.
+    The query returns one row: per base, whether the bare slug is taken and
+    the highest numeric suffix in use, both aggregated in the database, so
+    the Nth product with the same name costs as little as the first.
+    `taken` adds slugs that are not in the database yet (an import batch).
+    """
+    bases = [base_slug(model, name, field) for name in names]
+    if not bases:
+        return []
+    unique_bases = sorted(set(bases))
+    lookup = reduce(or_, (Q(**{field: base}) | Q(**{f'{field}__startswith': f'{base}-'}) for base in unique_bases))
+    aggregates = {}
+    for i, base in enumerate(unique_bases):
+        aggregates[f'exact_{i}'] = Count('pk', filter=Q(**{field: base}))
+        aggregates[f'suffix_{i}'] = Max(
+            Cast(Substr(field, len(base) + 2), BigIntegerField()),
+            filter=Q(**{f'{field}__regex': rf'^{re.escape(base)}-[0-9]{{1,18}}$'}),
+        )
+    found = model._default_manager.filter(lookup).aggregate(**aggregates)
+
+    assigned = {*taken, *(base for i, base in enumerate(unique_bases) if found[f'exact_{i}'])}
+    next_suffix = {base: (found[f'suffix_{i}'] or 0) + 1 for i, base in enumerate(unique_bases)}
+    for slug in taken:
+        if (match := SUFFIX.search(slug)) and slug[:match.start()] in next_suffix:
+            base = slug[:match.start()]
+            next_suffix[base] = max(next_suffix[base], int(match.group(1)) + 1)
+
+    slugs = []
+    for base in bases:
+        slug = base
+        # Only slugs handed out in this call can still collide, e.g. "foo-1" for "Foo" and for "Foo 1".
+        while slug in assigned:
+            slug = f"{base}-{next_suffix[base]}"
+            next_suffix[base] += 1
+        assigned.add(slug)
+        slugs.append(slug)
+    return slugs
+
+
+def save_with_unique_slug(instance, save, *args, field='slug', source='name', **kwargs):
+    """
+    Runs `save(*args, **kwargs)`, first filling a blank slug from `source`.
+
+    The slug comes from `unique_slugs` (one query), not a probing loop. When a
+    concurrent save takes the same slug first, the unique constraint fails
+    inside a savepoint and the next free slug is tried, up to SAVE_ATTEMPTS times.
+    """
+    if getattr(instance, field):
+        return save(*args, **kwargs)
+    model = type(instance)
+    for attempt in range(SAVE_ATTEMPTS):
+        setattr(instance, field, unique_slugs(model, [getattr(instance, source)], field)[0])
+        try:
+            with transaction.atomic():
+                return save(*args, **kwargs)
+        except IntegrityError:
+            # Only a lost race on the slug is retried; other constraint errors propagate.
+            lost_race = model._default_manager.filter(**{field: getattr(instance, field)}).exists()
+            setattr(instance, field, '')
+            if not lost_race or attempt == SAVE_ATTEMPTS - 1:
+                raise
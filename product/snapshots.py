@@ -0,0 +1,118 @@
+import json
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef, QuerySet
+from django.utils.timezone import now
+from rest_framework.renderers import JSONRenderer
+
+from product.api.query_plans import plan_queryset
+from product.api.serializers import ProductSerializer
+from product.models import Product, ProductSnapshot, ProductStock
+from src.db.routers import use_primary
+
+SNAPSHOT_ORDERING = ('-created', '-product_id')
+
+
+# === Building ===
+def price_valid_until(product, at):
+    """ Returns when the product's discount next starts or ends, i.e. when its final price changes. """
+    discount = getattr(product, 'discount', None) if Product.discount.is_cached(product) else None
+    if discount is None or not discount.active:
+        return None
+    if discount.start_date > at:
+        return discount.start_date
+    if discount.end_date > at:
+        return discount.end_date
+    return None
+
+
+def refresh_snapshots(products, batch_size=500):
+    """
+    Rebuilds the snapshots of `products` (a Product queryset or an iterable of ids).
+
+    Products are serialized in batches through the same query plan as the
+    API, without a request, so media URLs are stored as paths (see
+    `snapshot_payloads`); snapshots are upserted, and those of products that
+    are no longer active are removed. Returns the number of snapshots written.
+    """
+    # Snapshots outlive the request that triggers them: never build one from a lagging replica.
+    with use_primary():
+        return _refresh_snapshots(products, batch_size)
+
+
+def _refresh_snapshots(products, batch_size):
+    if isinstance(products, QuerySet):
+        products = products.values_list('pk', flat=True)
+    ids = sorted(set(products))
+    written = 0
+    for start in range(0, len(ids), batch_size):
+        batch = ids[start:start + batch_size]
+        live = list(
+            plan_queryset(Product.objects.filter(pk__in=batch, is_active=True, is_deleted=False), ProductSerializer)
+            .annotate(in_stock=Exists(ProductStock.objects.filter(product=OuterRef('pk'), stock__gt=0)))
+        )
+        payloads = json.loads(JSONRenderer().render(ProductSerializer(live, many=True).data))
+        at = now()
+        snapshots = [
+            ProductSnapshot(
+                product=product, slug=product.slug, created=product.created, in_stock=product.in_stock,
+                payload={**payload, 'in_stock': product.in_stock}, valid_until=price_valid_until(product, at),
+            )
+            for product, payload in zip(live, payloads)
+        ]
+        with transaction.atomic():
+            ProductSnapshot.objects.filter(product_id__in=batch).exclude(product_id__in=[p.pk for p in live]).delete()
+            ProductSnapshot.objects.bulk_create(
+                snapshots, update_conflicts=True, unique_fields=['product'],
+                update_fields=['slug', 'created', 'in_stock', 'payload', 'valid_until', 'updated'],
+            )
+        written += len(snapshots)
+    return written
+
+
+def refresh_on_commit(product_ids):
+    """ Rebuilds the snapshots once the current transaction commits (immediately in autocommit mode). """
+    product_ids = list(product_ids)
+    if product_ids:
+        transaction.on_commit(lambda: refresh_snapshots(product_ids))
+
+
+# === Serving ===
+def absolute_urls(payload, request):
+    """ A copy of `payload` with its media paths made absolute, as the serializers make them with a request. """
+    def url(path):
+        return request.build_absolute_uri(path) if path else path
+
+    def source(entry):
+        path, width = entry.rsplit(' ', 1)
+        return f"{url(path)} {width}"
+
+    def srcset(sources):
+        return {fmt: ", ".join(source(entry) for entry in value.split(", ")) for fmt, value in sources.items()}
+
+    return {
+        **payload,
+        'image': url(payload['image']),
+        'image_srcset': srcset(payload['image_srcset']),
+        'images': [
+            {**image, 'file': url(image['file']), 'srcset': srcset(image['srcset'])} for image in payload['images']
+        ],
+    }
+
+
+def snapshot_payloads(snapshots, request=None):
+    """
+    Returns the payloads of `snapshots`, rebuilding first those whose final
+    price expired (a discount started or ended since they were written).
+    With a `request`, media URLs are absolute, as in the serializer output.
+    """
+    snapshots = list(snapshots)
+    at = now()
+    expired = [s.product_id for s in snapshots if s.valid_until is not None and s.valid_until <= at]
+    if expired:
+        refresh_snapshots(expired)
+        fresh = ProductSnapshot.objects.in_bulk(expired)
+        snapshots = [fresh.get(s.product_id, s) for s in snapshots]
+    if request is None:
+        return [snapshot.payload for snapshot in snapshots]
+    return [absolute_urls(snapshot.payload, request) for snapshot in snapshots]
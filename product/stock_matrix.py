@@ -0,0 +1,147 @@
+import json
+import logging
+from collections import defaultdict
+
+import redis
+from django.conf import settings
+from django.db import transaction
+
+from product.api.cache import bump_version
+from product.models import ProductStock
+from product.snapshots import refresh_snapshots
+from src.db.routers import use_primary
+from src.settings import redis_client
+
+logger = logging.getLogger(__name__)
+
+MATRIX_KEY = "stock:matrix:{}"
+
+
+# === Stock Matrix ===
+class StockMatrix:
+    """
+    The variants of one product, keyed by (color id, frozenset of feature value ids).
+
+    Every variant is a plain dict: `id` (the ProductStock row), `stock`,
+    `color` {id, name, hex_code} and `feature_values` [{id, feature, value, hex_code}].
+    """
+
+    def __init__(self, product_id, variants):
+        self.product_id = product_id
+        self.variants = variants
+        self.by_key = {}
+        self.by_color = defaultdict(list)
+        for variant in variants:
+            feature_ids = frozenset(value['id'] for value in variant['feature_values'])
+            self.by_key[(variant['color']['id'], feature_ids)] = variant
+            self.by_color[variant['color']['id']].append((feature_ids, variant))
+
+    def find(self, color_id, feature_value_ids=()):
+        """
+        Returns the variant of `color_id` with exactly `feature_value_ids` (a dict hit),
+        or else the one of that color carrying all of them; None if there is none.
+        """
+        selected = frozenset(feature_value_ids)
+        variant = self.by_key.get((color_id, selected))
+        if variant is None:
+            variant = next((v for ids, v in self.by_color.get(color_id, ()) if selected <= ids), None)
+        return variant
+
+    def stock_item(self, variant):
+        """ An unsaved ProductStock carrying the variant's ids and stock, for reservations. """
+        return ProductStock(
+            id=variant['id'], product_id=self.product_id, color_id=variant['color']['id'], stock=variant['stock']
+        )
+
+
+def build_variants(product_ids):
+    """ Loads the variants of many products with a single joined query. Returns {product_id: [variant]}. """
+    rows = ProductStock.objects.filter(product_id__in=product_ids).order_by('pk').values_list(
+        'pk', 'product_id', 'stock', 'color_id', 'color__name', 'color__hex_code',
+        'feature_values__id', 'feature_values__feature__name', 'feature_values__value', 'feature_values__hex_code',
+    )
+    variants, by_pk = defaultdict(list), {}
+    for pk, product_id, stock, color_id, color_name, color_hex, value_id, feature, value, value_hex in rows:
+        variant = by_pk.get(pk)
+        if variant is None:
+            variant = by_pk[pk] = {
+                'id': pk, 'stock': stock,
+                'color': {'id': color_id, 'name': color_name, 'hex_code': color_hex},
+                'feature_values': [],
+            }
+            variants[product_id].append(variant)
+        if value_id is not None:
+            variant['feature_values'].append({'id': value_id, 'feature': feature, 'value': value, 'hex_code': value_hex})
+    return variants
+
+
+def get_matrices(product_ids):
+    """
+    Returns {product_id: StockMatrix}, read from Redis where cached and built
+    with one query for the rest.
+    """
+    product_ids = list(dict.fromkeys(product_ids))
+    if not product_ids:
+        return {}
+    try:
+        cached = redis_client.mget([MATRIX_KEY.format(pk) for pk in product_ids])
+    except redis.RedisError:
+        logger.warning("Stock matrix cache unavailable", exc_info=True)
+        cached = [None] * len(product_ids)
+
+    matrices = {pk: StockMatrix(pk, json.loads(raw)) for pk, raw in zip(product_ids, cached) if raw is not None}
+    missing = [pk for pk in product_ids if pk not in matrices]
+    if missing:
+        # Cached matrices outlive the request and gate reservations: never build one from a lagging replica.
+        with use_primary():
+            built = build_variants(missing)
+        try:
+            with redis_client.pipeline() as pipe:
+                for pk in missing:
+                    pipe.setex(MATRIX_KEY.format(pk), settings.CATALOG_CACHE_TIMEOUT, json.dumps(built[pk]))
+                pipe.execute()
+        except redis.RedisError:
+            logger.warning("Could not store stock matrices", exc_info=True)
+        matrices.update({pk: StockMatrix(pk, built[pk]) for pk in missing})
+    return matrices
+
+
+def get_matrix(product_id):
+    return get_matrices([product_id])[product_id]
+
+
+# === Invalidation ===
+def _forget(product_ids):
+    try:
+        redis_client.delete(*[MATRIX_KEY.format(pk) for pk in product_ids])
+    except redis.RedisError:
+        logger.warning("Could not drop stock matrices", exc_info=True)
+
+
+def invalidate(product_ids):
+    """
+    Drops the cached matrices of `product_ids` now and again once the current
+    transaction commits, so a matrix rebuilt from the old rows in between
+    does not outlive the write.
+    """
+    product_ids = set(product_ids)
+    if product_ids:
+        _forget(product_ids)
+        transaction.on_commit(lambda: _forget(product_ids))
+
+
+def stock_levels_changed(product_ids, crossed_zero=()):
+    """
+    Hook for bulk stock writes that bypass model signals (reservations).
+
+    Every touched product's matrix is dropped; products that sold out or came
+    back in stock also refresh their snapshot and the stock-dependent caches.
+    Plain decrements deliberately leave the catalog response cache alone.
+    """
+    invalidate(product_ids)
+    crossed_zero = set(crossed_zero)
+    if crossed_zero:
+        def refresh():
+            bump_version(ProductStock._meta.label_lower)
+            refresh_snapshots(crossed_zero)
+        transaction.on_commit(refresh)
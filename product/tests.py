@@ -1,10 +1,36 @@
-from django.test import TestCase
-from .models import Category, Product, Discount, DiscountCode, Image, ProductFeature
+import json
+from decimal import Decimal
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from src.instrumentation import QueryBudgetExceeded, fingerprint
+from src.settings import redis_client
+from rest_framework.renderers import JSONRenderer
+from .models import Category, Product, Discount, DiscountCode, Image, ProductFeature, Brand, Feature, FeatureValue, \
+    ProductColor, ProductStock, CategoryClosure, ProductSnapshot
+from .api.cache import cache_stats
+from .catalog_io import export_catalog, import_catalog, read_rows
+from . import facets as facet_index
+from .images import LOCK_KEY
+from .search import START_SEL, STOP_SEL, mark_headline
+from .slugs import unique_slugs
+from .snapshots import refresh_snapshots
+from .api.serializers import ImageSerializer, ProductSerializer
+from .pricing import final_prices
+from .stock_matrix import MATRIX_KEY, get_matrices, get_matrix
+from src.jobs import QUEUE_KEY, Worker
 from django.utils.timezone import now, timedelta
 from io import BytesIO
 from PIL import Image as PILImage
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.core.exceptions import ValidationError
+from django.db import IntegrityError
+from unittest import mock
+import redis
+import tempfile
 # Create your tests here.
 
 
@@ -233,3 +259,958 @@ class ProductFeatureTestCase(TestCase):
         """Test the string representation of ProductFeature."""
         feature = ProductFeature.objects.create(product=self.product, name="Brand", value="Apple")
         self.assertEqual(str(feature), "iPhone 14 - Brand: Apple")
+
+
+class ProductQueryPlanTest(TestCase):
+    """Query-count regression tests for the catalog read endpoints."""
+
+    def setUp(self):
+        """Set up a category with fully populated products."""
+        self.category = Category.objects.create(name="Electronics", slug="electronics")
+        self.brand = Brand.objects.create(name="Acme", slug="acme")
+        feature = Feature.objects.create(name="Storage")
+        self.feature_values = [
+            FeatureValue.objects.create(feature=feature, value=f"{size}GB") for size in (64, 128)
+        ]
+
+    def create_products(self, count):
+        for i in range(count):
+            product = Product.objects.create(
+                category=self.category, brand=self.brand, name=f"Phone {i}", price=100, weight=1
+            )
+            Discount.objects.create(
+                product=product, value=10, discount_type="percent", end_date=now() + timedelta(days=7)
+            )
+            for feature_value in self.feature_values:
+                ProductFeature.objects.create(product=product, feature_value=feature_value)
+            ProductColor.objects.create(product=product, name="Black", hex_code="#000000")
+            Image.objects.create(product=product, title=f"Phone {i}")
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, HTTP_ACCEPT="application/json")
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+    def assert_constant_queries(self, url):
+        self.create_products(2)
+        small = self.count_queries(url)
+        self.create_products(8)
+        self.assertEqual(self.count_queries(url), small)
+        return small
+
+    def test_product_list_query_count(self):
+        """Test the product list runs a fixed number of queries whatever the page size."""
+        self.assertEqual(self.assert_constant_queries("/api/products/"), 4)
+
+    def test_featured_query_count(self):
+        """Test the featured products endpoint runs a fixed number of queries."""
+        self.assertEqual(self.assert_constant_queries("/api/products/featured/"), 4)
+
+    def test_category_products_query_count(self):
+        """Test the category products endpoint runs a fixed number of queries."""
+        url = f"/api/categories/{self.category.id}/products/"
+        self.assertEqual(self.assert_constant_queries(url), 7)
+
+    def test_category_products_are_paginated(self):
+        """Test the category products endpoint serves one page at a time."""
+        self.create_products(12)
+        response = self.client.get(f"/api/categories/{self.category.id}/products/", HTTP_ACCEPT="application/json")
+        self.assertEqual(response.data["count"], 12)
+        self.assertEqual(len(response.data["results"]), 10)
+        self.assertEqual(response.data["results"][0]["name"], "Phone 11")
+
+    def test_product_detail_query_count(self):
+        """Test the product detail endpoint runs a fixed number of queries."""
+        self.create_products(1)
+        product = Product.objects.get()
+        with self.assertNumQueries(4):
+            response = self.client.get(f"/api/products/{product.slug}/", HTTP_ACCEPT="application/json")
+        self.assertEqual(response.data["features"][0]["feature_value"]["feature"]["name"], "Storage")
+
+
+class FinalPriceEngineTest(TestCase):
+    """Tests for the batched final-price engine."""
+
+    def setUp(self):
+        """Set up products with current, expired and fixed-amount discounts."""
+        category = Category.objects.create(name="Electronics", slug="electronics")
+        brand = Brand.objects.create(name="Acme", slug="acme")
+        self.percent = Product.objects.create(category=category, brand=brand, name="Laptop", price=Decimal("999.99"))
+        self.amount = Product.objects.create(category=category, brand=brand, name="Phone", price=Decimal("500.00"))
+        self.expired = Product.objects.create(category=category, brand=brand, name="Tablet", price=Decimal("300.00"))
+        self.plain = Product.objects.create(category=category, brand=brand, name="Mouse", price=Decimal("19.90"))
+        Discount.objects.create(
+            product=self.percent, value=15, discount_type="percent", end_date=now() + timedelta(days=7)
+        )
+        Discount.objects.create(
+            product=self.amount, value=50, discount_type="amount", end_date=now() + timedelta(days=7)
+        )
+        Discount.objects.create(
+            product=self.expired, value=10, discount_type="percent",
+            start_date=now() - timedelta(days=7), end_date=now() - timedelta(days=1)
+        )
+
+    def test_final_prices(self):
+        """Test discounts are applied exactly and rounded to the cent"""
+        prices = final_prices([self.percent, self.amount, self.expired, self.plain])
+        self.assertEqual(prices, {
+            self.percent.id: Decimal("849.99"),
+            self.amount.id: Decimal("450.00"),
+            self.expired.id: Decimal("300.00"),
+            self.plain.id: Decimal("19.90"),
+        })
+
+    def test_single_query(self):
+        """Test a list of products is priced with one discount query"""
+        products = list(Product.objects.all())
+        with self.assertNumQueries(1):
+            final_prices(products)
+
+    def test_queryset_input(self):
+        """Test a queryset is priced the same way as a list"""
+        self.assertEqual(final_prices(Product.objects.all()), final_prices(list(Product.objects.all())))
+
+    def test_select_related_discount_is_reused(self):
+        """Test discounts loaded with select_related do not trigger a query"""
+        products = list(Product.objects.select_related("discount"))
+        with self.assertNumQueries(0):
+            prices = final_prices(products)
+        self.assertEqual(prices[self.amount.id], Decimal("450.00"))
+
+
+class CategoryClosureTest(TestCase):
+    """Tests for the category closure table and subtree queries."""
+
+    def setUp(self):
+        """Set up a three-level category tree"""
+        self.electronics = Category.objects.create(name="Electronics", slug="electronics")
+        self.computers = Category.objects.create(name="Computers", slug="computers", parent=self.electronics)
+        self.laptops = Category.objects.create(name="Laptops", slug="laptops", parent=self.computers)
+        self.phones = Category.objects.create(name="Phones", slug="phones", parent=self.electronics)
+
+    def test_descendants(self):
+        """Test descendants() returns every level below a category"""
+        self.assertCountEqual(self.electronics.descendants(), [self.computers, self.laptops, self.phones])
+        self.assertCountEqual(self.computers.descendants(include_self=True), [self.computers, self.laptops])
+
+    def test_ancestors(self):
+        """Test ancestors() returns the path from the root"""
+        self.assertEqual(list(self.laptops.ancestors()), [self.electronics, self.computers])
+
+    def test_soft_deleted_descendants_are_hidden(self):
+        """Test soft-deleted categories are excluded from descendants()"""
+        self.phones.soft_delete()
+        self.assertNotIn(self.phones, self.electronics.descendants())
+        self.phones.restore()
+        self.assertIn(self.phones, self.electronics.descendants())
+
+    def test_move_subtree(self):
+        """Test moving a category re-links its whole subtree"""
+        self.computers.parent = self.phones
+        self.computers.save()
+        self.assertEqual(list(self.laptops.ancestors()), [self.electronics, self.phones, self.computers])
+
+    def test_move_under_own_descendant(self):
+        """Test a category cannot be moved below itself"""
+        self.electronics.parent = self.laptops
+        with self.assertRaises(ValueError):
+            self.electronics.save()
+
+    def test_rebuild(self):
+        """Test rebuild() recreates the same links"""
+        links = set(CategoryClosure.objects.values_list("ancestor", "descendant", "depth"))
+        CategoryClosure.objects.rebuild()
+        self.assertEqual(set(CategoryClosure.objects.values_list("ancestor", "descendant", "depth")), links)
+
+    def test_include_descendants_filter(self):
+        """Test the product list can be filtered by a whole subtree"""
+        brand = Brand.objects.create(name="Acme", slug="acme")
+        laptop = Product.objects.create(category=self.laptops, brand=brand, name="Laptop")
+        phone = Product.objects.create(category=self.phones, brand=brand, name="Phone")
+
+        response = self.client.get("/api/products/?category=computers&include_descendants=1")
+        self.assertEqual([p["id"] for p in response.data["results"]], [laptop.id])
+        response = self.client.get("/api/products/?category=electronics&include_descendants=1")
+        self.assertCountEqual([p["id"] for p in response.data["results"]], [laptop.id, phone.id])
+        response = self.client.get("/api/products/?category=electronics")
+        self.assertEqual(response.data["results"], [])
+
+    def test_tree_endpoint(self):
+        """Test the full tree is served from a single query"""
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/categories/tree/", HTTP_ACCEPT="application/json")
+        self.assertEqual(len(response.data), 1)
+        electronics = response.data[0]
+        self.assertEqual([c["slug"] for c in electronics["subcategories"]], ["computers", "phones"])
+        self.assertEqual(electronics["subcategories"][0]["subcategories"][0]["slug"], "laptops")
+
+
+class CatalogCacheTest(TestCase):
+    """Tests for the versioned catalog response cache."""
+
+    def setUp(self):
+        """Set up a product to serve"""
+        self.category = Category.objects.create(name="Electronics", slug="electronics")
+        self.brand = Brand.objects.create(name="Acme", slug="acme")
+        self.product = Product.objects.create(category=self.category, brand=self.brand, name="Laptop", price=100)
+
+    def get(self, url, **headers):
+        return self.client.get(url, HTTP_ACCEPT="application/json", **headers)
+
+    def test_second_request_is_a_hit(self):
+        """Test a repeated request is served from the cache without queries"""
+        first = self.get("/api/products/")
+        self.assertEqual(first["X-Cache"], "MISS")
+        with self.assertNumQueries(0):
+            second = self.get("/api/products/")
+        self.assertEqual(second["X-Cache"], "HIT")
+        self.assertEqual(second.content, first.content)
+
+    def test_save_invalidates(self):
+        """Test saving a product makes cached responses stale"""
+        self.get("/api/products/")
+        self.product.name = "Gaming Laptop"
+        self.product.save()
+        response = self.get("/api/products/")
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(response.json()["results"][0]["name"], "Gaming Laptop")
+
+    def test_response_cached_before_commit_is_dropped(self):
+        """Test a response cached between a write and its commit is not served once the write commits"""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.name = "Gaming Laptop"
+            self.product.save()
+            self.get("/api/products/")
+            self.assertEqual(self.get("/api/products/")["X-Cache"], "HIT")
+        self.assertEqual(self.get("/api/products/")["X-Cache"], "MISS")
+
+    def test_soft_delete_invalidates(self):
+        """Test soft-deleting a category makes cached responses stale"""
+        self.get("/api/categories/")
+        self.category.soft_delete()
+        self.assertEqual(self.get("/api/categories/").json()["results"], [])
+
+    def test_related_model_invalidates(self):
+        """Test writes to nested models invalidate product responses"""
+        self.get(f"/api/products/{self.product.slug}/")
+        ProductColor.objects.create(product=self.product, name="Black")
+        response = self.get(f"/api/products/{self.product.slug}/")
+        self.assertEqual(response.json()["colors"], [{"name": "Black", "hex_code": None}])
+
+    def test_query_string_is_part_of_the_key(self):
+        """Test different query strings are cached separately"""
+        self.get("/api/products/")
+        self.assertEqual(self.get("/api/products/?category=none").json()["results"], [])
+
+    def test_etag_not_modified(self):
+        """Test If-None-Match returns 304 on both misses and hits"""
+        etag = self.get("/api/brands/")["ETag"]
+        self.assertEqual(self.get("/api/brands/", HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        Brand.objects.create(name="Other", slug="other")
+        self.assertEqual(self.get("/api/brands/", HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_stats(self):
+        """Test hit and miss counters are recorded"""
+        before = cache_stats()
+        self.get("/api/brands/?stats=1")
+        self.get("/api/brands/?stats=1")
+        after = cache_stats()
+        self.assertEqual(after["hits"] - before["hits"], 1)
+        self.assertEqual(after["misses"] - before["misses"], 1)
+
+
+    def test_counter_errors_do_not_fail_requests(self):
+        """Test a Redis error while counting hits and misses still serves the response"""
+        with mock.patch.object(redis_client, "incr", side_effect=redis.RedisError):
+            self.assertEqual(self.get("/api/brands/").status_code, 200)
+            self.assertEqual(self.get("/api/brands/")["X-Cache"], "HIT")
+
+class KeysetPaginationTest(TestCase):
+    """Tests for cursor pagination of the product list."""
+
+    def setUp(self):
+        """Set up 25 products, several sharing the same creation time"""
+        self.category = Category.objects.create(name="Electronics", slug="electronics")
+        other = Category.objects.create(name="Books", slug="books")
+        brand = Brand.objects.create(name="Acme", slug="acme")
+        for i in range(25):
+            Product.objects.create(category=self.category if i % 5 else other, brand=brand, name=f"Item {i}")
+        Product.objects.filter(id__in=Product.objects.order_by("id").values("id")[5:15]).update(created=now())
+
+    def walk(self, url):
+        ids = []
+        while url:
+            response = self.client.get(url, HTTP_ACCEPT="application/json")
+            self.assertEqual(response.status_code, 200)
+            ids += [p["id"] for p in response.data["results"]]
+            url = response.data["next"]
+        return ids
+
+    def test_walks_every_product_once(self):
+        """Test following next links returns every product exactly once, in order"""
+        expected = list(Product.objects.order_by("-created", "-id").values_list("id", flat=True))
+        self.assertEqual(self.walk("/api/products/"), expected)
+
+    def test_category_filter(self):
+        """Test cursors keep the category filter"""
+        expected = list(
+            Product.objects.filter(category=self.category).order_by("-created", "-id").values_list("id", flat=True)
+        )
+        self.assertEqual(self.walk("/api/products/?category=electronics"), expected)
+
+    def test_no_count_query(self):
+        """Test the page is served without a COUNT query"""
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get("/api/products/", HTTP_ACCEPT="application/json")
+        self.assertIsNone(response.data["count"])
+        self.assertFalse(any("COUNT(" in query["sql"] for query in context.captured_queries))
+
+    def test_invalid_cursor(self):
+        """Test a tampered cursor is rejected"""
+        response = self.client.get("/api/products/?cursor=not-a-cursor", HTTP_ACCEPT="application/json")
+        self.assertEqual(response.status_code, 404)
+
+
+class ProductSearchTest(TestCase):
+
+    def setUp(self):
+        """ Set up a small catalog to search """
+        computers = Category.objects.create(name="Computers", slug="computers")
+        bags = Category.objects.create(name="Bags", slug="bags")
+        dell = Brand.objects.create(name="Dell", slug="dell")
+        acme = Brand.objects.create(name="Acme", slug="acme")
+        self.laptop = Product.objects.create(
+            category=computers, brand=dell, name="Latitude Laptop", price=Decimal("900.00"),
+            description="A light laptop made for travel and long battery life.",
+        )
+        self.bag = Product.objects.create(
+            category=bags, brand=acme, name="Travel Bag", price=Decimal("50.00"),
+            description="Fits a laptop up to 15 inches.",
+        )
+
+    def search(self, q):
+        return self.client.get("/api/products/search/", {"q": q})
+
+    def test_prefix_match_on_name_brand_and_category(self):
+        """ Test word prefixes match the name, brand name and category name """
+        self.assertEqual([p["id"] for p in self.search("lati").json()["results"]], [self.laptop.id])
+        self.assertEqual([p["id"] for p in self.search("dell").json()["results"]], [self.laptop.id])
+        self.assertEqual([p["id"] for p in self.search("bag").json()["results"]], [self.bag.id])
+
+    def test_all_terms_must_match(self):
+        """ Test every query term has to match """
+        self.assertEqual([p["id"] for p in self.search("laptop batt").json()["results"]], [self.laptop.id])
+        self.assertEqual(self.search("laptop nothing").json()["results"], [])
+
+    def test_name_matches_rank_first(self):
+        """ Test a name match ranks above a description match and snippets are highlighted """
+        results = self.search("travel").json()["results"]
+        self.assertEqual([p["id"] for p in results], [self.bag.id, self.laptop.id])
+        self.assertIn("<mark>travel</mark>", results[1]["headline"])
+
+    def test_headline_escapes_description(self):
+        """ Test markup in a description is escaped in the headline, on both search backends """
+        self.laptop.description = "Travel <script>alert(1)</script> ready."
+        self.laptop.save()
+        result = next(p for p in self.search("travel").json()["results"] if p["id"] == self.laptop.id)
+        self.assertNotIn("<script>", result["headline"])
+        self.assertIn("&lt;script&gt;", result["headline"])
+
+        ts_headline = f"{START_SEL}Travel{STOP_SEL} <script>alert(1)</script> ready."
+        self.assertEqual(mark_headline(ts_headline),
+                         "<mark>Travel</mark> &lt;script&gt;alert(1)&lt;/script&gt; ready.")
+
+    def test_search_follows_product_edits(self):
+        """ Test renaming a product or its brand updates what it is found by """
+        self.laptop.name = "Ultrabook"
+        self.laptop.save()
+        brand = self.bag.brand
+        brand.name = "Samsonite"
+        brand.save()
+        self.assertEqual([p["id"] for p in self.search("ultra").json()["results"]], [self.laptop.id])
+        self.assertEqual([p["id"] for p in self.search("samso").json()["results"]], [self.bag.id])
+
+    def test_query_is_required(self):
+        """ Test an empty query is rejected """
+        self.assertEqual(self.search(" ").status_code, 400)
+
+
+class FacetTest(TestCase):
+
+    def setUp(self):
+        """ Set up laptops across two brands with RAM and color options """
+        facet_index.reset()
+        self.addCleanup(facet_index.reset)
+        category = Category.objects.create(name="Laptops", slug="laptops")
+        self.dell = Brand.objects.create(name="Dell", slug="dell")
+        self.lenovo = Brand.objects.create(name="Lenovo", slug="lenovo")
+        ram = Feature.objects.create(name="RAM")
+        ram_8 = FeatureValue.objects.create(feature=ram, value="8GB")
+        ram_16 = FeatureValue.objects.create(feature=ram, value="16GB")
+
+        self.products = {}
+        for name, brand, price, ram_value, color in [
+            ("Dell 13", self.dell, "900.00", ram_8, "Black"),
+            ("Dell 15", self.dell, "1200.00", ram_16, "Silver"),
+            ("Lenovo 14", self.lenovo, "1000.00", ram_16, "Black"),
+        ]:
+            product = Product.objects.create(category=category, brand=brand, name=name, price=Decimal(price))
+            ProductFeature.objects.create(product=product, feature_value=ram_value)
+            product_color = ProductColor.objects.create(product=product, name=color)
+            ProductStock.objects.create(product=product, color=product_color, stock=0 if name == "Dell 15" else 3)
+            self.products[name] = product
+
+    def list_ids(self, params):
+        response = self.client.get("/api/products/", params)
+        return {product["id"] for product in response.json()["results"]}
+
+    def test_filters_combine(self):
+        """ Test dimensions narrow the list and values of one dimension widen it """
+        self.assertEqual(self.list_ids({"feature": "RAM:16GB"}),
+                         {self.products["Dell 15"].id, self.products["Lenovo 14"].id})
+        self.assertEqual(self.list_ids({"feature": "RAM:16GB", "brand": "dell"}), {self.products["Dell 15"].id})
+        self.assertEqual(self.list_ids({"feature": ["RAM:16GB", "RAM:8GB"], "color": "Black"}),
+                         {self.products["Dell 13"].id, self.products["Lenovo 14"].id})
+        self.assertEqual(self.list_ids({"price_max": "1000", "in_stock": "true"}),
+                         {self.products["Dell 13"].id, self.products["Lenovo 14"].id})
+
+    def test_facet_counts_leave_out_their_own_dimension(self):
+        """ Test each facet is counted under every filter except its own """
+        facets = self.client.get("/api/products/facets/", {"brand": "dell", "feature": "RAM:16GB"}).json()
+        self.assertEqual(facets["total"], 1)
+        self.assertEqual({b["value"]: b["count"] for b in facets["brand"]}, {"dell": 1, "lenovo": 1})
+        self.assertEqual({v["value"]: v["count"] for v in facets["features"]["RAM"]}, {"8GB": 1, "16GB": 1})
+        self.assertEqual({c["value"]: c["count"] for c in facets["color"]}, {"Silver": 1})
+        self.assertEqual(facets["in_stock"], 0)
+        self.assertEqual(Decimal(facets["price"]["min"]), Decimal("1200"))
+
+    def test_facet_counts_match_filtered_list(self):
+        """ Test the bitmap index agrees with the SQL filters for price ranges and categories """
+        params = {"price_min": "950", "price_max": "1200", "category": "laptops"}
+        facets = self.client.get("/api/products/facets/", params).json()
+        self.assertEqual(facets["total"], len(self.list_ids(params)))
+        self.assertEqual((Decimal(facets["price"]["min"]), Decimal(facets["price"]["max"])),
+                         (Decimal("900"), Decimal("1200")))
+        self.assertEqual(self.client.get("/api/products/facets/", {"category": "missing"}).json()["total"], 0)
+
+    def test_index_follows_catalog_changes(self):
+        """ Test the index is rebuilt after a catalog write """
+        self.assertEqual(self.client.get("/api/products/facets/").json()["total"], 3)
+        self.products["Dell 13"].is_active = False
+        self.products["Dell 13"].save()
+        self.assertEqual(self.client.get("/api/products/facets/").json()["total"], 2)
+
+    @override_settings(FACET_INDEX_BACKGROUND_REBUILD=True)
+    def test_stale_index_is_served_during_rebuild(self):
+        """ Test a catalog write starts one background rebuild and requests meanwhile get the previous index """
+        with mock.patch("product.facets.threading.Thread") as thread:
+            self.assertEqual(self.client.get("/api/products/facets/").json()["total"], 3)
+            thread.assert_not_called()
+            self.products["Dell 13"].is_active = False
+            self.products["Dell 13"].save()
+            self.assertEqual(self.client.get("/api/products/facets/").json()["total"], 3)
+            self.assertEqual(self.client.get("/api/products/facets/").json()["total"], 3)
+        thread.assert_called_once()
+        thread.return_value.start.assert_called_once()
+
+    def test_invalid_filter_is_rejected(self):
+        """ Test malformed feature filters return 400 """
+        self.assertEqual(self.client.get("/api/products/facets/", {"feature": "RAM"}).status_code, 400)
+
+
+@override_settings(SERVE_PRODUCT_SNAPSHOTS=True)
+class ProductSnapshotTest(TestCase):
+
+    def setUp(self):
+        """ Set up a product with a color, a feature and stock """
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category = Category.objects.create(name="Laptops", slug="laptops")
+            self.brand = Brand.objects.create(name="Dell", slug="dell")
+            self.product = Product.objects.create(
+                category=self.category, brand=self.brand, name="Latitude", price=Decimal("900.00")
+            )
+            color = ProductColor.objects.create(product=self.product, name="Black")
+            ram = FeatureValue.objects.create(feature=Feature.objects.create(name="RAM"), value="16GB")
+            ProductFeature.objects.create(product=self.product, feature_value=ram)
+            ProductStock.objects.create(product=self.product, color=color, stock=2)
+
+    def test_snapshot_matches_serializer(self):
+        """ Test the stored payload is the serializer output plus the stock flag """
+        expected = json.loads(JSONRenderer().render(ProductSerializer(self.product).data))
+        snapshot = ProductSnapshot.objects.get(product=self.product)
+        self.assertEqual(snapshot.payload, {**expected, "in_stock": True})
+        self.assertEqual(snapshot.payload["brand"], "Dell")
+        self.assertEqual(snapshot.payload["features"][0]["feature_value"]["value"], "16GB")
+
+    def test_list_and_detail_served_from_snapshots(self):
+        """ Test the list and detail endpoints read one snapshot query """
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/products/", {"snapshot": "list"})
+        self.assertEqual(response.json()["results"], [ProductSnapshot.objects.get().payload])
+        with self.assertNumQueries(1):
+            response = self.client.get(f"/api/products/{self.product.slug}/", {"snapshot": "detail"})
+        self.assertEqual(response.json()["name"], "Latitude")
+
+    def test_snapshot_media_urls_are_absolute(self):
+        """ Test snapshots store image paths and serve the absolute URLs the serializer gives """
+        Product.objects.filter(pk=self.product.pk).update(image="products/latitude.jpg")
+        refresh_snapshots([self.product.pk])
+        self.assertFalse(ProductSnapshot.objects.get().payload["image"].startswith("http"))
+        served = self.client.get(f"/api/products/{self.product.slug}/", {"snapshot": "media"}).json()
+        with override_settings(SERVE_PRODUCT_SNAPSHOTS=False):
+            expected = self.client.get(f"/api/products/{self.product.slug}/", {"snapshot": "live"}).json()
+        self.assertTrue(served["image"].startswith("http://testserver/"))
+        self.assertEqual(served["image"], expected["image"])
+
+    def test_source_changes_rebuild_snapshot(self):
+        """ Test writes to brand, discount and product rebuild or drop the snapshot """
+        with self.captureOnCommitCallbacks(execute=True):
+            self.brand.name = "Dell Technologies"
+            self.brand.save()
+            Discount.objects.create(product=self.product, value=Decimal("10"), discount_type="percent",
+                                    end_date=now() + timedelta(days=1))
+        payload = ProductSnapshot.objects.get().payload
+        self.assertEqual(payload["brand"], "Dell Technologies")
+        self.assertEqual(Decimal(str(payload["final_price"])), Decimal("810.00"))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.is_active = False
+            self.product.save()
+        self.assertFalse(ProductSnapshot.objects.exists())
+
+    def test_expired_price_is_rebuilt_on_read(self):
+        """ Test a snapshot whose discount ended is rebuilt before it is served """
+        with self.captureOnCommitCallbacks(execute=True):
+            Discount.objects.create(product=self.product, value=Decimal("10"), discount_type="percent",
+                                    end_date=now() + timedelta(days=1))
+        Discount.objects.update(end_date=now() - timedelta(minutes=1))
+        ProductSnapshot.objects.update(valid_until=now() - timedelta(minutes=1))
+        response = self.client.get("/api/products/", {"snapshot": "expired"})
+        self.assertEqual(Decimal(str(response.json()["results"][0]["final_price"])), Decimal("900.00"))
+
+    def test_rebuild_command(self):
+        """ Test the management command backfills missing snapshots """
+        ProductSnapshot.objects.all().delete()
+        call_command("rebuild_product_snapshots", "--workers", "1", stdout=StringIO())
+        self.assertEqual(ProductSnapshot.objects.get().slug, self.product.slug)
+
+
+class StockMatrixTest(TestCase):
+
+    def setUp(self):
+        """ Set up two products with color and storage variants """
+        category = Category.objects.create(name="Phones", slug="phones")
+        brand = Brand.objects.create(name="Acme", slug="acme")
+        storage = Feature.objects.create(name="Storage")
+        self.gb128 = FeatureValue.objects.create(feature=storage, value="128GB")
+        self.gb256 = FeatureValue.objects.create(feature=storage, value="256GB")
+        self.products = []
+        for i in range(2):
+            product = Product.objects.create(category=category, brand=brand, name=f"Phone {i}", price=Decimal("100"))
+            black = ProductColor.objects.create(product=product, name="Black", hex_code="#000000")
+            white = ProductColor.objects.create(product=product, name="White", hex_code="#FFFFFF")
+            ProductStock.objects.create(product=product, color=black, stock=3).feature_values.add(self.gb128)
+            ProductStock.objects.create(product=product, color=white, stock=0).feature_values.add(self.gb256)
+            self.products.append(product)
+        self.black = black
+
+    def test_built_in_one_query_then_cached(self):
+        """ Test matrices of many products are built with one query and then read from Redis """
+        ids = [product.id for product in self.products]
+        with self.assertNumQueries(1):
+            matrices = get_matrices(ids)
+        self.assertTrue(all(redis_client.get(MATRIX_KEY.format(pk)) for pk in ids))
+        with self.assertNumQueries(0):
+            cached = get_matrices(ids)
+        self.assertEqual(cached[ids[0]].variants, matrices[ids[0]].variants)
+
+    def test_find(self):
+        """ Test variants are found by exact selection or by a subset of their feature values """
+        matrix = get_matrix(self.products[1].id)
+        variant = matrix.find(self.black.id, [self.gb128.id])
+        self.assertEqual(variant["stock"], 3)
+        self.assertEqual(variant["feature_values"][0]["value"], "128GB")
+        self.assertIs(matrix.find(self.black.id), variant)
+        self.assertIsNone(matrix.find(self.black.id, [self.gb256.id]))
+
+    def test_stock_save_drops_matrix(self):
+        """ Test saving a stock row or renaming a feature value invalidates the matrix """
+        product = self.products[1]
+        get_matrix(product.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            ProductStock.objects.filter(color=self.black).update(stock=7)
+            ProductStock.objects.get(color=self.black).save()
+        self.assertIsNone(redis_client.get(MATRIX_KEY.format(product.id)))
+        self.assertEqual(get_matrix(product.id).find(self.black.id)["stock"], 7)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.gb128.value = "128 GB"
+            self.gb128.save()
+        self.assertEqual(get_matrix(product.id).find(self.black.id)["feature_values"][0]["value"], "128 GB")
+
+    def test_stocks_endpoint(self):
+        """ Test the variant picker endpoint returns the matrix and bypasses the response cache """
+        product = self.products[0]
+        response = self.client.get(f"/api/products/{product.slug}/stocks/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([variant["stock"] for variant in response.json()], [3, 0])
+        self.assertEqual(response.json()[1]["color"], {"id": response.json()[1]["color"]["id"],
+                                                       "name": "White", "hex_code": "#FFFFFF"})
+        with self.assertNumQueries(1):
+            self.client.get(f"/api/products/{product.slug}/stocks/")
+        self.assertEqual(self.client.get("/api/products/missing/stocks/").status_code, 404)
+
+
+class AsyncCatalogTest(TestCase):
+
+    def setUp(self):
+        """ Set up a category with two products, one with images, colors, features and stock """
+        self.category = Category.objects.create(name="Laptops", slug="laptops")
+        self.brand = Brand.objects.create(name="Dell", slug="dell")
+        self.product = Product.objects.create(category=self.category, brand=self.brand, name="XPS", price=1000)
+        Product.objects.create(category=self.category, brand=self.brand, name="Latitude", price=800)
+        color = ProductColor.objects.create(product=self.product, name="Silver")
+        ram = FeatureValue.objects.create(feature=Feature.objects.create(name="RAM"), value="16GB")
+        ProductFeature.objects.create(product=self.product, feature_value=ram)
+        ProductStock.objects.create(product=self.product, color=color, stock=4).feature_values.add(ram)
+
+    async def test_product_detail_matches_sync_api(self):
+        """ Test the async detail returns the sync payload plus the stock matrix """
+        response = await self.async_client.get(f"/api/async/products/{self.product.slug}/")
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        stocks = data.pop("stocks")
+        self.assertEqual(stocks[0]["stock"], 4)
+        self.assertEqual(stocks[0]["feature_values"][0]["value"], "16GB")
+        expected = await self.async_client.get(f"/api/products/{self.product.slug}/", HTTP_ACCEPT="application/json")
+        self.assertEqual(data, expected.json())
+
+        cached = await self.async_client.get(f"/api/async/products/{self.product.slug}/")
+        self.assertEqual(cached["X-Cache"], "HIT")
+        missing = await self.async_client.get("/api/async/products/missing/")
+        self.assertEqual(missing.status_code, 404)
+
+    async def test_category_detail_with_products(self):
+        """ Test the category page returns the category and its newest products in one call """
+        response = await self.async_client.get("/api/async/categories/laptops/")
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data["slug"], "laptops")
+        self.assertEqual([product["name"] for product in data["products"]], ["Latitude", "XPS"])
+        self.assertEqual((await self.async_client.get("/api/async/categories/nope/")).status_code, 404)
+        self.assertEqual((await self.async_client.post("/api/async/categories/laptops/")).status_code, 405)
+
+    def test_sync_client_and_query_count(self):
+        """ Test the async views also serve through the WSGI handler with a fixed number of queries """
+        with self.assertNumQueries(6):
+            response = self.client.get("/api/async/categories/laptops/", {"page": 1, "fresh": "queries"})
+        self.assertEqual(len(response.json()["products"]), 2)
+        self.assertEqual(self.client.get("/api/async/brands/").json()[0]["slug"], "dell")
+
+
+class StorefrontPageTest(TestCase):
+
+    def setUp(self):
+        """ Set up a category tree with a stocked product """
+        self.parent = Category.objects.create(name="Beauty", slug="beauty")
+        self.category = Category.objects.create(name="Lipsticks", slug="lipsticks", parent=self.parent)
+        self.brand = Brand.objects.create(name="Veloura", slug="veloura")
+        self.product = Product.objects.create(category=self.category, brand=self.brand, name="Rouge", price=20)
+        color = ProductColor.objects.create(product=self.product, name="Red", hex_code="#FF0000")
+        ProductStock.objects.create(product=self.product, color=color, stock=3)
+
+    def get(self, url, **params):
+        return self.client.get(url, params, HTTP_ACCEPT="application/json")
+
+    def test_home_page(self):
+        """ Test the home page carries the category tree and the featured products """
+        data = self.get("/api/pages/home/").json()
+        self.assertEqual(data["categories"][0]["subcategories"][0]["slug"], "lipsticks")
+        self.assertEqual([product["name"] for product in data["featured"]], ["Rouge"])
+
+    def test_category_page(self):
+        """ Test the category page replaces the two chained fetches """
+        data = self.get("/api/pages/category/lipsticks/").json()
+        self.assertEqual(data["category"]["name"], "Lipsticks")
+        self.assertEqual(data["products"]["count"], 1)
+        self.assertEqual(data["products"]["results"][0]["slug"], self.product.slug)
+        self.assertEqual(self.get("/api/pages/category/missing/").status_code, 404)
+        self.assertEqual(self.get("/api/pages/category/lipsticks/", page=3).status_code, 404)
+
+    def test_product_page(self):
+        """ Test the product page carries the product and its variants """
+        data = self.get(f"/api/pages/product/{self.product.slug}/").json()
+        self.assertEqual(data["product"]["brand"], "Veloura")
+        self.assertEqual(data["stocks"][0]["color"]["name"], "Red")
+        self.assertEqual(self.get("/api/pages/product/missing/").status_code, 404)
+
+    def test_sections_are_cached_separately(self):
+        """ Test a cached page runs no queries and a product write keeps the category section """
+        self.get("/api/pages/category/lipsticks/", page=1)
+        with self.assertNumQueries(0):
+            self.get("/api/pages/category/lipsticks/", page=1)
+
+        self.product.name = "Rouge Intense"
+        self.product.save()
+        with CaptureQueriesContext(connection) as context:
+            data = self.get("/api/pages/category/lipsticks/", page=1).json()
+        self.assertEqual(data["products"]["results"][0]["name"], "Rouge Intense")
+        self.assertFalse(any('FROM "category" WHERE' in query["sql"] and "LIMIT 1" in query["sql"]
+                             for query in context.captured_queries))
+
+
+class InstrumentationTest(TestCase):
+
+    def setUp(self):
+        """ Set up a product to serve """
+        category = Category.objects.create(name="Laptops", slug="laptops")
+        brand = Brand.objects.create(name="Dell", slug="dell")
+        self.product = Product.objects.create(category=category, brand=brand, name="XPS", price=1000)
+
+    def test_server_timing_header(self):
+        """ Test every response reports its SQL, serializer and total time """
+        response = self.client.get(f"/api/products/{self.product.slug}/", {"t": "timing"},
+                                   HTTP_ACCEPT="application/json")
+        timing = response["Server-Timing"]
+        self.assertRegex(timing, r'db;dur=[\d.]+;desc="\d+ queries, 0 duplicated"')
+        self.assertIn("ser;dur=", timing)
+        self.assertIn("total;dur=", timing)
+
+    def test_metrics_endpoint(self):
+        """ Test the scrape endpoint aggregates recorded requests per view """
+        self.client.get("/api/products/", {"t": "metrics"}, HTTP_ACCEPT="application/json")
+        body = self.client.get("/metrics/").content.decode()
+        self.assertRegex(body, r'shop_requests\{view="product-list"\} \d+')
+        self.assertIn('shop_request_seconds{view="product-list",phase="sql",quantile="0.99"}', body)
+        self.assertIn('shop_query_budget{view="product-list"}', body)
+        self.assertEqual(self.client.get("/metrics/", REMOTE_ADDR="10.0.0.1").status_code, 403)
+
+    def test_budget_exceeded(self):
+        """ Test strict mode fails a request that runs more queries than its view's budget """
+        with override_settings(QUERY_BUDGETS={"product-detail": 1}, QUERY_BUDGETS_STRICT=True):
+            with self.assertRaisesMessage(QueryBudgetExceeded, "product-detail ran"):
+                self.client.get(f"/api/products/{self.product.slug}/", {"t": "budget"},
+                                HTTP_ACCEPT="application/json")
+
+    @override_settings(DEBUG=True)
+    async def test_asgi_requests(self):
+        """ Test async views are measured, queries included, without adapting the middleware to sync """
+        with mock.patch('django.core.handlers.base.logger') as logger:
+            response = await self.async_client.get("/api/async/brands/", {"t": "asgi"})
+        self.assertRegex(response["Server-Timing"], r'db;dur=[\d.]+;desc="[1-9]\d* queries')
+        adapted = [str(call.args[1]) for call in logger.debug.call_args_list if len(call.args) > 1]
+        self.assertFalse([name for name in adapted if 'InstrumentationMiddleware' in name])
+
+    def test_fingerprint(self):
+        """ Test repeats of one statement with other parameters share a fingerprint """
+        self.assertEqual(
+            fingerprint('SELECT * FROM "product" WHERE "id" IN (%s, %s) LIMIT 21'),
+            fingerprint('SELECT * FROM "product" WHERE "id" IN (%s) LIMIT 10'),
+        )
+
+
+class CatalogImportExportTest(TestCase):
+
+    def load(self, kind, data, fmt='csv', batch_size=1000):
+        return import_catalog(kind, read_rows(StringIO(data), fmt), batch_size=batch_size)
+
+    def load_catalog(self):
+        self.load('brands', "slug,name,description\nacme,Acme,\n")
+        self.load('categories', "slug,name,parent\nshirts,Shirts,clothing\nclothing,Clothing,\n")
+        self.load('features', '{"feature": "Size", "value": "M"}\n{"feature": "Size", "value": "L"}\n', 'jsonl')
+        self.load('products', "slug,name,category,brand,price\n,T-Shirt,shirts,acme,10\n,T-Shirt,shirts,acme,12\n")
+        self.load('colors', "product,name,hex_code\nt-shirt,Black,#000000\nt-shirt-1,Black,#000000\n")
+        self.load('stock', "product,color,features,stock\nt-shirt,Black,Size:M|Size:L,4\n")
+
+    def test_import_builds_catalog(self):
+        """ Test each kind imports, children after parents in one file, with slugs and closure links """
+        self.load_catalog()
+        clothing, shirts = Category.objects.get(slug="clothing"), Category.objects.get(slug="shirts")
+        self.assertEqual(shirts.parent, clothing)
+        self.assertEqual(list(clothing.descendants()), [shirts])
+        self.assertEqual(sorted(Product.objects.values_list("slug", "price")),
+                         [("t-shirt", Decimal("10.00")), ("t-shirt-1", Decimal("12.00"))])
+        stock = ProductStock.objects.get()
+        self.assertEqual((stock.product.slug, stock.color.name, stock.stock), ("t-shirt", "Black", 4))
+        self.assertEqual({value.value for value in stock.feature_values.all()}, {"M", "L"})
+        self.assertTrue(ProductSnapshot.objects.filter(slug="t-shirt").exists())
+
+    def test_import_upserts_and_reports_bad_rows(self):
+        """ Test rows with an existing key update it, and rows with unknown references are skipped """
+        self.load_catalog()
+        report = self.load('products', "slug,name,category,brand,price\nt-shirt,Tee,shirts,acme,15\n"
+                                       "hat,Hat,hats,acme,5\n")
+        self.assertEqual((report.rows, report.written, report.skipped), (2, 1, 1))
+        self.assertEqual(report.errors, [(3, "unknown category 'hats'")])
+        self.assertEqual(Product.objects.get(slug="t-shirt").name, "Tee")
+        report = self.load('stock', "product,color,features,stock\nt-shirt,Black,Size:S,1\n")
+        self.assertEqual(report.errors, [(2, "unknown feature values Size:S")])
+        self.assertEqual(ProductStock.objects.get().stock, 4)
+
+    def test_malformed_values_skip_only_their_row(self):
+        """ Test unparsable numbers and JSON lines are reported per row while the rest still imports """
+        self.load_catalog()
+        report = self.load('products', "slug,name,category,brand,price\nhat,Hat,shirts,acme,\"12,5\"\n"
+                                       "cap,Cap,shirts,acme,7\n", batch_size=1)
+        self.assertEqual((report.written, report.skipped), (1, 1))
+        self.assertEqual(report.errors, [(2, "invalid price '12,5'")])
+        self.assertTrue(Product.objects.filter(slug="cap").exists())
+
+        report = self.load('stock', '{"product": "t-shirt", "color": "Black", "stock": "many"}\n{"product": \n'
+                                    '{"product": "t-shirt-1", "color": "Black", "stock": 2}\n', 'jsonl')
+        self.assertEqual(report.errors[0], (1, "invalid stock 'many'"))
+        self.assertEqual(report.errors[1][0], 2)
+        self.assertEqual((report.written, report.skipped), (1, 2))
+        self.assertEqual(ProductStock.objects.get(product__slug="t-shirt").stock, 4)
+
+    def test_duplicate_names_skip_their_rows(self):
+        """ Test names held by another slug, in the database or earlier in the batch, are reported per row """
+        self.load_catalog()
+        report = self.load('brands', "slug,name\nacme,Acme\nacme-2,Acme\nzeta,Zeta\nzeta-2,Zeta\n,Omega\n")
+        self.assertEqual(report.errors, [(3, "name 'Acme' already used by 'acme'"),
+                                         (5, "name 'Zeta' already used by 'zeta'")])
+        self.assertEqual(sorted(Brand.objects.values_list("slug", flat=True)), ["acme", "omega", "zeta"])
+        report = self.load('categories', "slug,name,parent\nclothes,Clothing,\n")
+        self.assertEqual(report.errors, [(2, "name 'Clothing' already used by 'clothing'")])
+
+    def test_import_queries_do_not_grow_with_batch(self):
+        """ Test a batch of products costs the same queries for 2 and 20 rows """
+        self.load_catalog()
+        rows = lambda count: "name,category,brand\n" + "Bulk,shirts,acme\n" * count
+        with CaptureQueriesContext(connection) as few:
+            self.load('products', rows(2))
+        with CaptureQueriesContext(connection) as many:
+            self.load('products', rows(20))
+        self.assertEqual(len(few), len(many))
+        self.assertEqual(Product.objects.filter(name="Bulk").count(), 22)
+
+    def test_export_round_trips(self):
+        """ Test exported rows import back unchanged, through the management commands """
+        self.load_catalog()
+        exported = {kind: list(export_catalog(kind)) for kind in ('products', 'stock')}
+        self.assertEqual(exported['stock'], [
+            {'product': 't-shirt', 'color': 'Black', 'features': 'Size:L|Size:M', 'stock': 4},
+        ])
+        out = StringIO()
+        call_command('export_catalog', 'products', '--format', 'csv', stdout=out, stderr=StringIO())
+        self.assertEqual(out.getvalue().splitlines()[0], "slug,name,category,brand,description,price,weight,is_active")
+        report = self.load('products', out.getvalue())
+        self.assertEqual((report.written, report.skipped), (2, 0))
+        self.assertEqual(list(export_catalog('products')), exported['products'])
+
+
+class UniqueSlugTest(TestCase):
+
+    def test_one_query_for_many_same_names(self):
+        """ Test a batch of same-named products gets distinct slugs from one query """
+        category = Category.objects.create(name="Shirts", slug="shirts")
+        brand = Brand.objects.create(name="Acme", slug="acme")
+        Product.objects.create(category=category, brand=brand, name="T-Shirt")
+        Product.objects.create(category=category, brand=brand, name="T-Shirt 3", slug="t-shirt-3")
+        with self.assertNumQueries(1):
+            slugs = unique_slugs(Product, ["T-Shirt", "T-Shirt", "Hat"])
+        self.assertEqual(slugs, ["t-shirt-4", "t-shirt-5", "hat"])
+
+    def test_suffix_comes_from_numeric_slugs_only(self):
+        """ Test the next suffix follows the highest numeric one, ignoring other slugs sharing the prefix """
+        category = Category.objects.create(name="Shirts", slug="shirts")
+        brand = Brand.objects.create(name="Acme", slug="acme")
+        for slug in ("foo", "foo-9", "foo-bar", "foo-2b"):
+            Product.objects.create(category=category, brand=brand, name="Foo", slug=slug)
+        self.assertEqual(unique_slugs(Product, ["Foo", "Foo 10", "Bar"]), ["foo-10", "foo-10-1", "bar"])
+
+    def create_shirt(self):
+        return Product.objects.create(category=self.category, brand=self.brand, name="T-Shirt")
+
+    def test_save_cost_does_not_grow_with_same_names(self):
+        """ Test saving the 6th same-named product runs as many queries as the 2nd """
+        self.category = Category.objects.create(name="Shirts", slug="shirts")
+        self.brand = Brand.objects.create(name="Acme", slug="acme")
+        self.create_shirt()
+        with CaptureQueriesContext(connection) as second:
+            self.create_shirt()
+        for _ in range(3):
+            self.create_shirt()
+        with CaptureQueriesContext(connection) as sixth:
+            product = self.create_shirt()
+        self.assertEqual(product.slug, "t-shirt-5")
+        self.assertEqual(len(sixth), len(second))
+
+    def test_lost_race_takes_next_slug(self):
+        """ Test a slug taken between allocation and insert is replaced by the next free one """
+        self.category = Category.objects.create(name="Shirts", slug="shirts")
+        self.brand = Brand.objects.create(name="Acme", slug="acme")
+        self.create_shirt()
+        with mock.patch("product.slugs.unique_slugs", side_effect=[["t-shirt"], ["t-shirt-1"]]):
+            self.assertEqual(self.create_shirt().slug, "t-shirt-1")
+
+    def test_category_and_brand_slugs(self):
+        """ Test categories and brands without a slug get a free one, and other conflicts still fail """
+        self.assertEqual(Category.objects.create(name="Shoes").slug, "shoes")
+        Brand.objects.create(name="Acme")
+        self.assertEqual(Brand.objects.create(name="Acme!").slug, "acme-1")
+        with self.assertRaises(IntegrityError):
+            Brand.objects.create(name="Acme")
+
+
+class ImageVariantTest(TestCase):
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        media_settings = override_settings(MEDIA_ROOT=media_root.name, IMAGE_VARIANT_WIDTHS=(320, 640, 1280))
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+        redis_client.delete(QUEUE_KEY)
+        category = Category.objects.create(name="Shirts", slug="shirts")
+        brand = Brand.objects.create(name="Acme", slug="acme")
+        self.product = Product.objects.create(category=category, brand=brand, name="T-Shirt")
+        self.image = Image.objects.create(product=self.product, file=self.upload("front.png", 800))
+        self.addCleanup(redis_client.delete, LOCK_KEY.format('product.image', self.image.pk),
+                        LOCK_KEY.format('product.product', self.product.pk))
+
+    def upload(self, name, width):
+        buffer = BytesIO()
+        PILImage.new("RGBA", (width, width // 2), "blue").save(buffer, format="PNG")
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type="image/png")
+
+    def test_first_requests_queue_one_render(self):
+        """ Test images without variants are served without a srcset and queued once however often they are asked for """
+        self.assertEqual(ImageSerializer(self.image).data['srcset'], {})
+        self.assertEqual(ImageSerializer(self.image).data['srcset'], {})
+        self.assertEqual(redis_client.llen(QUEUE_KEY), 1)
+
+    def test_worker_renders_variants(self):
+        """ Test the worker stores content-hashed variants next to the original, without upscaling """
+        ImageSerializer(self.image).data
+        self.assertEqual(Worker().run_pending(), 1)
+        self.image.refresh_from_db()
+        variants = self.image.variants
+        self.assertEqual(variants['source'], self.image.file.name)
+        self.assertEqual(sorted(variants['webp'], key=int), ['320', '640'])
+        stem = self.image.file.name.rsplit('.', 1)[0]
+        self.assertRegex(variants['webp']['320'], rf"^{stem}\.[0-9a-f]{{16}}\.320w\.webp$")
+        self.assertTrue(variants['jpeg']['640'].endswith('.640w.jpg'))
+        with self.image.file.storage.open(variants['jpeg']['640']) as rendered:
+            self.assertEqual(PILImage.open(rendered).size, (640, 320))
+
+        srcset = ImageSerializer(self.image).data['srcset']
+        self.assertEqual(srcset['webp'], f"/media/{variants['webp']['320']} 320w, /media/{variants['webp']['640']} 640w")
+        self.assertEqual(redis_client.llen(QUEUE_KEY), 0)
+
+    def test_product_image_and_replaced_file(self):
+        """ Test a small product image gets one variant at its own width, and a new file is rendered again """
+        self.product.image = self.upload("product.png", 200)
+        self.product.save()
+        ProductSerializer(self.product).data
+        Worker().run_pending()
+        self.product.refresh_from_db()
+        self.assertEqual(ProductSerializer(self.product).data['image_srcset']['jpeg'].split(), [
+            f"/media/{self.product.image_variants['jpeg']['200']}", "200w",
+        ])
+
+        self.product.image = self.upload("other.png", 400)
+        self.product.save()
+        self.assertEqual(ProductSerializer(self.product).data['image_srcset'], {})
+        self.assertEqual(redis_client.llen(QUEUE_KEY), 1)
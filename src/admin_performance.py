@@ -0,0 +1,132 @@
+"""
+Admin performance mode for changelists over large tables.
+
+`PerformanceAdminMixin` makes an admin, while ADMIN_PERFORMANCE_MODE is on:
+- select_related every foreign key shown in `list_display`, plus
+  `list_prefetch_related` for many-to-many and reverse relations
+- replace `list_filter` entries on relations to big tables (more than
+  ADMIN_FULL_FILTER_LIMIT rows) with `RelatedLookupFilter`, which shows
+  only the chosen object instead of loading the whole related table
+- render foreign keys to searchable admins as autocomplete widgets on the
+  change form, instead of <select>s holding every row
+- count with the planner's estimate (`EstimatedCountPaginator`) and skip the
+  second, unfiltered COUNT(*) behind "N total"
+
+Turn the mode off to compare with stock admin behaviour (benchmarks/admin_changelists.py).
+"""
+from django.conf import settings
+from django.contrib import admin
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.paginator import Paginator
+from django.utils.functional import cached_property
+
+from src.pagination import estimate_count
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Uses the planner's row estimate as the count when it is above
+    ADMIN_ESTIMATED_COUNT_THRESHOLD; an exact COUNT(*) of millions of rows
+    costs more than the page itself. Small results are counted exactly.
+    """
+
+    @cached_property
+    def count(self):
+        estimate = estimate_count(self.object_list)
+        if estimate is not None and estimate > settings.ADMIN_ESTIMATED_COUNT_THRESHOLD:
+            return estimate
+        return super().count
+
+
+class RelatedLookupFilter(admin.RelatedFieldListFilter):
+    """ A relation filter that takes the related object's id instead of listing every related row. """
+    template = 'admin/related_lookup_filter.html'
+
+    def __init__(self, field, request, params, model, model_admin, field_path):
+        super().__init__(field, request, params, model, model_admin, field_path)
+        self.other_params = [(key, value) for key, value in request.GET.items()
+                             if key not in self.expected_parameters()]
+
+    def has_output(self):
+        return True
+
+    def field_choices(self, field, request, model_admin):
+        if not self.lookup_val:
+            return []
+        related = field.remote_field.model._default_manager.filter(**{field.target_field.name: self.lookup_val})
+        try:
+            return [(obj.pk, str(obj)) for obj in related[:1]]
+        except (ValueError, ValidationError):
+            return []
+
+
+def related_table_is_large(field):
+    model = field.remote_field.model
+    estimate = estimate_count(model._default_manager.all())
+    if estimate is None:
+        # No planner statistics (SQLite): cheap enough to check exactly.
+        return model._default_manager.all()[:settings.ADMIN_FULL_FILTER_LIMIT + 1].count() \
+            > settings.ADMIN_FULL_FILTER_LIMIT
+    return estimate > settings.ADMIN_FULL_FILTER_LIMIT
+
+
+class PerformanceAdminMixin:
+    list_prefetch_related = ()
+
+    @property
+    def show_full_result_count(self):
+        return not settings.ADMIN_PERFORMANCE_MODE
+
+    def relation(self, name):
+        """ The relation field called `name` on the admin's model, or None. """
+        if not isinstance(name, str):
+            return None
+        try:
+            field = self.model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return None
+        return field if field.is_relation and not field.auto_created else None
+
+    def get_list_select_related(self, request):
+        select_related = super().get_list_select_related(request)
+        if not settings.ADMIN_PERFORMANCE_MODE or select_related is True:
+            return select_related
+        shown = [field.name for field in map(self.relation, self.get_list_display(request))
+                 if field is not None and field.many_to_one]
+        return [*(select_related or ()), *shown] or False
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        if settings.ADMIN_PERFORMANCE_MODE and self.list_prefetch_related:
+            queryset = queryset.prefetch_related(*self.list_prefetch_related)
+        return queryset
+
+    def get_list_filter(self, request):
+        list_filter = super().get_list_filter(request)
+        if not settings.ADMIN_PERFORMANCE_MODE:
+            return list_filter
+        return [
+            (name, RelatedLookupFilter) if (field := self.relation(name)) is not None and related_table_is_large(field)
+            else name
+            for name in list_filter
+        ]
+
+    def get_autocomplete_fields(self, request):
+        autocomplete_fields = list(super().get_autocomplete_fields(request))
+        if not settings.ADMIN_PERFORMANCE_MODE:
+            return autocomplete_fields
+        for field in self.model._meta.get_fields():
+            if field.name in (*autocomplete_fields, *self.raw_id_fields, *self.filter_horizontal, *self.filter_vertical):
+                continue
+            if not (field.is_relation and field.concrete and field.remote_field.model) or field.one_to_one:
+                continue
+            related_admin = self.admin_site._registry.get(field.remote_field.model)
+            if related_admin is not None and related_admin.search_fields \
+                    and related_admin.has_view_permission(request):
+                autocomplete_fields.append(field.name)
+        return autocomplete_fields
+
+    def get_paginator(self, request, queryset, per_page, orphans=0, allow_empty_first_page=True):
+        if not settings.ADMIN_PERFORMANCE_MODE:
+            return super().get_paginator(request, queryset, per_page, orphans, allow_empty_first_page)
+        return EstimatedCountPaginator(queryset, per_page, orphans, allow_empty_first_page)
@@ -0,0 +1,148 @@
+"""
+A thread-safe pool of DB-API connections, shared by every thread of a process.
+
+Django opens one connection per thread (and under ASGI one per request
+thread), so a process-wide pool is what bounds the number of server
+connections and lets a new request skip the connect handshake.
+"""
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+from django.db.utils import OperationalError
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeout(OperationalError):
+    """ Raised when no connection became free within the pool timeout. """
+
+
+class ConnectionPool:
+    """
+    Keeps up to `size` idle connections and opens at most `size + max_overflow`.
+
+    Checked-in connections are reused newest first. A connection older than `recycle`
+    seconds is closed instead of reused. With `pre_ping`, a connection that sat
+    idle is probed with `ping(connection)` before it is handed out, and dead ones
+    are replaced. When the pool is exhausted, callers wait up to `timeout` seconds.
+    """
+
+    def __init__(self, ping, reset, size=10, max_overflow=5, recycle=1800, pre_ping=True, timeout=10):
+        self.ping = ping
+        self.reset = reset
+        self.size = size
+        self.max_overflow = max_overflow
+        self.recycle = recycle
+        self.pre_ping = pre_ping
+        self.timeout = timeout
+        self.pid = os.getpid()
+        self._idle = deque()
+        self._opened = {}
+        self._available = threading.Condition()
+
+    @property
+    def opened(self):
+        return len(self._opened)
+
+    @property
+    def idle(self):
+        return len(self._idle)
+
+    def acquire(self, connect):
+        """ Returns an idle connection, a new one from `connect()` while under the limit, or waits for a release. """
+        deadline = time.monotonic() + self.timeout
+        while True:
+            with self._available:
+                while not self._idle and self.opened >= self.size + self.max_overflow:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolTimeout(
+                            f"No database connection free after {self.timeout}s "
+                            f"({self.opened} open, pool size {self.size} + overflow {self.max_overflow})"
+                        )
+                    self._available.wait(remaining)
+                connection = self._idle.pop() if self._idle else None
+                if connection is None:
+                    # Reserve the slot before connecting outside the lock.
+                    token = object()
+                    self._opened[token] = time.monotonic()
+
+            if connection is None:
+                try:
+                    connection = connect()
+                except Exception:
+                    with self._available:
+                        del self._opened[token]
+                        self._available.notify()
+                    raise
+                with self._available:
+                    self._opened[id(connection)] = self._opened.pop(token)
+                return connection
+
+            if time.monotonic() - self._opened[id(connection)] > self.recycle or not self._alive(connection):
+                self.discard(connection)
+                continue
+            return connection
+
+    def _alive(self, connection):
+        if not self.pre_ping:
+            return True
+        try:
+            self.ping(connection)
+            return True
+        except Exception:
+            logger.info("Dropping a dead pooled database connection", exc_info=True)
+            return False
+
+    def release(self, connection):
+        """ Hands a connection back; it is reset, or closed when it is broken or over the idle limit. """
+        try:
+            healthy = self.reset(connection)
+        except Exception:
+            healthy = False
+        with self._available:
+            if healthy and len(self._idle) < self.size and id(connection) in self._opened:
+                self._idle.append(connection)
+                self._available.notify()
+                return
+        self.discard(connection)
+
+    def discard(self, connection):
+        """ Closes a connection and frees its slot. """
+        with self._available:
+            self._opened.pop(id(connection), None)
+            self._available.notify()
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def close_idle(self):
+        """ Closes every idle connection (e.g. before dropping the database they point at). """
+        with self._available:
+            idle, self._idle = list(self._idle), deque()
+        for connection in idle:
+            self.discard(connection)
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(key, factory):
+    """ Returns this process's pool for `key`, building it with `factory()`; pools are not shared across fork. """
+    pool = _pools.get(key)
+    if pool is None or pool.pid != os.getpid():
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None or pool.pid != os.getpid():
+                pool = _pools[key] = factory()
+    return pool
+
+
+def pools_for(predicate):
+    """ The pools of this process whose key matches `predicate`. """
+    return [pool for key, pool in list(_pools.items()) if predicate(key)]
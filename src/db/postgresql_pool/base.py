@@ -0,0 +1,86 @@
+"""
+PostgreSQL backend whose connections come from a process-wide pool.
+
+    DATABASES['default'] = {
+        'ENGINE': 'src.db.postgresql_pool',
+        ...,
+        'CONN_MAX_AGE': 0,
+        'POOL': {'SIZE': 10, 'MAX_OVERFLOW': 5, 'RECYCLE': 1800, 'PRE_PING': True, 'TIMEOUT': 10},
+    }
+
+Django still "closes" its connection at the end of every request
+(CONN_MAX_AGE = 0), but closing returns the connection to the pool
+instead of ending the session. This works the same under WSGI worker
+threads and ASGI request threads.
+"""
+from django.db.backends.postgresql import base
+from django.db.backends.postgresql.creation import DatabaseCreation as PostgresCreation
+from psycopg2 import extensions
+
+from src.db.pool import ConnectionPool, get_pool, pools_for
+
+POOL_DEFAULTS = {'SIZE': 10, 'MAX_OVERFLOW': 5, 'RECYCLE': 1800, 'PRE_PING': True, 'TIMEOUT': 10}
+
+
+def ping(connection):
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1")
+
+
+def reset(connection):
+    """
+    Rolls back whatever a borrower left open and restores autocommit, which
+    Django expects of a connection it did not open; False for connections that
+    cannot be reused. The pool discards the connection if this raises.
+    """
+    if connection.closed:
+        return False
+    status = connection.get_transaction_status()
+    if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+        return False
+    if status != extensions.TRANSACTION_STATUS_IDLE:
+        connection.rollback()
+    if not connection.autocommit:
+        connection.autocommit = True
+    return True
+
+
+class DatabaseCreation(PostgresCreation):
+
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # Idle pooled sessions would keep the test database "in use".
+        for pool in pools_for(lambda key: key[1] == test_database_name):
+            pool.close_idle()
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    creation_class = DatabaseCreation
+
+    @property
+    def pool_settings(self):
+        return {**POOL_DEFAULTS, **self.settings_dict.get('POOL', {})}
+
+    def get_pool(self, conn_params):
+        options = self.pool_settings
+        key = (self.alias, conn_params.get('database') or conn_params.get('dbname'),
+               tuple(sorted((name, str(value)) for name, value in conn_params.items())))
+        return get_pool(key, lambda: ConnectionPool(
+            ping=ping, reset=reset,
+            size=options['SIZE'], max_overflow=options['MAX_OVERFLOW'], recycle=options['RECYCLE'],
+            pre_ping=options['PRE_PING'], timeout=options['TIMEOUT'],
+        ))
+
+    def get_new_connection(self, conn_params):
+        self.pool = self.get_pool(conn_params)
+        # A new connection sets self.isolation_level as a side effect; a reused one keeps its level.
+        connection = self.pool.acquire(lambda: super(DatabaseWrapper, self).get_new_connection(conn_params))
+        isolation_level = self.settings_dict['OPTIONS'].get('isolation_level')
+        self.isolation_level = base.IsolationLevel(isolation_level) if isolation_level is not None \
+            else base.IsolationLevel.READ_COMMITTED
+        return connection
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                self.pool.release(self.connection)
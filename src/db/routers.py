@@ -0,0 +1,169 @@
+"""
+Read-replica routing.
+
+Inside a request handled by `ReplicaRoutingMiddleware`, reads go to one of
+DATABASE_REPLICAS (round robin, or the least lagging replica) and writes go
+to the primary. A request is pinned to the primary when:
+- it is not a safe method
+- its view sets `read_from_primary = True` (cart and checkout)
+- it has already written
+- its client wrote less than REPLICA_STICKY_SECONDS ago (the sticky cookie)
+The last case is what gives read-your-writes right after a cart update.
+
+Code running outside a request (commands, signals fired by scripts, tests
+without the middleware) always uses the primary.
+"""
+import itertools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+logger = logging.getLogger(__name__)
+
+PRIMARY = 'default'
+STICKY_COOKIE = 'db_primary'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+LAG_QUERY = (
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+
+class RoutingState:
+    """ The routing decisions of one request. """
+
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+        self.wrote = False
+
+
+_state = ContextVar('replica_routing', default=None)
+
+
+@contextmanager
+def use_primary():
+    """ Sends every read of the block to the primary. """
+    token = _state.set(RoutingState(pinned=True))
+    try:
+        yield
+    finally:
+        _state.reset(token)
+
+
+# === Replica choice ===
+_round_robin = itertools.count()
+_lags = {}
+_lags_lock = threading.Lock()
+
+
+def replica_lag(alias):
+    """
+    Seconds the replica trails the primary, re-measured at most every
+    REPLICA_LAG_CHECK_SECONDS. It is 0 for backends without streaming
+    replication and infinite for unreachable replicas.
+    """
+    now = time.monotonic()
+    measured = _lags.get(alias)
+    if measured is not None and now - measured[0] < settings.REPLICA_LAG_CHECK_SECONDS:
+        return measured[1]
+
+    connection = connections[alias]
+    lag = 0.0
+    if connection.vendor == 'postgresql':
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(LAG_QUERY)
+                lag = float(cursor.fetchone()[0])
+        except DatabaseError:
+            logger.warning("Could not measure replication lag of %s", alias, exc_info=True)
+            lag = float('inf')
+    with _lags_lock:
+        _lags[alias] = (now, lag)
+    return lag
+
+
+def choose_replica():
+    """ The replica for the next read, or the primary when every replica lags more than REPLICA_MAX_LAG. """
+    replicas = settings.DATABASE_REPLICAS
+    if settings.REPLICA_STRATEGY == 'least_lag':
+        lags = {alias: replica_lag(alias) for alias in replicas}
+        alias = min(replicas, key=lags.get)
+        return alias if lags[alias] <= settings.REPLICA_MAX_LAG else PRIMARY
+    return replicas[next(_round_robin) % len(replicas)]
+
+
+# === Router ===
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None or state.pinned or not settings.DATABASE_REPLICAS:
+            return PRIMARY
+        return choose_replica()
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.pinned = state.wrote = True
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {PRIMARY, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+
+# === Middleware ===
+class ReplicaRoutingMiddleware:
+    """ Sync and async capable, so ASGI requests (the async catalog views) are not run on a thread. """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = self.start(request)
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self.finish(state, response)
+
+    async def __acall__(self, request):
+        state = self.start(request)
+        token = _state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self.finish(state, response)
+
+    @staticmethod
+    def start(request):
+        return RoutingState(pinned=request.method not in SAFE_METHODS or STICKY_COOKIE in request.COOKIES)
+
+    @staticmethod
+    def finish(state, response):
+        if state.wrote:
+            response.set_cookie(
+                STICKY_COOKIE, '1', max_age=settings.REPLICA_STICKY_SECONDS, httponly=True, samesite='Lax'
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, 'cls', None) or getattr(view_func, 'view_class', None)
+        if getattr(view_class, 'read_from_primary', False):
+            _state.get().pinned = True
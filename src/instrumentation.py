@@ -0,0 +1,246 @@
+"""
+Per-request query and latency instrumentation.
+
+`InstrumentationMiddleware` wraps every database connection with an
+`execute_wrapper` for the duration of a request and records, per view:
+query count, duplicate-query fingerprints, SQL time, serializer time and
+total time. Serializer time is what the renderer spends (`JSONRenderer`)
+plus the blocks views wrap in `timed()`. The numbers are returned as a
+`Server-Timing` header and kept in an in-process ring buffer that
+`metrics_view` exposes in the Prometheus text format.
+
+Views listed in `QUERY_BUDGETS` (src/query_budgets.py) that run more queries
+than their budget are logged, or fail with `QueryBudgetExceeded` when
+`QUERY_BUDGETS_STRICT` is on (the default under `manage.py test`).
+"""
+import logging
+import re
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+from rest_framework import renderers
+
+logger = logging.getLogger(__name__)
+
+_current = ContextVar('request_metrics', default=None)
+_buffer = deque(maxlen=settings.INSTRUMENTATION_BUFFER_SIZE)
+_buffer_lock = threading.Lock()
+
+IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+
+
+class QueryBudgetExceeded(AssertionError):
+    """ Raised in strict mode when a view runs more queries than its budget. """
+
+
+def fingerprint(sql):
+    """ Normalizes a statement so repeats with different parameters or IN-list sizes compare equal. """
+    return LITERAL.sub('?', IN_LIST.sub('IN (...)', sql))
+
+
+# === Recording ===
+class RequestMetrics:
+    """ What one request spent: queries, SQL time, serializer time and total time (seconds). """
+
+    def __init__(self):
+        self.view = None
+        self.status = None
+        self.queries = 0
+        self.sql_time = 0.0
+        self.serializer_time = 0.0
+        self.total_time = 0.0
+        self.fingerprints = Counter()
+        self.serializer_depth = 0
+
+    @property
+    def duplicates(self):
+        """ {fingerprint: count} of the statements run more than once. """
+        return {sql: count for sql, count in self.fingerprints.items() if count > 1}
+
+    def __call__(self, execute, sql, params, many, context):
+        """ The execute_wrapper: times every statement and records its fingerprint. """
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - start
+            self.queries += 1
+            self.fingerprints[fingerprint(sql)] += 1
+
+    def server_timing(self):
+        return ", ".join([
+            f'db;dur={self.sql_time * 1000:.1f};desc="{self.queries} queries, {len(self.duplicates)} duplicated"',
+            f'ser;dur={self.serializer_time * 1000:.1f}',
+            f'total;dur={self.total_time * 1000:.1f}',
+        ])
+
+
+@contextmanager
+def timed():
+    """
+    Adds the time spent in the block to the current request's serializer time;
+    nested blocks count once. Views wrap their `serializer.data` in it.
+    """
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    metrics.serializer_depth += 1
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.serializer_depth -= 1
+        if not metrics.serializer_depth:
+            metrics.serializer_time += time.perf_counter() - start
+
+
+class TimedRendererMixin:
+    """ Counts the time a renderer spends turning response data into bytes as serializer time. """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with timed():
+            return super().render(data, accepted_media_type, renderer_context)
+
+
+class JSONRenderer(TimedRendererMixin, renderers.JSONRenderer):
+    pass
+
+
+# === Middleware ===
+class InstrumentationMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        start = time.perf_counter()
+        try:
+            with self.wrap_connections(metrics):
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        start = time.perf_counter()
+        # Async views query through sync_to_async, on the request's thread-sensitive thread, so the
+        # wrappers go on that thread's connections.
+        wrappers = await sync_to_async(self.wrap_connections)(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(wrappers.close)()
+            _current.reset(token)
+        return self.finish(request, response, metrics, time.perf_counter() - start)
+
+    @staticmethod
+    def wrap_connections(metrics):
+        """ Installs `metrics` as execute_wrapper on this thread's connections until the stack closes. """
+        stack = ExitStack()
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(metrics))
+        return stack
+
+    def finish(self, request, response, metrics, elapsed):
+        metrics.total_time = elapsed
+        match = getattr(request, 'resolver_match', None)
+        metrics.view = match.view_name if match is not None else 'unresolved'
+        metrics.status = response.status_code
+        response['Server-Timing'] = metrics.server_timing()
+        with _buffer_lock:
+            _buffer.append(metrics)
+        self.check_budget(metrics)
+        return response
+
+    @staticmethod
+    def check_budget(metrics):
+        budget = settings.QUERY_BUDGETS.get(metrics.view)
+        if budget is None or metrics.queries <= budget:
+            return
+        message = (
+            f"{metrics.view} ran {metrics.queries} queries, over its budget of {budget}; "
+            f"duplicated: {metrics.duplicates or 'none'}"
+        )
+        if settings.QUERY_BUDGETS_STRICT:
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
+
+
+# === Metrics endpoint ===
+def snapshot():
+    with _buffer_lock:
+        return list(_buffer)
+
+
+def _quantile(values, fraction):
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def render_metrics(requests):
+    """ Renders per-view aggregates of `requests` in the Prometheus text exposition format. """
+    by_view = defaultdict(list)
+    for metrics in requests:
+        by_view[metrics.view].append(metrics)
+
+    lines = [
+        "# HELP shop_requests Requests in the instrumentation window.",
+        "# TYPE shop_requests gauge",
+        "# HELP shop_request_queries SQL queries per request.",
+        "# TYPE shop_request_queries summary",
+        "# HELP shop_request_duplicate_queries Repeated query fingerprints per request.",
+        "# TYPE shop_request_duplicate_queries summary",
+        "# HELP shop_request_seconds Time per request by phase (sql, serializer, total).",
+        "# TYPE shop_request_seconds summary",
+        "# HELP shop_query_budget Query budget of the view.",
+        "# TYPE shop_query_budget gauge",
+    ]
+    for view, rows in sorted(by_view.items()):
+        label = f'view="{view}"'
+        lines.append(f"shop_requests{{{label}}} {len(rows)}")
+        queries = [row.queries for row in rows]
+        for quantile in (0.5, 0.99):
+            lines.append(f'shop_request_queries{{{label},quantile="{quantile}"}} {_quantile(queries, quantile)}')
+        lines.append(f"shop_request_queries_sum{{{label}}} {sum(queries)}")
+        lines.append(f"shop_request_queries_count{{{label}}} {len(rows)}")
+        lines.append(
+            f"shop_request_duplicate_queries_sum{{{label}}} {sum(len(row.duplicates) for row in rows)}"
+        )
+        for phase, attribute in (('sql', 'sql_time'), ('serializer', 'serializer_time'), ('total', 'total_time')):
+            values = [getattr(row, attribute) for row in rows]
+            for quantile in (0.5, 0.99):
+                lines.append(
+                    f'shop_request_seconds{{{label},phase="{phase}",quantile="{quantile}"}} '
+                    f'{_quantile(values, quantile):.6f}'
+                )
+            lines.append(f'shop_request_seconds_sum{{{label},phase="{phase}"}} {sum(values):.6f}')
+        if view in settings.QUERY_BUDGETS:
+            lines.append(f"shop_query_budget{{{label}}} {settings.QUERY_BUDGETS[view]}")
+    return "\n".join(lines) + "\n"
+
+
+def metrics_view(request):
+    """ Prometheus scrape endpoint; open to staff users and INTERNAL_IPS. """
+    internal = request.META.get('REMOTE_ADDR') in settings.INTERNAL_IPS
+    if not (internal or request.user.is_staff):
+        return HttpResponseForbidden()
+    return HttpResponse(render_metrics(snapshot()), content_type='text/plain; version=0.0.4')
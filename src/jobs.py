@@ -0,0 +1,124 @@
+"""
+Background jobs on a Redis list.
+
+`enqueue(func, *args, **kwargs)` pushes a JSON job naming `func` by its
+dotted path; the `run_jobs` management command pops and runs jobs. A job
+that raises is retried JOB_MAX_ATTEMPTS times with exponential backoff
+(JOB_RETRY_BACKOFF * 2 ** (attempt - 1) seconds) and then moved to the
+dead-letter list, where `run_jobs --requeue-dead` can pick it up again.
+
+Keys:
+- jobs:queue      ready jobs (LPUSH / BRPOP, oldest first)
+- jobs:delayed    sorted set of jobs waiting for a retry, scored by due time
+- jobs:dead       jobs that used up their attempts, with the last error
+
+Arguments must be JSON serializable. A job popped by a worker that dies
+before finishing it is lost, so jobs must be safe to drop or to run twice.
+"""
+import json
+import logging
+import time
+import traceback
+import uuid
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils.module_loading import import_string
+
+from src.settings import redis_client
+
+logger = logging.getLogger(__name__)
+
+QUEUE_KEY = 'jobs:queue'
+DELAYED_KEY = 'jobs:delayed'
+DEAD_KEY = 'jobs:dead'
+
+
+def task_path(func):
+    return f"{func.__module__}.{func.__qualname__}"
+
+
+def enqueue(func, *args, **kwargs):
+    """ Queues `func(*args, **kwargs)` for a worker and returns the job id. """
+    job = {'id': uuid.uuid4().hex, 'task': task_path(func), 'args': args, 'kwargs': kwargs, 'attempts': 0}
+    redis_client.lpush(QUEUE_KEY, json.dumps(job))
+    return job['id']
+
+
+def retry_delay(attempts):
+    return settings.JOB_RETRY_BACKOFF * 2 ** (attempts - 1)
+
+
+class Worker:
+    """ Runs queued jobs; `run()` loops forever, `run_pending()` drains the queue once (tests, benchmarks). """
+
+    def __init__(self, poll_timeout=1):
+        self.poll_timeout = poll_timeout
+
+    def promote_due(self):
+        """ Moves delayed jobs whose retry time has come back onto the queue. """
+        for raw in redis_client.zrangebyscore(DELAYED_KEY, '-inf', time.time(), start=0, num=100):
+            # Only the worker whose ZREM removed the job requeues it.
+            if redis_client.zrem(DELAYED_KEY, raw):
+                redis_client.rpush(QUEUE_KEY, raw)
+
+    def execute(self, raw):
+        job = json.loads(raw)
+        job['attempts'] += 1
+        try:
+            import_string(job['task'])(*job['args'], **job['kwargs'])
+        except Exception:
+            job['error'] = traceback.format_exc(limit=5)
+            if job['attempts'] >= settings.JOB_MAX_ATTEMPTS:
+                logger.error("Job %s (%s) failed %s times, moved to %s",
+                             job['id'], job['task'], job['attempts'], DEAD_KEY, exc_info=True)
+                redis_client.lpush(DEAD_KEY, json.dumps(job))
+            else:
+                delay = retry_delay(job['attempts'])
+                logger.warning("Job %s (%s) failed, retrying in %ss", job['id'], job['task'], delay, exc_info=True)
+                redis_client.zadd(DELAYED_KEY, {json.dumps(job): time.time() + delay})
+            return False
+        return True
+
+    def run_once(self, timeout=None):
+        """
+        Runs the next job, waiting up to `timeout` seconds for one. Returns None when none came.
+
+        Database connections are checked before and after the job, as Django does around a
+        request, so a connection broken by a database restart is replaced instead of failing
+        every later job.
+        """
+        self.promote_due()
+        popped = redis_client.brpop(QUEUE_KEY, timeout=self.poll_timeout if timeout is None else timeout)
+        if popped is None:
+            return None
+        close_old_connections()
+        try:
+            return self.execute(popped[1])
+        finally:
+            close_old_connections()
+
+    def run_pending(self):
+        """ Runs jobs until the queue is empty and returns how many ran. Delayed retries that are not due stay put. """
+        ran = 0
+        self.promote_due()
+        while (raw := redis_client.rpop(QUEUE_KEY)) is not None:
+            self.execute(raw)
+            ran += 1
+        return ran
+
+    def run(self):
+        while True:
+            self.run_once()
+
+
+def requeue_dead():
+    """ Puts every dead-lettered job back on the queue with fresh attempts. Returns how many moved. """
+    moved = 0
+    while (raw := redis_client.rpop(DEAD_KEY)) is not None:
+        job = json.loads(raw)
+        job['attempts'] = 0
+        job.pop('error', None)
+        redis_client.lpush(QUEUE_KEY, json.dumps(job))
+        moved += 1
+    return moved
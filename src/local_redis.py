@@ -0,0 +1,214 @@
+"""
+In-process stand-in for the subset of the redis-py client API the shop uses.
+
+Enabled with `REDIS_FAKE=True` so tests and local development run without a
+Redis server. It behaves like a `StrictRedis(decode_responses=True)` client:
+values are stored and returned as strings.
+"""
+import threading
+import time
+
+
+class LocalRedis:
+
+    def __init__(self):
+        self._data = {}
+        self._expires = {}
+        self._lock = threading.RLock()
+        self._pushed = threading.Condition(self._lock)
+
+    # --- Internals ---
+    def _purge(self, name):
+        expires_at = self._expires.get(name)
+        if expires_at is not None and expires_at <= time.monotonic():
+            self._data.pop(name, None)
+            self._expires.pop(name, None)
+
+    def _get(self, name):
+        self._purge(name)
+        return self._data.get(name)
+
+    # --- Keys ---
+    def exists(self, *names):
+        with self._lock:
+            return sum(1 for name in names if self._get(name) is not None)
+
+    def delete(self, *names):
+        with self._lock:
+            deleted = 0
+            for name in names:
+                if self._get(name) is not None:
+                    deleted += 1
+                self._data.pop(name, None)
+                self._expires.pop(name, None)
+            return deleted
+
+    def expire(self, name, seconds):
+        with self._lock:
+            if self._get(name) is None:
+                return False
+            self._expires[name] = time.monotonic() + seconds
+            return True
+
+    def ttl(self, name):
+        with self._lock:
+            if self._get(name) is None:
+                return -2
+            expires_at = self._expires.get(name)
+            return -1 if expires_at is None else max(int(expires_at - time.monotonic()), 0)
+
+    def flushdb(self):
+        with self._lock:
+            self._data.clear()
+            self._expires.clear()
+            return True
+
+    # --- Strings ---
+    def get(self, name):
+        with self._lock:
+            return self._get(name)
+
+    def mget(self, keys, *args):
+        keys = list(keys) if isinstance(keys, (list, tuple)) else [keys, *args]
+        with self._lock:
+            return [self._get(key) for key in keys]
+
+    def set(self, name, value, ex=None, nx=False):
+        with self._lock:
+            if nx and self._get(name) is not None:
+                return None
+            self._data[name] = str(value)
+            self._expires.pop(name, None)
+            if ex is not None:
+                self._expires[name] = time.monotonic() + ex
+            return True
+
+    def setex(self, name, time_seconds, value):
+        return self.set(name, value, ex=time_seconds)
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            value = int(self._get(name) or 0) + amount
+            self._data[name] = str(value)
+            return value
+
+    incrby = incr
+
+    # --- Lists ---
+    def _list(self, name):
+        value = self._get(name)
+        if value is None:
+            value = self._data[name] = []
+        return value
+
+    def lpush(self, name, *values):
+        with self._lock:
+            items = self._list(name)
+            for value in values:
+                items.insert(0, str(value))
+            self._pushed.notify_all()
+            return len(items)
+
+    def rpush(self, name, *values):
+        with self._lock:
+            items = self._list(name)
+            items.extend(str(value) for value in values)
+            self._pushed.notify_all()
+            return len(items)
+
+    def rpop(self, name):
+        with self._lock:
+            items = self._get(name)
+            if not items:
+                return None
+            value = items.pop()
+            if not items:
+                self._data.pop(name)
+            return value
+
+    def brpop(self, keys, timeout=0):
+        keys = [keys] if isinstance(keys, str) else list(keys)
+        deadline = time.monotonic() + timeout if timeout else None
+        with self._lock:
+            while True:
+                for key in keys:
+                    value = self.rpop(key)
+                    if value is not None:
+                        return key, value
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._pushed.wait(remaining)
+
+    def llen(self, name):
+        with self._lock:
+            return len(self._get(name) or [])
+
+    def lrange(self, name, start, end):
+        with self._lock:
+            items = self._get(name) or []
+            return list(items[start:None if end == -1 else end + 1])
+
+    # --- Sorted sets ---
+    def zadd(self, name, mapping):
+        with self._lock:
+            members = self._get(name)
+            if members is None:
+                members = self._data[name] = {}
+            added = sum(1 for member in mapping if member not in members)
+            members.update({str(member): float(score) for member, score in mapping.items()})
+            return added
+
+    def zrangebyscore(self, name, min, max, start=None, num=None):
+        with self._lock:
+            members = self._get(name) or {}
+            low, high = float(min), float(max)
+            found = sorted((score, member) for member, score in members.items() if low <= score <= high)
+            found = [member for _, member in found]
+            if start is not None:
+                found = found[start:start + num]
+            return found
+
+    def zrem(self, name, *values):
+        with self._lock:
+            members = self._get(name) or {}
+            removed = sum(1 for value in values if members.pop(value, None) is not None)
+            if not members:
+                self._data.pop(name, None)
+            return removed
+
+    def zcard(self, name):
+        with self._lock:
+            return len(self._get(name) or {})
+
+    # --- Pipelines ---
+    def pipeline(self, transaction=True):
+        return LocalPipeline(self)
+
+
+class LocalPipeline:
+    """ Buffers commands and runs them under the client lock on `execute()`. """
+
+    def __init__(self, client):
+        self._client = client
+        self._commands = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self._commands = []
+
+    def __getattr__(self, name):
+        method = getattr(self._client, name)
+
+        def queue(*args, **kwargs):
+            self._commands.append((method, args, kwargs))
+            return self
+        return queue
+
+    def execute(self):
+        with self._client._lock:
+            results = [method(*args, **kwargs) for method, args, kwargs in self._commands]
+        self._commands = []
+        return results
@@ -0,0 +1,107 @@
+import base64
+import json
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import connections
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+def estimate_count(queryset):
+    """ Returns the planner's row estimate for `queryset` (PostgreSQL only), without running a COUNT. """
+    if connections[queryset.db].vendor != 'postgresql':
+        return None
+    plan = json.loads(queryset.order_by().explain(format='json'))
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+# === Keyset (cursor) Pagination ===
+class KeysetPagination(BasePagination):
+    """
+    Paginates on an indexed ordering (e.g. `-created`, `-id`) instead of OFFSET.
+
+    Every page is a single `WHERE (created, id) < cursor ... LIMIT n` query, so
+    deep pages cost the same as the first one, and no COUNT(*) is run. Pass
+    `?count=approx` to get a row estimate taken from the planner statistics.
+
+    Views may set `keyset_ordering`; the last field must be unique (the tie-breaker).
+    """
+    page_size = settings.REST_FRAMEWORK['PAGE_SIZE']
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    ordering = ('-created', '-id')
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.ordering = getattr(view, 'keyset_ordering', self.ordering)
+        self.fields = [name.lstrip('-') for name in self.ordering]
+
+        queryset = queryset.order_by(*self.ordering)
+        self.count = estimate_count(queryset) if request.query_params.get(self.count_query_param) == 'approx' \
+            else None
+
+        position = self.decode_cursor(request, queryset.model)
+        if position is not None:
+            queryset = queryset.filter(self.after(position))
+
+        rows = list(queryset[:self.page_size + 1])
+        self.has_next = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        self.next_position = [getattr(rows[-1], field) for field in self.fields] if self.has_next else None
+        return rows
+
+    def after(self, position):
+        """ Builds the keyset condition `(f1, f2, ...) > / < position` honouring each field's direction. """
+        condition = Q()
+        for index, name in enumerate(self.ordering):
+            field = self.fields[index]
+            lookup = f"{field}__lt" if name.startswith('-') else f"{field}__gt"
+            equal = {f: value for f, value in zip(self.fields[:index], position[:index])}
+            condition |= Q(**equal, **{lookup: position[index]})
+        return condition
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            raw = json.loads(base64.urlsafe_b64decode(encoded.encode()).decode())
+            if len(raw) != len(self.fields):
+                raise ValueError
+            return [model._meta.get_field(field).to_python(value) for field, value in zip(self.fields, raw)]
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, position):
+        raw = json.dumps([value.isoformat() if hasattr(value, 'isoformat') else value for value in position])
+        return base64.urlsafe_b64encode(raw.encode()).decode()
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.next_position))
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('count', self.count),
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'count': {'type': 'integer', 'nullable': True},
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
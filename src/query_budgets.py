@@ -0,0 +1,45 @@
+"""
+SQL query budgets per view, keyed by URL name (`request.resolver_match.view_name`).
+
+A budget is the most queries one request to the view may run, including the
+session and user lookups of authenticated requests. Cached catalog responses
+run fewer; budgets are for a cold cache. `InstrumentationMiddleware` logs a
+request over its budget and fails it when QUERY_BUDGETS_STRICT is on, as it
+is under `manage.py test`. Lower a budget when a change brings a view under it.
+"""
+
+QUERY_BUDGETS = {
+    # --- Catalog ---
+    'product-list': 10,
+    'product-detail': 4,
+    'product-featured': 4,
+    'product-facets': 7,
+    'product-search': 5,
+    'product-stocks': 2,
+    'category-list': 3,
+    'category-detail': 3,
+    'category-tree': 1,
+    'category-products': 7,
+    'category-get-by-slug': 3,
+    'brand-list': 2,
+    'page-home': 5,
+    'page-category': 7,
+    'page-product': 5,
+    'async-product-detail': 5,
+    'async-category-detail': 6,
+    'async-brand-list': 1,
+
+    # --- Cart and orders ---
+    'cart-add': 18,
+    'cart-bulk': 28,
+    'cart-list': 5,
+    'cart-item-delete': 18,
+    'checkout': 18,
+    'order-list': 4,
+    'order-receipt': 14,
+    'latest-order': 3,
+
+    # --- Account ---
+    'confirm-user-info': 3,
+    'user_addresses': 3,
+}
@@ -13,6 +13,7 @@ from datetime import timedelta
 from pathlib import Path
 import environ
 import os
+import sys
 
 import redis
 
@@ -42,6 +43,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'product.apps.ProductConfig',
     'order.apps.OrderConfig',
     'account.apps.AccountConfig',
@@ -50,11 +52,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'src.instrumentation.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'src.db.routers.ReplicaRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -90,17 +94,43 @@ WSGI_APPLICATION = 'src.wsgi.application'
 #     }
 # }
 
+# Connections come from a per-process pool (src/db/pool.py); Django hands its
+# connection back at the end of every request, so CONN_MAX_AGE stays 0.
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql_psycopg2',
+        'ENGINE': 'src.db.postgresql_pool',
         'NAME': env('DB_NAME'),
         'USER': env('DB_USER'),
         'PASSWORD': env('DB_PASSWORD'),
         'HOST': env('DB_HOST'),
         'PORT': env('DB_PORT'),
+        'CONN_MAX_AGE': 0,
+        'OPTIONS': {'connect_timeout': env.int('DB_CONNECT_TIMEOUT', default=5)},
+        'POOL': {
+            'SIZE': env.int('DB_POOL_SIZE', default=10),
+            'MAX_OVERFLOW': env.int('DB_POOL_MAX_OVERFLOW', default=5),
+            'RECYCLE': env.int('DB_POOL_RECYCLE', default=1800),
+            'PRE_PING': env.bool('DB_POOL_PRE_PING', default=True),
+            'TIMEOUT': env.int('DB_POOL_TIMEOUT', default=10),
+        },
     }
 }
 
+# Read replicas (src/db/routers.py): DB_REPLICA_HOSTS is a comma-separated host
+# list; each host becomes a `replica_<n>` alias with the primary's credentials.
+# Catalog and order-history reads go to a replica, writes and cart/checkout to
+# the primary. A client that wrote stays on the primary for REPLICA_STICKY_SECONDS.
+DATABASE_REPLICAS = []
+for number, host in enumerate(env.list('DB_REPLICA_HOSTS', default=[]), start=1):
+    DATABASES[f'replica_{number}'] = {**DATABASES['default'], 'HOST': host, 'TEST': {'MIRROR': 'default'}}
+    DATABASE_REPLICAS.append(f'replica_{number}')
+
+DATABASE_ROUTERS = ['src.db.routers.ReplicaRouter']
+REPLICA_STRATEGY = env('DB_REPLICA_STRATEGY', default='round_robin')  # or 'least_lag'
+REPLICA_MAX_LAG = env.float('DB_REPLICA_MAX_LAG', default=5)
+REPLICA_LAG_CHECK_SECONDS = env.float('DB_REPLICA_LAG_CHECK_SECONDS', default=5)
+REPLICA_STICKY_SECONDS = env.int('DB_REPLICA_STICKY_SECONDS', default=15)
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -158,7 +188,8 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.AllowAny'  # Allow public access to custom auth views
     ],
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
+        # JSONRenderer that counts its time as serializer time in the Server-Timing header.
+        'src.instrumentation.JSONRenderer',
         'rest_framework.renderers.BrowsableAPIRenderer',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
@@ -167,6 +198,9 @@ REST_FRAMEWORK = {
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10,
+    # Reverse proxies in front of the app. Throttles trust that many X-Forwarded-For entries, counted
+    # from the right; with 0 they use REMOTE_ADDR, so clients cannot pick their own identity.
+    'NUM_PROXIES': env.int('NUM_PROXIES', default=0),
 }
 
 
@@ -174,8 +208,87 @@ REDIS_HOST = 'localhost'
 REDIS_PORT = 6379
 REDIS_DB = 0
 REDIS_OTP_EXPIRE = 180
+# Wrong codes accepted per OTP before it is burned.
+OTP_MAX_ATTEMPTS = env.int('OTP_MAX_ATTEMPTS', default=5)
+# Auth requests per client address: scope -> (requests, window seconds), see src/rate_limit.py.
+AUTH_RATE_LIMITS = {
+    'signup': (env.int('SIGNUP_RATE_LIMIT', default=5), 3600),
+    'verify-otp': (env.int('VERIFY_OTP_RATE_LIMIT', default=20), 600),
+    'login': (env.int('LOGIN_RATE_LIMIT', default=10), 60),
+}
 
-redis_client = redis.StrictRedis(host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB, decode_responses=True)
+# Set REDIS_FAKE=True to use an in-process Redis stand-in (tests, local development).
+REDIS_FAKE = env.bool('REDIS_FAKE', default=False)
+
+if REDIS_FAKE:
+    from src.local_redis import LocalRedis
+    redis_client = LocalRedis()
+else:
+    # One pool per process shared by every thread; callers wait up to REDIS_POOL_TIMEOUT for a free connection.
+    REDIS_POOL = redis.BlockingConnectionPool(
+        host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB, decode_responses=True,
+        max_connections=env.int('REDIS_MAX_CONNECTIONS', default=50),
+        timeout=env.float('REDIS_POOL_TIMEOUT', default=5),
+        socket_connect_timeout=env.float('REDIS_CONNECT_TIMEOUT', default=2),
+        socket_timeout=env.float('REDIS_SOCKET_TIMEOUT', default=2),
+        health_check_interval=30,
+        retry_on_timeout=True,
+    )
+    redis_client = redis.StrictRedis(connection_pool=REDIS_POOL)
+
+# Background jobs (src/jobs.py, `run_jobs`): a failing job is retried this many times in total,
+# JOB_RETRY_BACKOFF * 2 ** (attempt - 1) seconds apart, before it goes to the dead-letter list.
+JOB_MAX_ATTEMPTS = env.int('JOB_MAX_ATTEMPTS', default=5)
+JOB_RETRY_BACKOFF = env.float('JOB_RETRY_BACKOFF', default=10)
+
+# Responsive image variants (product/images.py): widths and formats rendered by the job worker,
+# and how long a queued render holds its lock before another request may queue it again.
+IMAGE_VARIANT_WIDTHS = tuple(env.list('IMAGE_VARIANT_WIDTHS', cast=int, default=[320, 640, 1280]))
+IMAGE_VARIANT_FORMATS = ('webp', 'jpeg')
+IMAGE_VARIANT_QUALITY = env.int('IMAGE_VARIANT_QUALITY', default=80)
+IMAGE_VARIANT_LOCK_SECONDS = env.int('IMAGE_VARIANT_LOCK_SECONDS', default=300)
+
+# Seconds a user's admin roles (group names) stay cached; membership changes drop them at once.
+ROLE_CACHE_TIMEOUT = env.int('ROLE_CACHE_TIMEOUT', default=60)
+
+# Admin performance mode (src/admin_performance.py): estimated changelist counts above the threshold,
+# and id lookup filters instead of full lists for relations to tables over ADMIN_FULL_FILTER_LIMIT rows.
+ADMIN_PERFORMANCE_MODE = env.bool('ADMIN_PERFORMANCE_MODE', default=True)
+ADMIN_ESTIMATED_COUNT_THRESHOLD = env.int('ADMIN_ESTIMATED_COUNT_THRESHOLD', default=10_000)
+ADMIN_FULL_FILTER_LIMIT = env.int('ADMIN_FULL_FILTER_LIMIT', default=200)
+
+# Seconds a cached catalog API response lives after its last write.
+CATALOG_CACHE_TIMEOUT = 300
+
+# Minutes a cart line holds its stock before `release_expired_holds` hands it back.
+CART_HOLD_MINUTES = 15
+
+# Text search configuration of the product search document. 'simple' does no stemming,
+# so prefix matching works the same for every catalog language.
+PRODUCT_SEARCH_CONFIG = 'simple'
+
+# Rebuild the in-process facet index on a background thread after catalog writes, serving the
+# previous index meanwhile. Off under `manage.py test`, where tests expect their writes at once.
+FACET_INDEX_BACKGROUND_REBUILD = env.bool(
+    'FACET_INDEX_BACKGROUND_REBUILD', default=not (len(sys.argv) > 1 and sys.argv[1] == 'test')
+)
+
+# Requests per ASGI worker that may query the database at once in the async catalog views;
+# keep workers * this below the Postgres connection limit.
+ASYNC_CATALOG_DB_CONCURRENCY = env.int('ASYNC_CATALOG_DB_CONCURRENCY', default=16)
+
+# Serve the product list and detail endpoints from the ProductSnapshot read model.
+# Run `rebuild_product_snapshots` once before turning it on.
+SERVE_PRODUCT_SNAPSHOTS = env.bool('SERVE_PRODUCT_SNAPSHOTS', default=False)
+
+# Requests kept in the in-process ring buffer behind /metrics/.
+INSTRUMENTATION_BUFFER_SIZE = env.int('INSTRUMENTATION_BUFFER_SIZE', default=1000)
+# Addresses allowed to scrape /metrics/ without a staff login.
+INTERNAL_IPS = env.list('INTERNAL_IPS', default=['127.0.0.1'])
+
+# Per-view query budgets; strict mode turns an exceeded budget into an error (on for test runs).
+from src.query_budgets import QUERY_BUDGETS  # noqa: E402
+QUERY_BUDGETS_STRICT = env.bool('QUERY_BUDGETS_STRICT', default=len(sys.argv) > 1 and sys.argv[1] == 'test')
 
 EMAIL_BACKEND = env('EMAIL_BACKEND')
 EMAIL_HOST = env('EMAIL_HOST')
@@ -0,0 +1,32 @@
+"""
+Local test settings: two SQLite databases and an in-process Redis.
+
+    python manage.py test --settings=src.settings_test
+
+`replica` is a separate database, not a mirror of `default`, so the routing
+tests in src/tests.py can tell from the data which one served a read. It is
+only routed to under `override_settings(DATABASE_REPLICAS=['replica'])`.
+
+Tests that need row locks and concurrent connections are skipped on SQLite;
+run them with src/settings_test_postgres.py.
+"""
+import os
+
+for name, value in {
+    'SECRET_KEY': 'test', 'DB_NAME': 'test', 'DB_USER': 'test', 'DB_PASSWORD': 'test', 'DB_HOST': 'localhost',
+    'DB_PORT': '5432', 'EMAIL_BACKEND': 'django.core.mail.backends.locmem.EmailBackend', 'EMAIL_HOST': 'localhost',
+    'EMAIL_PORT': '25', 'EMAIL_USE_TLS': 'False', 'EMAIL_HOST_USER': '', 'EMAIL_HOST_PASSWORD': '',
+    'DEFAULT_FROM_EMAIL': 'shop@example.com', 'REDIS_FAKE': 'True',
+}.items():
+    os.environ.setdefault(name, value)
+
+from src.settings import *  # noqa: E402,F401,F403
+
+DATABASES = {
+    'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': BASE_DIR / 'test-default.sqlite3'},
+    'replica': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': BASE_DIR / 'test-replica.sqlite3'},
+}
+DATABASE_REPLICAS = []
+MIGRATION_MODULES = {'product': None, 'order': None, 'account': None}
+# Tests share one client address; throttling has its own tests with explicit limits.
+AUTH_RATE_LIMITS = {scope: (10_000, window) for scope, (limit, window) in AUTH_RATE_LIMITS.items()}
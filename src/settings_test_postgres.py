@@ -0,0 +1,19 @@
+"""
+Test settings against PostgreSQL, for the tests that need row locks and
+concurrent connections (StockReservationConcurrencyTest,
+DiscountRedemptionConcurrencyTest, the full-text search and estimated count
+paths). SQLite skips those.
+
+    DB_NAME=shop DB_USER=shop DB_PASSWORD=... DB_HOST=localhost DB_PORT=5432 \
+        python manage.py test --settings=src.settings_test_postgres
+
+Everything else is as in src/settings_test.py. `replica` is a second database
+on the same server (`<DB_NAME>_replica`), kept separate for the routing tests.
+"""
+from src.settings_test import *  # noqa: E402,F401,F403
+from src.settings import DATABASES as POSTGRES_DATABASES  # noqa: E402
+
+DATABASES = {
+    'default': POSTGRES_DATABASES['default'],
+    'replica': {**POSTGRES_DATABASES['default'], 'NAME': f"{POSTGRES_DATABASES['default']['NAME']}_replica"},
+}
@@ -0,0 +1,267 @@
+import threading
+from unittest import mock, skipUnless
+
+from django.conf import settings
+from django.db import connections
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from psycopg2 import extensions
+from rest_framework.test import APIClient
+
+from account.models import User
+from order.models import Order
+from src.db.pool import ConnectionPool, PoolTimeout
+from src.db.postgresql_pool.base import reset as reset_postgres
+from src.db.routers import STICKY_COOKIE, ReplicaRouter, choose_replica
+from src.rate_limit import SlidingWindowLimiter
+from src.jobs import DEAD_KEY, DELAYED_KEY, QUEUE_KEY, Worker, enqueue, requeue_dead
+from src.settings import redis_client
+
+
+class FakeConnection:
+
+    def __init__(self):
+        self.closed = False
+        self.alive = True
+
+    def close(self):
+        self.closed = True
+
+
+def ping(connection):
+    if not connection.alive:
+        raise ConnectionError("server closed the connection")
+
+
+class ConnectionPoolTest(SimpleTestCase):
+
+    def setUp(self):
+        """ Set up a pool of 2 + 1 overflow over fake connections """
+        self.opened = []
+        self.pool = ConnectionPool(ping=ping, reset=lambda c: not c.closed, size=2, max_overflow=1, timeout=0.1)
+
+    def connect(self):
+        connection = FakeConnection()
+        self.opened.append(connection)
+        return connection
+
+    def test_reuses_released_connections(self):
+        """ Test a released connection is handed out again instead of opening a new one """
+        first = self.pool.acquire(self.connect)
+        self.pool.release(first)
+        self.assertIs(self.pool.acquire(self.connect), first)
+        self.assertEqual(len(self.opened), 1)
+
+    def test_overflow_and_timeout(self):
+        """ Test the pool opens at most size + overflow connections and closes overflow on release """
+        held = [self.pool.acquire(self.connect) for _ in range(3)]
+        with self.assertRaises(PoolTimeout):
+            self.pool.acquire(self.connect)
+        for connection in held:
+            self.pool.release(connection)
+        self.assertEqual((self.pool.idle, self.pool.opened), (2, 2))
+        self.assertTrue(held[2].closed)
+
+    def test_waiter_gets_released_connection(self):
+        """ Test a caller blocked on a full pool receives the next released connection """
+        self.pool.timeout = 2
+        held = [self.pool.acquire(self.connect) for _ in range(3)]
+        threading.Timer(0.05, self.pool.release, [held[0]]).start()
+        self.assertIs(self.pool.acquire(self.connect), held[0])
+
+    def test_pre_ping_and_recycle(self):
+        """ Test dead and expired connections are replaced on checkout """
+        connection = self.pool.acquire(self.connect)
+        self.pool.release(connection)
+        connection.alive = False
+        replacement = self.pool.acquire(self.connect)
+        self.assertIsNot(replacement, connection)
+        self.assertTrue(connection.closed)
+
+        self.pool.recycle = 0
+        self.pool.release(replacement)
+        self.assertIsNot(self.pool.acquire(self.connect), replacement)
+        self.assertEqual(self.pool.opened, 1)
+
+    def test_broken_connection_is_not_pooled(self):
+        """ Test a connection that fails its reset is closed instead of reused """
+        connection = self.pool.acquire(self.connect)
+        connection.close()
+        self.pool.release(connection)
+        self.assertEqual((self.pool.idle, self.pool.opened), (0, 0))
+
+    def test_postgres_reset_restores_autocommit(self):
+        """ Test a connection returned inside a transaction is rolled back and back in autocommit """
+        connection = mock.Mock(closed=0, autocommit=False)
+        connection.get_transaction_status.return_value = extensions.TRANSACTION_STATUS_INTRANS
+        self.assertTrue(reset_postgres(connection))
+        connection.rollback.assert_called_once()
+        self.assertTrue(connection.autocommit)
+
+    def test_failed_connect_frees_its_slot(self):
+        """ Test a connect error does not leak a slot """
+        def refuse():
+            raise ConnectionError("refused")
+        for _ in range(4):
+            with self.assertRaises(ConnectionError):
+                self.pool.acquire(refuse)
+        self.assertEqual(self.pool.opened, 0)
+
+
+@skipUnless('replica' in settings.DATABASES, "needs the two-database setup of src.settings_test")
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTest(TestCase):
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        """ Set up a user with a paid and an unpaid order on the primary only """
+        self.user = User.objects.create_user(email="user@example.com", password="password123")
+        self.paid = Order.objects.create(user=self.user, is_paid=True)
+        self.cart = Order.objects.create(user=self.user, is_paid=False)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get(self, name, **kwargs):
+        with CaptureQueriesContext(connections['default']) as primary, \
+                CaptureQueriesContext(connections['replica']) as replica:
+            response = self.client.get(reverse(name, kwargs=kwargs))
+        return response, len(primary), len(replica)
+
+    def test_order_history_reads_from_replica(self):
+        """ Test a read-only view is served by the replica, which does not have the orders yet """
+        response, primary, replica = self.get('order-list')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'], [])
+        self.assertEqual(primary, 0)
+        self.assertGreater(replica, 0)
+
+    def test_cart_reads_from_primary(self):
+        """ Test views marked read_from_primary never touch the replica, which would answer 404 """
+        response, primary, replica = self.get('checkout')
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+
+    def test_client_reads_its_writes(self):
+        """ Test a client that wrote reads from the primary until its sticky cookie expires """
+        response = self.client.put(reverse('order-receipt', kwargs={'pk': self.cart.pk}))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.cookies[STICKY_COOKIE]['max-age'], settings.REPLICA_STICKY_SECONDS)
+
+        response, primary, replica = self.get('order-list')
+        self.assertEqual({order['id'] for order in response.data['results']}, {self.paid.id, self.cart.id})
+        self.assertEqual(replica, 0)
+
+        del self.client.cookies[STICKY_COOKIE]
+        response, primary, replica = self.get('order-list')
+        self.assertEqual(response.data['results'], [])
+
+    def test_reads_outside_requests_use_primary(self):
+        """ Test code without a request (commands, signals, jobs) reads from the primary """
+        self.assertEqual(ReplicaRouter().db_for_read(Order), 'default')
+        self.assertTrue(Order.objects.filter(pk=self.paid.pk).exists())
+
+    @override_settings(DEBUG=True)
+    async def test_asgi_requests_are_not_adapted(self):
+        """ Test the ASGI handler chains the middleware as is, without running the async views on a thread """
+        with mock.patch('django.core.handlers.base.logger') as logger:
+            response = await self.async_client.get(reverse('async-brand-list'))
+        self.assertEqual(response.status_code, 200)
+        adapted = [call.args[1] for call in logger.debug.call_args_list if len(call.args) > 1]
+        self.assertFalse([name for name in adapted if 'ReplicaRoutingMiddleware' in str(name)])
+
+
+class ReplicaChoiceTest(SimpleTestCase):
+
+    @override_settings(DATABASE_REPLICAS=['replica_1', 'replica_2'], REPLICA_STRATEGY='round_robin')
+    def test_round_robin(self):
+        """ Test reads rotate over every replica """
+        self.assertEqual({choose_replica() for _ in range(4)}, {'replica_1', 'replica_2'})
+
+    @override_settings(DATABASE_REPLICAS=['replica_1', 'replica_2'], REPLICA_STRATEGY='least_lag', REPLICA_MAX_LAG=5)
+    def test_least_lag(self):
+        """ Test the least lagging replica wins and the primary is used when all lag too much """
+        lags = {'replica_1': 3.0, 'replica_2': 0.5}
+        with mock.patch('src.db.routers.replica_lag', lags.get):
+            self.assertEqual(choose_replica(), 'replica_2')
+            lags.update(replica_1=8.0, replica_2=float('inf'))
+            self.assertEqual(choose_replica(), 'default')
+
+
+calls = []
+
+
+def record(value, fail=False):
+    calls.append(value)
+    if fail:
+        raise ConnectionError("mail server unavailable")
+
+
+@override_settings(JOB_MAX_ATTEMPTS=3, JOB_RETRY_BACKOFF=0)
+class JobQueueTest(SimpleTestCase):
+
+    def setUp(self):
+        """ Start from empty queues """
+        redis_client.delete(QUEUE_KEY, DELAYED_KEY, DEAD_KEY)
+        calls.clear()
+
+    def test_jobs_run_in_order(self):
+        """ Test queued jobs run oldest first with their arguments """
+        for value in range(3):
+            enqueue(record, value)
+        self.assertEqual(Worker().run_pending(), 3)
+        self.assertEqual(calls, [0, 1, 2])
+
+    def test_failing_job_is_retried_then_dead_lettered(self):
+        """ Test a failing job is retried JOB_MAX_ATTEMPTS times, then kept on the dead-letter list """
+        enqueue(record, 'x', fail=True)
+        worker = Worker()
+        for _ in range(3):
+            worker.run_pending()
+        self.assertEqual(calls, ['x', 'x', 'x'])
+        self.assertEqual(redis_client.zcard(DELAYED_KEY), 0)
+        self.assertEqual(redis_client.llen(DEAD_KEY), 1)
+
+        self.assertEqual(requeue_dead(), 1)
+        self.assertEqual(redis_client.llen(QUEUE_KEY), 1)
+
+    def test_worker_refreshes_connections_around_jobs(self):
+        """ Test the long-running worker drops unusable database connections before and after each job """
+        enqueue(record, 'x', fail=True)
+        with mock.patch("src.jobs.close_old_connections") as close_old_connections:
+            self.assertFalse(Worker().run_once(timeout=1))
+        self.assertEqual(close_old_connections.call_count, 2)
+
+    @override_settings(JOB_RETRY_BACKOFF=60)
+    def test_retry_waits_for_backoff(self):
+        """ Test a retry is not run before its backoff has passed """
+        enqueue(record, 'x', fail=True)
+        worker = Worker()
+        worker.run_pending()
+        self.assertEqual(worker.run_pending(), 0)
+        self.assertEqual(redis_client.zcard(DELAYED_KEY), 1)
+
+
+class SlidingWindowLimiterTest(SimpleTestCase):
+
+    def setUp(self):
+        """ Set up a limit of 4 hits per 10 seconds starting at a window boundary """
+        self.limiter = SlidingWindowLimiter('test', 4, 10)
+        self.start = 1_000_000
+        self.limiter.reset('client', now=self.start)
+        self.limiter.reset('client', now=self.start + 10)
+
+    def test_limit_within_window(self):
+        """ Test hits over the limit are refused with a wait until the window ends """
+        results = [self.limiter.hit('client', now=self.start + 1) for _ in range(5)]
+        self.assertEqual([allowed for allowed, _ in results], [True] * 4 + [False])
+        self.assertEqual(results[-1][1], 9)
+
+    def test_previous_window_decays(self):
+        """ Test the previous window counts in proportion to how much of it still overlaps """
+        for _ in range(4):
+            self.limiter.hit('client', now=self.start + 9)
+        # Halfway into the next window 4 * 0.5 = 2 earlier hits still count.
+        results = [self.limiter.hit('client', now=self.start + 15)[0] for _ in range(3)]
+        self.assertEqual(results, [True, True, False])